@@ -1,10 +1,27 @@
 """
 Aplicación Streamlit para procesar ausencias sin soporte.
 Frontend limpio y organizado.
+
+El procesamiento corre como trabajo en segundo plano (`jobs.py`): un pool acotado compartido
+por todas las sesiones, con cola de admisión. La sesión guarda el id del trabajo (también en
+la URL, `?job=`) y lo consulta en cada rerun hasta recoger el resultado.
+El detalle y el resumen se muestran con `viewer.ResultView`: filtros y paginación en el
+servidor, al navegador solo va la página actual. El archivo de descarga (Excel o zip de
+tablas) también se genera como trabajo, solo cuando se pide, y queda guardado por formato.
 """
+import hashlib
+from functools import partial
+
 import streamlit as st
 from io import BytesIO
-from processor import AusenciasProcessor
+from processor import AusenciasProcessor, expected_stages
+from cache import ParseCache
+from jobs import CANCELADO, EJECUTANDO, EN_COLA, ERROR, JobManager, QueueFull
+from viewer import ResultView, build_views
+from writers import available_table_formats, tables_file_name, write_excel, write_steps, write_tables_zip
+
+
+PAGE_SIZES = [50, 100, 250, 500]
 
 
 # =========================
@@ -22,17 +39,132 @@ def init_state():
         "ready": False,
         "excel_bytes": None,
         "file_name": None,
-        "aus_sin_out": None,
-        "summary": None,
+        "views": None,
         "params": None,
         "logs": [],
+        "prepared": None,
+        "prepared_key": None,
+        "dfs": None,
+        "downloads": {},
+        "export_job_id": None,
+        "metrics": None,
+        "metrics_json": None,
+        "job_id": st.query_params.get("job"),
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
 
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """Pool de trabajos del servidor (uno para todas las sesiones)."""
+    return JobManager()
+
+
+def run_job(files: dict, period_start, period_end, prepared, key: str, job) -> dict:
+    """Trabajo en segundo plano: prepara (si hace falta) y evalúa el periodo."""
+    processor = AusenciasProcessor(period_start, period_end, cache=parse_cache, progress=job.report)
+    if prepared is None:
+        prepared = processor.prepare(files)
+    result = processor.evaluate(prepared, build_excel=False) if prepared is not None else None
+    views = None
+    if result is not None:
+        # Vistas compactas del detalle y el resumen (la hoja de detalle no se materializa)
+        views = build_views(result['dfs'])
+        job.report({"etapa": "visor"})
+    return {"prepared": prepared, "key": key, "result": result, "views": views, "logs": processor.logs}
+
+
+def run_export(dfs, fmt: str, file_name: str, job) -> tuple[str, bytes, str]:
+    """Trabajo en segundo plano: genera el archivo de descarga (avance por parte escrita)."""
+    buffer = BytesIO()
+    if fmt == "xlsx":
+        write_excel(dfs, buffer, progress=job.report)
+    else:
+        write_tables_zip(dfs, buffer, fmt, progress=job.report)
+        file_name = tables_file_name(file_name, fmt)
+    return fmt, buffer.getvalue(), file_name
+
+
+def cancel_export():
+    """Cancela y olvida el archivo de descarga en curso (si hay uno)."""
+    if st.session_state.export_job_id:
+        jobs.cancel(st.session_state.export_job_id)
+        st.session_state.export_job_id = None
+
+
+def collect_job(job):
+    """Pasa el resultado de un trabajo terminado al estado de la sesión."""
+    out = job.result
+    st.session_state.prepared = out["prepared"]
+    st.session_state.prepared_key = out["key"] if out["prepared"] is not None else None
+    result = out["result"]
+    if result is None:
+        st.session_state.logs = out["logs"]
+        return False
+
+    st.session_state.excel_bytes = None
+    st.session_state.file_name = result['file_name']
+    st.session_state.dfs = result['dfs']
+    st.session_state.downloads = {}
+    cancel_export()
+    st.session_state.views = out["views"]
+    st.session_state.params = result['dfs']['Parametros']
+    st.session_state.logs = result['logs']
+    st.session_state.metrics = result['dfs']['Diagnostico']
+    st.session_state.metrics_json = result['metrics_json']
+    st.session_state.ready = True
+    return True
+
+
+def show_view(view: ResultView, key: str):
+    """Hoja paginada con filtros; conteos por estado precalculados, al navegador solo la página."""
+    if len(view.counts):
+        cols = st.columns(len(view.counts))
+        for col, (estado, filas) in zip(cols, view.counts.itertuples(index=False)):
+            col.metric(estado, f"{filas:,}")
+
+    f1, f2, f3 = st.columns([2, 2, 1])
+    estados = f1.multiselect("Estado", view.options("estado_periodo"), key=f"{key}_estado")
+    funciones = f2.multiselect("Función", view.options("funcion"), key=f"{key}_funcion")
+    ids = f3.text_input("ID (uno o varios)", key=f"{key}_id")
+    desde = hasta = None
+    bounds = view.date_bounds()
+    if bounds is not None:
+        rango = st.date_input("Rango de fechas", value=bounds, min_value=bounds[0], max_value=bounds[1],
+                              key=f"{key}_fechas")
+        if isinstance(rango, (tuple, list)) and len(rango) == 2:
+            desde, hasta = rango
+
+    positions = view.filter(estados, funciones, ids, desde, hasta)
+    p1, p2, p3 = st.columns([1, 1, 3])
+    page_size = p1.selectbox("Filas por página", PAGE_SIZES, index=1, key=f"{key}_size")
+    n_pages = view.n_pages(len(positions), page_size)
+    if st.session_state.get(f"{key}_page", 1) > n_pages:
+        st.session_state[f"{key}_page"] = n_pages
+    page = p2.number_input("Página", min_value=1, max_value=n_pages, step=1, key=f"{key}_page")
+    p3.caption(f"{len(positions):,} de {len(view):,} filas | página {page} de {n_pages}")
+    st.dataframe(view.page(positions, page, page_size), use_container_width=True, height=520, hide_index=True)
+
+
+def forget_job():
+    """La sesión deja de seguir el trabajo actual."""
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+
+def files_key(files: dict) -> str:
+    """Huella de los 6 archivos cargados (para reutilizar los datos preparados)."""
+    h = hashlib.sha256()
+    for key in sorted(files):
+        h.update(key.encode() + b"\0" + hashlib.sha256(files[key]["bytes"]).digest())
+    return h.hexdigest()
+
+
 init_state()
+parse_cache = ParseCache()
+jobs = get_job_manager()
 
 
 # =========================
@@ -48,19 +180,37 @@ with st.sidebar:
         st.session_state.ready = False
         st.session_state.excel_bytes = None
         st.session_state.file_name = None
-        st.session_state.aus_sin_out = None
-        st.session_state.summary = None
+        st.session_state.views = None
         st.session_state.params = None
         st.session_state.logs = []
+        st.session_state.prepared = None
+        st.session_state.prepared_key = None
+        st.session_state.dfs = None
+        st.session_state.downloads = {}
+        st.session_state.metrics = None
+        st.session_state.metrics_json = None
+        cancel_export()
+        if st.session_state.job_id:
+            jobs.cancel(st.session_state.job_id)
+        forget_job()
         st.rerun()
 
+    stats = jobs.stats()
+    st.caption(f"Trabajos del servidor: {stats[EJECUTANDO]}/{jobs.max_workers} en ejecución, "
+               f"{stats[EN_COLA]} en cola")
+
+    st.caption(f"Caché de archivos: {parse_cache.size() / 1024 / 1024:.1f} MB")
+    if st.button("🗑️ Limpiar caché de archivos"):
+        n = parse_cache.clear()
+        st.success(f"Caché limpiada ({n} archivos).")
+
 with st.expander("📘 Instructivo", expanded=True):
     st.markdown(
         """
 1) Carga los 6 archivos.
 2) Selecciona el periodo (inicio y fin).
 3) Clic en **Generar consolidado**.
-4) Descarga el Excel consolidado (no se pierde al descargar).
+4) Elige el formato, clic en **Generar archivo** y descarga (no se pierde al descargar).
 
 **Reglas:**
 - Retiro = `Desde - 1 día` (Retiros)
@@ -110,36 +260,73 @@ if run:
         st.error("La fecha fin no puede ser menor que la fecha inicio.")
         st.stop()
 
-    with st.spinner("Procesando..."):
-        # Preparar archivos
-        files = {
-            'horas': {'bytes': f_horas.read(), 'name': f_horas.name},
-            'ausrep': {'bytes': f_ausrep.read(), 'name': f_ausrep.name},
-            'retiros': {'bytes': f_retiros.read(), 'name': f_retiros.name},
-            'md': {'bytes': f_md.read(), 'name': f_md.name},
-            'func': {'bytes': f_func.read(), 'name': f_func.name},
-            'aussap': {'bytes': f_aussap.read(), 'name': (f_aussap.name or "").lower()},
-        }
-
-        # Procesar
-        processor = AusenciasProcessor(fecha_inicio, fecha_fin)
-        result = processor.process(files)
-
-        if result is None:
+    files = {
+        'horas': {'bytes': f_horas.read(), 'name': f_horas.name},
+        'ausrep': {'bytes': f_ausrep.read(), 'name': f_ausrep.name},
+        'retiros': {'bytes': f_retiros.read(), 'name': f_retiros.name},
+        'md': {'bytes': f_md.read(), 'name': f_md.name},
+        'func': {'bytes': f_func.read(), 'name': f_func.name},
+        'aussap': {'bytes': f_aussap.read(), 'name': (f_aussap.name or "").lower()},
+    }
+
+    # Si los archivos no cambiaron solo se evalúa el nuevo periodo
+    key = files_key(files)
+    prepared = st.session_state.prepared if st.session_state.prepared_key == key else None
+    if st.session_state.job_id:
+        jobs.cancel(st.session_state.job_id)
+    try:
+        job = jobs.submit(
+            partial(run_job, files, fecha_inicio, fecha_fin, prepared, key),
+            label=f"{fecha_inicio} a {fecha_fin}",
+            total=expected_stages(prepare=prepared is None) + 1,  # + visor
+        )
+    except QueueFull:
+        st.error("El servidor está ocupado (cola de trabajos llena). Intenta de nuevo en unos minutos.")
+        st.stop()
+    st.session_state.job_id = job.id
+    st.query_params["job"] = job.id
+
+
+# =========================
+# Trabajo en curso
+# =========================
+@st.fragment(run_every=1.0)
+def job_status(job_id: str, key: str):
+    """Avance de un trabajo de la sesión; al terminar se rerenderiza toda la página."""
+    job = jobs.get(job_id)
+    if job is None or job.terminated:
+        st.rerun()
+    if job.status == EN_COLA:
+        st.info(f"En cola: posición {jobs.position(job.id) or '-'} ({job.label}).")
+    else:
+        etapa = job.stage or "iniciando"
+        st.progress(job.progress, text=f"Procesando {job.label}: {etapa} ({job.seconds():.0f}s)")
+    if job.cancel_requested:
+        st.caption("Cancelación pedida; se detiene al cerrar la etapa actual.")
+    elif st.button("✖️ Cancelar", key=f"cancel_{key}"):
+        jobs.cancel(job.id)
+
+
+if st.session_state.job_id:
+    job = jobs.get(st.session_state.job_id)
+    if job is None:
+        st.warning("El trabajo ya no está disponible en el servidor. Vuelve a generar el consolidado.")
+        forget_job()
+    elif not job.terminated:
+        job_status(job.id, "job")
+    else:
+        forget_job()
+        jobs.discard(job.id)
+        if job.status == CANCELADO:
+            st.warning("Procesamiento cancelado.")
+        elif job.status == ERROR:
+            st.error("Error en el procesamiento.")
+            if show_debug:
+                st.code(job.error)
+        elif not collect_job(job):
             st.error("Error en el procesamiento. Revisa los logs.")
-            st.session_state.logs = processor.logs
             if show_debug:
                 st.info("\n".join(st.session_state.logs))
-            st.stop()
-
-        # Guardar resultados
-        st.session_state.excel_bytes = result['excel_bytes']
-        st.session_state.file_name = result['file_name']
-        st.session_state.aus_sin_out = result['dfs']['Ausencias_sin_soporte']
-        st.session_state.summary = result['dfs']['Resumen_periodo']
-        st.session_state.params = result['dfs']['Parametros']
-        st.session_state.logs = result['logs']
-        st.session_state.ready = True
 
 
 # =========================
@@ -151,27 +338,78 @@ if st.session_state.ready:
     tabs = st.tabs(["📄 Detalle", "📊 Resumen", "⚙️ Parámetros", "🧾 Diagnóstico"])
 
     with tabs[0]:
-        st.dataframe(st.session_state.aus_sin_out, use_container_width=True, height=520)
+        show_view(st.session_state.views["detalle"], "detalle")
 
     with tabs[1]:
-        st.dataframe(st.session_state.summary, use_container_width=True, height=520)
+        show_view(st.session_state.views["resumen"], "resumen")
 
     with tabs[2]:
         st.dataframe(st.session_state.params, use_container_width=True, height=240)
 
     with tabs[3]:
+        if st.session_state.metrics is not None:
+            st.markdown("**Tiempos y memoria por etapa**")
+            st.dataframe(st.session_state.metrics, use_container_width=True, hide_index=True)
+            st.download_button(
+                label="⬇️ Métricas (JSON)",
+                data=st.session_state.metrics_json,
+                file_name="metricas_ausencias.json",
+                mime="application/json",
+                key="download_metrics",
+            )
         st.write("\n".join(st.session_state.logs) if st.session_state.logs else "Sin logs.")
         st.caption("En Parámetros, 'MD_id_col_usada' debe quedar como N° pers. / Nº pers.")
         if show_debug:
             st.info("\n".join(st.session_state.logs))
 
-    st.download_button(
-        label="⬇️ Descargar Excel consolidado",
-        data=st.session_state.excel_bytes,
-        file_name=st.session_state.file_name,
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        key="download_excel_fixed",
-    )
+    # Descarga: el archivo se genera como trabajo, solo para el formato elegido y una vez por resultado
+    formatos = {"xlsx": "Excel (.xlsx)", "parquet": "Parquet (zip)", "csv.gz": "CSV.gz (zip)"}
+    opciones = ["xlsx", *available_table_formats()]
+    fmt = st.radio("Formato de descarga", opciones, format_func=formatos.get, horizontal=True)
+
+    export = jobs.get(st.session_state.export_job_id)
+    if st.session_state.export_job_id and (export is None or export.terminated):
+        st.session_state.export_job_id = None
+        if export is None:
+            st.warning("El archivo en preparación ya no está disponible en el servidor. Vuelve a generarlo.")
+        else:
+            jobs.discard(export.id)
+            if export.status == ERROR:
+                st.error("Error generando el archivo.")
+                if show_debug:
+                    st.code(export.error)
+            elif export.status == CANCELADO:
+                st.warning("Generación del archivo cancelada.")
+            else:
+                done_fmt, data, name = export.result
+                st.session_state.downloads[done_fmt] = (data, name)
+        export = None
+
+    if fmt in st.session_state.downloads:
+        data, name = st.session_state.downloads[fmt]
+        if fmt == "xlsx":
+            st.session_state.excel_bytes = data
+        st.download_button(
+            label="⬇️ Descargar Excel consolidado" if fmt == "xlsx" else "⬇️ Descargar tablas (zip)",
+            data=data,
+            file_name=name,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if fmt == "xlsx" else "application/zip",
+            key="download_excel_fixed",
+        )
+    elif export is not None:
+        job_status(export.id, "export")
+    elif st.button("📦 Generar archivo", key="export_file"):
+        try:
+            export = jobs.submit(
+                partial(run_export, st.session_state.dfs, fmt, st.session_state.file_name),
+                label=formatos[fmt],
+                total=write_steps(st.session_state.dfs),
+            )
+        except QueueFull:
+            st.error("El servidor está ocupado (cola de trabajos llena). Intenta de nuevo en unos minutos.")
+        else:
+            st.session_state.export_job_id = export.id
+            st.rerun()
 else:
     st.info("Carga archivos, selecciona el periodo y presiona **Generar consolidado**.")
 
@@ -0,0 +1,250 @@
+"""
+Benchmark del procesamiento con datos sintéticos (ver `synthetic.py`).
+
+Cada escala (empleados × días) se genera una vez en `--data` y se reutiliza. La corrida de
+cada escala se hace en un proceso nuevo, así el pico de RSS es el de esa corrida; se
+registran las etapas de `Metrics` (carga de cada fuente, parseo SAP, grid, detalle,
+resumen, Excel) y micro-benchmarks de `parsers.py` y `utils.py`.
+
+Ejemplos:
+    python -m benchmark                                   # 1000x31, SAP texto
+    python -m benchmark --full --out bench.json           # 1k/10k/50k × 31/92 días
+    python -m benchmark --scales 10000x31 --sap html --baseline bench.json
+
+Con `--baseline` se comparan tiempos y memoria contra un JSON anterior del mismo comando;
+si alguna etapa empeora más de `--tolerance` (y más de `--min-seconds`) el código de
+salida es 1.
+"""
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+
+QUICK_SCALES = ["1000x31"]
+FULL_SCALES = ["1000x31", "1000x92", "10000x31", "10000x92", "50000x31", "50000x92"]
+
+
+def parse_scale(value: str) -> tuple[int, int]:
+    """Escala 'EMPLEADOSxDIAS' (p. ej. 10000x92)."""
+    try:
+        n, days = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"escala inválida: {value!r} (se espera EMPLEADOSxDIAS)")
+    if n <= 0 or days <= 0:
+        raise argparse.ArgumentTypeError(f"escala inválida: {value!r}")
+    return n, days
+
+
+def dataset(data_dir: Path, n: int, days: int, sap_format: str, seed: int, start: date) -> dict:
+    """Manifiesto del conjunto sintético de la escala (lo genera si no existe)."""
+    from synthetic import MANIFEST, read_manifest, write_inputs
+
+    path = data_dir / f"{n}x{days}_{sap_format}_s{seed}_{start:%Y%m%d}"
+    if (path / MANIFEST).is_file():
+        return read_manifest(path)
+    return write_inputs(path, n_employees=n, days=days, start=start, sap_format=sap_format, seed=seed)
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    """(mejor tiempo de `repeat` llamadas, último resultado)."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def micro_benchmarks(prepared, files: dict, manifest: dict, repeat: int) -> list[dict]:
+    """Tiempos de funciones sueltas de parsers.py y utils.py sobre los datos de la escala."""
+    import numpy as np
+    import pandas as pd
+
+    from parsers import parse_sap_report, parse_sap_stream, sniff_sap_format
+    from synthetic import render_ids
+    from utils import clean_ids, clip_ranges, expand_ranges
+
+    start, end = date.fromisoformat(manifest["inicio"]), date.fromisoformat(manifest["fin"])
+    sap = files["aussap"]
+    fmt = sniff_sap_format(sap["bytes"][:64 * 1024])
+    ranges = pd.concat([prepared.src["ausrep"][["id", "ini", "fin"]], prepared.src["aussap"][["id", "ini", "fin"]]],
+                       ignore_index=True)
+    ids = prepared.src["horas"]["id"].astype(str).to_numpy()
+    raw_ids = pd.Series(render_ids(np.random.default_rng(0), ids.astype(np.int64)), dtype=object)
+
+    cases = [
+        ("parsers.parse_sap_report", lambda: parse_sap_report(sap["bytes"], stream=False)),
+        ("utils.clean_ids", lambda: clean_ids(raw_ids)),
+        ("utils.clip_ranges", lambda: clip_ranges(ranges, start, end)),
+        ("utils.expand_ranges", lambda: expand_ranges(ranges, start, end)),
+    ]
+    if fmt in ("text", "html"):
+        cases.insert(1, ("parsers.parse_sap_stream", lambda: parse_sap_stream(io.BytesIO(sap["bytes"]))))
+
+    out = []
+    for name, fn in cases:
+        secs, res = _best(fn, repeat)
+        out.append({"etapa": name, "segundos": round(secs, 4), "filas": len(res)})
+    return out
+
+
+def run_scale(manifest: dict, workers: int, build_excel: bool, repeat: int, compact: bool = False) -> dict:
+    """Corre el procesamiento completo de una escala (en el proceso actual)."""
+    from metrics import peak_rss_mb
+    from processor import AusenciasProcessor
+
+    files = {}
+    for key, path in manifest["archivos"].items():
+        files[key] = {"bytes": Path(path).read_bytes(), "name": Path(path).name.lower()}
+    start, end = date.fromisoformat(manifest["inicio"]), date.fromisoformat(manifest["fin"])
+
+    processor = AusenciasProcessor(start, end, workers=workers, cache=None, compact=compact)
+    t0 = time.perf_counter()
+    prepared = processor.prepare(files)
+    if prepared is None:
+        raise RuntimeError("\n".join(processor.logs))
+    with tempfile.TemporaryDirectory() as tmp:
+        result = processor.evaluate(prepared, build_excel=build_excel, build_tables=False, output_dir=tmp)
+    total = time.perf_counter() - t0
+
+    return {
+        "segundos_total": round(total, 3),
+        "rss_pico_mb": peak_rss_mb(),
+        "filas_detalle": result["dfs"].n_rows("Ausencias_sin_soporte"),
+        "etapas": result["metrics"],
+        "micro": micro_benchmarks(prepared, files, manifest, repeat),
+    }
+
+
+def run_isolated(manifest: dict, workers: int, build_excel: bool, repeat: int, compact: bool = False) -> dict:
+    """run_scale en un proceso nuevo (pico de RSS propio)."""
+    cmd = [sys.executable, "-m", "benchmark", "--child", json.dumps(manifest, ensure_ascii=False),
+           "--workers", str(workers), "--repeat", str(repeat)]
+    if not build_excel:
+        cmd.append("--no-excel")
+    if compact:
+        cmd.append("--compact")
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).resolve().parent)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falló la escala {manifest['empleados']}x{manifest['dias']}:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _index(result: dict) -> dict:
+    """etapa -> registro, para comparar (las etapas repetidas se suman)."""
+    out = {}
+    for rec in [*result["etapas"], *result["micro"]]:
+        prev = out.get(rec["etapa"])
+        out[rec["etapa"]] = rec if prev is None else {**prev, "segundos": prev["segundos"] + rec["segundos"]}
+    out["total"] = {"segundos": result["segundos_total"]}
+    return out
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_seconds: float) -> list[str]:
+    """Regresiones de `current` frente a `baseline` (misma escala y formato SAP), como textos."""
+    base = {(r["escala"], r["sap"]): r for r in baseline["resultados"]}
+    found = []
+    for res in current["resultados"]:
+        ref = base.get((res["escala"], res["sap"]))
+        if ref is None:
+            continue
+        now, before = _index(res), _index(ref)
+        for etapa, rec in now.items():
+            old = before.get(etapa)
+            if old is None:
+                continue
+            delta = rec["segundos"] - old["segundos"]
+            if delta > min_seconds and rec["segundos"] > old["segundos"] * (1 + tolerance):
+                found.append(f"{res['escala']} {etapa}: {old['segundos']:.3f}s -> {rec['segundos']:.3f}s")
+        if ref.get("rss_pico_mb") and res.get("rss_pico_mb") and res["rss_pico_mb"] > ref["rss_pico_mb"] * (1 + tolerance):
+            found.append(f"{res['escala']} rss_pico_mb: {ref['rss_pico_mb']} -> {res['rss_pico_mb']}")
+    return found
+
+
+def print_result(res: dict, file=sys.stdout):
+    """Tabla de etapas de una escala."""
+    print(f"\n== {res['escala']} (SAP {res['sap']}) total {res['segundos_total']:.2f}s | "
+          f"RSS pico {res['rss_pico_mb']} MB | detalle {res['filas_detalle']} filas", file=file)
+    for rec in [*res["etapas"], *res["micro"]]:
+        filas = "" if rec.get("filas") is None else rec["filas"]
+        print(f"  {rec['etapa']:<36} {rec['segundos']:9.3f}s {filas:>12}", file=file)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark con datos sintéticos")
+    p.add_argument("--scales", nargs="+", type=parse_scale, default=None, metavar="NxD",
+                   help="Escalas EMPLEADOSxDIAS (por defecto 1000x31)")
+    p.add_argument("--full", action="store_true", help="1k/10k/50k empleados × 31/92 días")
+    p.add_argument("--sap", choices=["text", "html", "xls", "xlsx"], default="text", help="Formato del archivo SAP")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1), help="Inicio AAAA-MM-DD")
+    p.add_argument("--data", type=Path, default=Path(tempfile.gettempdir()) / "ausencias_bench",
+                   help="Carpeta de los datos sintéticos (se reutilizan entre corridas)")
+    p.add_argument("--workers", type=int, default=1, help="Procesos para la carga (1 = tiempos comparables)")
+    p.add_argument("--repeat", type=int, default=3, help="Repeticiones de cada micro-benchmark (se toma el mejor)")
+    p.add_argument("--no-excel", action="store_true", help="No escribir el libro de salida")
+    p.add_argument("--compact", action="store_true", help="Procesa con tipos compactos (AusenciasProcessor(compact=True))")
+    p.add_argument("--out", type=Path, default=None, help="Guarda los resultados en JSON")
+    p.add_argument("--baseline", type=Path, default=None, help="JSON de una corrida anterior para comparar")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo permitido (0.25 = 25%%)")
+    p.add_argument("--min-seconds", type=float, default=0.05, help="Diferencia mínima en segundos para reportar")
+    p.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.child:
+        res = run_scale(json.loads(args.child), args.workers, not args.no_excel, args.repeat, args.compact)
+        print(json.dumps(res, ensure_ascii=False, default=str))
+        return 0
+
+    import pandas as pd
+
+    scales = [parse_scale(s) for s in FULL_SCALES] if args.full else args.scales or [parse_scale(s) for s in QUICK_SCALES]
+    report = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "workers": args.workers,
+        "excel": not args.no_excel,
+        "compacto": args.compact,
+        "resultados": [],
+    }
+    for n, days in scales:
+        t0 = time.perf_counter()
+        manifest = dataset(args.data, n, days, args.sap, args.seed, args.start)
+        gen = time.perf_counter() - t0
+        res = run_isolated(manifest, args.workers, not args.no_excel, args.repeat, args.compact)
+        res = {"escala": f"{n}x{days}", "sap": args.sap, "segundos_datos": round(gen, 2),
+               "manifiesto": {k: v for k, v in manifest.items() if k != "archivos"}, **res}
+        report["resultados"].append(res)
+        print_result(res)
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance, args.min_seconds)
+        if regressions:
+            print("\n[Regresiones]", file=sys.stderr)
+            for r in regressions:
+                print(f"  {r}", file=sys.stderr)
+            return 1
+        print("\nSin regresiones frente a la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
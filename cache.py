@@ -0,0 +1,151 @@
+"""
+Caché en disco de fuentes ya parseadas y normalizadas.
+
+La llave es el hash del contenido del archivo (más la fuente, el motor de lectura y la
+versión de parsers), así que volver a cargar el mismo MasterData, funciones o Retiros
+evita leer el Excel. Cada entrada guarda el intermedio normalizado en Parquet (pickle si
+pyarrow no está instalado) y un JSON con columnas detectadas y metadatos. El tamaño total
+se acota expulsando las entradas usadas hace más tiempo (LRU por fecha de acceso).
+"""
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+DEFAULT_DIR = Path(os.environ.get("AUSENCIAS_CACHE_DIR", Path.home() / ".cache" / "ausencias_sin_soporte"))
+DEFAULT_MAX_MB = float(os.environ.get("AUSENCIAS_CACHE_MAX_MB", 1024))
+
+
+def _restore_dtypes(frame: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Devuelve a cada columna el dtype con que se guardó: Parquet no tiene fechas en segundos
+    y pandas 3 lee los textos como `str`, así que un acierto no sería igual a un parseo nuevo.
+    """
+    for col in frame.columns:
+        dtype = dtypes.get(str(col))
+        if dtype is None or str(frame[col].dtype) == dtype:
+            continue
+        if dtype == "object":
+            values = frame[col]
+            frame[col] = values.astype(object).where(values.notna(), None)
+        else:
+            frame[col] = frame[col].astype(dtype)
+    return frame
+
+
+class ParseCache:
+    """Caché LRU en disco de intermedios normalizados, direccionada por contenido."""
+
+    def __init__(self, directory=None, max_mb: float | None = None):
+        self.directory = Path(directory or DEFAULT_DIR)
+        self.max_bytes = int((DEFAULT_MAX_MB if max_mb is None else max_mb) * 1024 * 1024)
+
+    @staticmethod
+    def key(source: str, file_bytes, *parts) -> str:
+        """
+        Llave de la entrada: hash del contenido + fuente + partes extra (versión, motor).
+        `file_bytes` puede ser una ruta: se hashea leyendo por bloques.
+        """
+        if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+            h = hashlib.sha256(file_bytes)
+        else:
+            h = hashlib.sha256()
+            with open(file_bytes, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+        for p in (source, *parts):
+            h.update(b"\0" + str(p).encode())
+        return h.hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path, Path]:
+        return (
+            self.directory / f"{key}.json",
+            self.directory / f"{key}.parquet",
+            self.directory / f"{key}.pkl",
+        )
+
+    def get(self, key: str):
+        """Retorna (columnas, intermedio, meta) o None si no está en caché."""
+        meta_path, pq_path, pkl_path = self._paths(key)
+        try:
+            info = json.loads(meta_path.read_text(encoding="utf-8"))
+            if info["storage"] == "parquet":
+                frame, data_path = pd.read_parquet(pq_path), pq_path
+            else:
+                frame, data_path = pd.read_pickle(pkl_path), pkl_path
+            frame = _restore_dtypes(frame, info.get("dtypes", {}))
+            for p in (meta_path, data_path):
+                os.utime(p)  # marca de uso para LRU
+        except (OSError, ValueError, KeyError, ImportError, EOFError, pickle.UnpicklingError):
+            # Entrada ausente, a medio escribir o dañada: se trata como fallo y se vuelve a parsear
+            return None
+        return info["cols"], frame, {**info["meta"], "cache": True}
+
+    def put(self, key: str, cols: dict, frame: pd.DataFrame, meta: dict):
+        """Guarda una entrada (escritura atómica) y aplica el límite de tamaño."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path, pq_path, pkl_path = self._paths(key)
+        storage = "parquet" if HAS_PARQUET else "pickle"
+        data_path = pq_path if HAS_PARQUET else pkl_path
+
+        tmp = data_path.with_suffix(data_path.suffix + ".tmp")
+        if HAS_PARQUET:
+            frame.to_parquet(tmp, index=False)
+        else:
+            frame.to_pickle(tmp)
+        os.replace(tmp, data_path)
+
+        tmp = meta_path.with_suffix(".json.tmp")
+        dtypes = {str(c): str(t) for c, t in frame.dtypes.items()}
+        tmp.write_text(json.dumps({"storage": storage, "cols": cols, "meta": meta, "dtypes": dtypes}),
+                       encoding="utf-8")
+        os.replace(tmp, meta_path)
+
+        self._evict()
+
+    def _entries(self) -> list[tuple[float, int, list[Path]]]:
+        """(último acceso, bytes, archivos) por entrada."""
+        if not self.directory.exists():
+            return []
+        groups = {}
+        for p in self.directory.iterdir():
+            if p.suffix in (".json", ".parquet", ".pkl"):
+                groups.setdefault(p.stem, []).append(p)
+        out = []
+        for files in groups.values():
+            stats = [f.stat() for f in files]
+            out.append((max(s.st_mtime for s in stats), sum(s.st_size for s in stats), files))
+        return out
+
+    def size(self) -> int:
+        """Tamaño total de la caché en bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Expulsa las entradas menos usadas hasta quedar bajo max_bytes."""
+        entries = sorted(self._entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        for _, size, files in entries:
+            if total <= self.max_bytes:
+                break
+            for f in files:
+                f.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> int:
+        """Elimina todas las entradas; retorna cuántas había."""
+        entries = self._entries()
+        for _, _, files in entries:
+            for f in files:
+                f.unlink(missing_ok=True)
+        return len(entries)
@@ -0,0 +1,207 @@
+"""
+Ejecución por línea de comandos (sin Streamlit), pensada para corridas programadas.
+
+Ejemplos:
+    python -m cli --horas h.xlsx --ausrep a.xlsx --retiros r.xlsx --md md.xlsx \
+        --func f.xlsx --aussap sap.txt --period 2024-01-01 2024-01-31
+
+    # Un libro por mes de 2024, evaluados en paralelo, con resumen de tiempos
+    python -m cli ... --months 2024-01 2024-12 --out salida/ --profile
+
+    # Un solo libro consolidado
+    python -m cli ... --months 2024-01 2024-12 --consolidated
+
+Los módulos de procesamiento (pandas, openpyxl) se importan solo después de validar
+los argumentos, así `--help` y los errores de uso responden de inmediato.
+"""
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+# Fuente -> archivo esperado (mismo orden que sources.SOURCE_KEYS)
+FILE_ARGS = {
+    "horas": "Rep_Horas_laboradas",
+    "ausrep": "Rep_aususentismos",
+    "retiros": "Retiros",
+    "md": "Md_activos",
+    "func": "funciones_marcación",
+    "aussap": "Ausentismos_SAP",
+}
+
+OUTPUT_FORMATS = ["xlsx", "csv", "parquet", "csv.gz"]
+
+
+def parse_date(value: str) -> date:
+    """Fecha ISO (AAAA-MM-DD)."""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida: {value!r} (se espera AAAA-MM-DD)")
+
+
+def month_periods(first: str, last: str) -> list[tuple[date, date]]:
+    """Periodos mensuales (inicio, fin) desde el mes `first` hasta `last` (AAAA-MM)."""
+    y, m = map(int, first.split("-"))
+    y_last, m_last = map(int, last.split("-"))
+    periods = []
+    while (y, m) <= (y_last, m_last):
+        start = date(y, m, 1)
+        nxt = date(y + m // 12, m % 12 + 1, 1)
+        periods.append((start, nxt - timedelta(days=1)))
+        y, m = nxt.year, nxt.month
+    return periods
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m cli", description="Ausencias sin soporte (modo consola)")
+    for key, name in FILE_ARGS.items():
+        p.add_argument(f"--{key}", required=True, type=Path, metavar="ARCHIVO", help=name)
+
+    when = p.add_mutually_exclusive_group(required=True)
+    when.add_argument("--period", nargs=2, action="append", type=parse_date, metavar=("INICIO", "FIN"),
+                      help="Periodo AAAA-MM-DD AAAA-MM-DD (se puede repetir)")
+    when.add_argument("--months", nargs=2, metavar=("DESDE", "HASTA"),
+                      help="Un periodo por mes, de AAAA-MM a AAAA-MM")
+
+    p.add_argument("--out", type=Path, default=Path("."), help="Carpeta de salida (por defecto la actual)")
+    p.add_argument("--format", choices=OUTPUT_FORMATS, default="xlsx",
+                   help="xlsx: un libro por periodo; csv: una carpeta con un CSV por hoja; "
+                        "parquet / csv.gz: un zip con un archivo por hoja")
+    p.add_argument("--consolidated", action="store_true", help="Una sola salida con todos los periodos")
+    p.add_argument("--workers", type=int, default=None, help="Procesos para lectura y evaluación (1 = secuencial)")
+    p.add_argument("--read-engine", choices=["openpyxl", "calamine"], default=None,
+                   help="Motor de lectura de Excel (por defecto calamine si está instalado)")
+    p.add_argument("--write-engine", choices=["xlsxwriter", "openpyxl"], default=None,
+                   help="Motor de escritura de Excel (por defecto xlsxwriter si está instalado)")
+    p.add_argument("--no-cache", action="store_true", help="No usar la caché de archivos parseados")
+    p.add_argument("--profile", action="store_true", help="Imprime en stderr el tiempo de cada etapa")
+    p.add_argument("--metrics", type=Path, default=None, metavar="ARCHIVO",
+                   help="Agrega a ARCHIVO (JSON Lines) las métricas por etapa de cada salida")
+    p.add_argument("--shadow", action="store_true",
+                   help="Compara cada periodo con la implementación de referencia (lento); código 1 si hay diferencias")
+    p.add_argument("--compact", action="store_true",
+                   help="Tipos compactos en el grid (categóricas, datetime64); mismas hojas, menos memoria")
+    p.add_argument("--verbose", action="store_true", help="Imprime en stderr los logs del procesamiento")
+    return p
+
+
+def write_result(result: dict, out_dir: Path, fmt: str) -> Path:
+    """Escribe un resultado en disco y retorna la ruta creada."""
+    if fmt == "xlsx":
+        return result["excel_path"]
+    if fmt != "csv":
+        return result["tables_path"]
+
+    from writers import write_sheet_csv
+
+    path = out_dir / Path(result["file_name"]).stem
+    path.mkdir(parents=True, exist_ok=True)
+    dfs = result["dfs"]
+    for sheet in dfs:
+        with open(path / f"{sheet}.csv", "w", encoding="utf-8-sig", newline="") as fh:
+            write_sheet_csv(dfs, sheet, fh)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.months:
+        try:
+            periods = month_periods(*args.months)
+        except ValueError:
+            parser.error(f"meses inválidos: {args.months} (se espera AAAA-MM)")
+    else:
+        periods = [tuple(p) for p in args.period]
+    if not periods:
+        parser.error("no hay periodos para procesar")
+    for start, end in periods:
+        if end < start:
+            parser.error(f"periodo inválido: {start} > {end}")
+    for key in FILE_ARGS:
+        if not getattr(args, key).is_file():
+            parser.error(f"--{key}: no existe el archivo {getattr(args, key)}")
+
+    timings = []
+    t0 = time.perf_counter()
+
+    from processor import AusenciasProcessor
+    from cache import ParseCache
+    timings.append(("importar módulos", time.perf_counter() - t0))
+
+    # Se pasan las rutas: cada fuente se lee desde disco al cargarla (el SAP grande, por bloques)
+    files = {}
+    for key in FILE_ARGS:
+        path = getattr(args, key)
+        name = path.name.lower() if key == "aussap" else path.name
+        files[key] = {"path": path, "name": name}
+
+    cache = None if args.no_cache else ParseCache()
+    tables_format = args.format if args.format in ("parquet", "csv.gz") else None
+    processor = AusenciasProcessor(*periods[0], read_engine=args.read_engine, workers=args.workers,
+                                   cache=cache, write_engine=args.write_engine, tables_format=tables_format,
+                                   shadow=args.shadow, compact=args.compact)
+
+    t = time.perf_counter()
+    prepared = processor.prepare(files)
+    timings.append(("preparar datos", time.perf_counter() - t))
+    if prepared is None:
+        print("\n".join(processor.logs), file=sys.stderr)
+        return 1
+
+    # xlsx y zip de tablas se escriben directamente en --out (en cada proceso, sin pasar por memoria)
+    build_excel = args.format == "xlsx"
+    t = time.perf_counter()
+    if args.consolidated:
+        results = processor.evaluate_periods(prepared, periods, workers=args.workers,
+                                             build_excel=False, build_tables=False)
+    else:
+        # Solo la salida CSV necesita las hojas en este proceso
+        results = processor.evaluate_periods(prepared, periods, workers=args.workers,
+                                             build_excel=build_excel, output_dir=args.out,
+                                             return_dfs=args.format == "csv")
+    timings.append((f"evaluar {len(periods)} periodo(s)", time.perf_counter() - t))
+
+    if args.consolidated:
+        t = time.perf_counter()
+        results = [processor.consolidate(results, build_excel=build_excel, output_dir=args.out)]
+        timings.append(("consolidar", time.perf_counter() - t))
+
+    if args.verbose:
+        print("\n".join(results[0]["logs"]), file=sys.stderr)
+
+    t = time.perf_counter()
+    args.out.mkdir(parents=True, exist_ok=True)
+    for r in results:
+        print(write_result(r, args.out, args.format))
+    timings.append(("escribir salida", time.perf_counter() - t))
+
+    if args.metrics:
+        args.metrics.parent.mkdir(parents=True, exist_ok=True)
+        with args.metrics.open("a", encoding="utf-8") as fh:
+            for r in results:
+                fh.write(r["metrics_json"] + "\n")
+
+    status = 0
+    if args.shadow:
+        diffs = [d for r in results for d in r["shadow"]]
+        for d in diffs:
+            print(f"[Shadow] DIFERENCIA {d}", file=sys.stderr)
+        print(f"[Shadow] {len(diffs)} diferencia(s) frente a la referencia", file=sys.stderr)
+        status = 1 if diffs else 0
+
+    if args.profile:
+        total = time.perf_counter() - t0
+        print("[Perfil]", file=sys.stderr)
+        for stage, secs in timings:
+            print(f"  {stage:<28} {secs:8.2f}s", file=sys.stderr)
+        print(f"  {'total':<28} {total:8.2f}s", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Grid denso id × fecha sobre arreglos NumPy.
+
+Cada fila es un ID (código entero = posición en `ids`) y cada columna un día del periodo
+(código entero = días desde el inicio). Los flags diarios se guardan como matrices
+booleanas 2-D y los atributos por ID como arreglos 1-D; solo se materializa en DataFrame
+el subconjunto de celdas que se pida.
+
+Con `compact=True` `frame` no crea objetos por celda: el id sale como categórica sobre `ids`
+(los códigos de fila son sus códigos) y la fecha como datetime64; los atributos salen con
+el tipo con que se guardaron (categóricas, datetime64[D]).
+"""
+import numpy as np
+import pandas as pd
+
+from utils import to_day64
+
+
+class DenseGrid:
+    """Grid id × fecha con capas booleanas por celda y atributos por ID."""
+
+    def __init__(self, ids, period_start, period_end, compact: bool = False):
+        self.ids = pd.Index(ids)
+        self.compact = compact
+        self.start = np.datetime64(period_start, "D")
+        self.dates = np.arange(self.start, np.datetime64(period_end, "D") + np.timedelta64(1, "D"))
+        self.cells = {}
+        self.attrs = {}
+
+    @property
+    def shape(self) -> tuple:
+        return len(self.ids), len(self.dates)
+
+    def id_codes(self, values) -> np.ndarray:
+        """Código de fila para cada ID (-1 si no está en el universo)."""
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            # Se resuelve una vez por categoría y se indexa por código
+            lut = np.append(self.ids.get_indexer(values.cat.categories), -1)
+            return lut[values.cat.codes.to_numpy()]
+        return self.ids.get_indexer(pd.Index(values))
+
+    def day_codes(self, values) -> np.ndarray:
+        """Código de columna para cada fecha (-1 si es nula o cae fuera del periodo)."""
+        days = to_day64(values)
+        codes = np.full(len(days), -1, dtype=np.int64)
+        ok = ~np.isnat(days)
+        codes[ok] = (days[ok] - self.start).astype(np.int64)
+        codes[(codes < 0) | (codes >= len(self.dates))] = -1
+        return codes
+
+    def mark_days(self, df, id_col="id", fecha_col="fecha") -> np.ndarray:
+        """Matriz booleana con True en cada (id, fecha) presente en df."""
+        out = np.zeros(self.shape, dtype=bool)
+        if df is None or df.empty:
+            return out
+        r = self.id_codes(df[id_col])
+        c = self.day_codes(df[fecha_col])
+        ok = (r >= 0) & (c >= 0)
+        out[r[ok], c[ok]] = True
+        return out
+
+    def mark_ranges(self, rng, id_col="id", ini_col="ini", fin_col="fin") -> np.ndarray:
+        """
+        Matriz booleana con True en cada día cubierto por algún rango (ya recortado al periodo).
+        Usa un arreglo de diferencias: +1 al inicio, -1 después del fin y suma acumulada por fila.
+        """
+        n_ids, n_days = self.shape
+        if rng is None or rng.empty:
+            return np.zeros(self.shape, dtype=bool)
+        r = self.id_codes(rng[id_col])
+        c_ini = self.day_codes(rng[ini_col])
+        c_fin = self.day_codes(rng[fin_col])
+        ok = (r >= 0) & (c_ini >= 0) & (c_fin >= 0)
+        diff = np.zeros((n_ids, n_days + 1), dtype=np.int32)
+        np.add.at(diff, (r[ok], c_ini[ok]), 1)
+        np.add.at(diff, (r[ok], c_fin[ok] + 1), -1)
+        return np.cumsum(diff[:, :n_days], axis=1) > 0
+
+    def lookup(self, df, col, id_col="id", dtype=object, fill=np.nan) -> np.ndarray:
+        """
+        Alinea una columna de df al orden de `ids` (primer registro por ID, `fill` si falta).
+        Con dtype datetime64[D] el faltante es NaT.
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind == "M":
+            fill = np.datetime64("NaT", "ns")
+        out = np.full(len(self.ids), fill, dtype=dtype)
+        r = self.id_codes(df[id_col])
+        ok = r >= 0
+        codes, first = np.unique(r[ok], return_index=True)
+        out[codes] = df[col].to_numpy(dtype=dtype)[ok][first]
+        return out
+
+    def frame(self, mask, rows=None, extra=None) -> pd.DataFrame:
+        """
+        Materializa en DataFrame las celdas donde mask es True (orden id, fecha).
+        Con `rows` (códigos de fila) solo se materializan esas filas, en ese orden.
+        `extra` agrega atributos por ID que no están en `attrs` (arreglos alineados a `ids`).
+        """
+        mask = np.broadcast_to(mask, self.shape)
+        if rows is None:
+            r, c = np.nonzero(mask)
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            rr, c = np.nonzero(mask[rows])
+            r = rows[rr]
+        if self.compact:
+            data = {
+                "id": pd.Categorical.from_codes(r, categories=self.ids),
+                "fecha": self.dates[c],
+            }
+        else:
+            data = {
+                "id": self.ids.to_numpy()[r],
+                "fecha": self.dates.astype(object)[c],
+            }
+        for name, values in {**self.attrs, **(extra or {})}.items():
+            data[name] = values[r]
+        for name, values in self.cells.items():
+            data[name] = values[r, c]
+        return pd.DataFrame(data)
@@ -0,0 +1,191 @@
+"""
+Trabajos en segundo plano para la app: pool acotado, cola de admisión, avance y cancelación.
+
+Un `JobManager` por servidor (compartido entre sesiones) ejecuta a lo sumo `max_workers`
+procesamientos a la vez; los demás esperan en cola (FIFO) y si la cola está llena el envío
+se rechaza con `QueueFull`, así la memoria del servidor queda acotada aunque haya muchos
+usuarios al cierre de mes. Cada trabajo tiene un id con el que se recupera su estado y su
+resultado en cualquier rerun (o sesión) mientras esté retenido.
+
+El avance es por etapa: la función del trabajo pasa `job.report` como callback `progress`
+de `AusenciasProcessor` (o de los escritores, por parte escrita). La cancelación es
+cooperativa: un trabajo en cola se descarta y uno en ejecución se corta al cerrar la
+siguiente etapa (`report` lanza `JobCancelled`). En la carga cada fuente cuenta como una
+etapa: si se cancela, las fuentes que ya se están parseando en el pool de procesos terminan
+antes de que el trabajo se detenga.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_JOBS = int(os.environ.get("AUSENCIAS_MAX_JOBS", 2))
+DEFAULT_MAX_QUEUE = int(os.environ.get("AUSENCIAS_MAX_QUEUE", 8))
+DEFAULT_KEEP = int(os.environ.get("AUSENCIAS_KEEP_JOBS", 6))
+
+EN_COLA = "en_cola"
+EJECUTANDO = "ejecutando"
+LISTO = "listo"
+ERROR = "error"
+CANCELADO = "cancelado"
+TERMINADOS = (LISTO, ERROR, CANCELADO)
+
+
+class QueueFull(Exception):
+    """La cola de admisión está llena; hay que reintentar más tarde."""
+
+
+class JobCancelled(Exception):
+    """Se pidió cancelar el trabajo (lo lanza `Job.report` en la siguiente etapa)."""
+
+
+class Job:
+    """Estado de un trabajo. `total` es el número esperado de etapas (para la barra de avance)."""
+
+    def __init__(self, label: str = "", total: int | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.total = total
+        self.status = EN_COLA
+        self.stage = None
+        self.done = 0
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def progress(self) -> float:
+        """Fracción completada (0-1); 1 solo al terminar bien."""
+        if self.status == LISTO:
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 0.99)
+
+    @property
+    def terminated(self) -> bool:
+        return self.status in TERMINADOS
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, record=None):
+        """Callback de avance: registra la etapa cerrada o corta el trabajo si se canceló."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.done += 1
+        if record is not None:
+            self.stage = record["etapa"] if isinstance(record, dict) else str(record)
+
+    def seconds(self) -> float | None:
+        """Segundos en ejecución (hasta ahora o hasta que terminó)."""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+
+class JobManager:
+    """Pool acotado de trabajos con cola de admisión y retención de los terminados."""
+
+    def __init__(self, max_workers: int | None = None, max_queue: int | None = None, keep: int | None = None):
+        self.max_workers = max(1, DEFAULT_MAX_JOBS if max_workers is None else int(max_workers))
+        self.max_queue = max(0, DEFAULT_MAX_QUEUE if max_queue is None else int(max_queue))
+        self.keep = max(1, DEFAULT_KEEP if keep is None else int(keep))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ausencias-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, label: str = "", total: int | None = None) -> Job:
+        """
+        Encola fn(job) y retorna el trabajo. fn recibe el Job (para `job.report`) y su
+        retorno queda en `job.result`. Lanza QueueFull si la cola de admisión está llena.
+        """
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == EN_COLA)
+            running = sum(1 for j in self._jobs.values() if j.status == EJECUTANDO)
+            if running >= self.max_workers and queued >= self.max_queue:
+                raise QueueFull(f"{running} trabajos en ejecución y {queued} en cola")
+            job = Job(label, total)
+            self._jobs[job.id] = job
+            self._evict()
+            job._future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn):
+        with self._lock:
+            if job._cancel.is_set():
+                job.status, job.finished = CANCELADO, time.time()
+                return
+            job.status, job.started = EJECUTANDO, time.time()
+        status = LISTO
+        try:
+            job.result = fn(job)
+        except JobCancelled:
+            status = CANCELADO
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+            status = ERROR
+        with self._lock:
+            job.status, job.finished = status, time.time()
+            self._evict()
+
+    def _evict(self):
+        """Descarta los trabajos terminados más antiguos por encima de `keep` (libera sus resultados)."""
+        done = [job_id for job_id, j in self._jobs.items() if j.terminated]
+        for job_id in done[:max(0, len(done) - self.keep)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str | None) -> Job | None:
+        """Trabajo por id (None si no existe o ya fue descartado)."""
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Pide cancelar el trabajo. Retorna False si no existe o ya terminó."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.terminated:
+                return False
+            job._cancel.set()
+            if job.status == EN_COLA and job._future.cancel():
+                job.status, job.finished = CANCELADO, time.time()
+            return True
+
+    def position(self, job_id: str) -> int | None:
+        """Posición en la cola (1 = el siguiente en ejecutarse); None si no está en cola."""
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j.status == EN_COLA]
+        for i, j in enumerate(queued, start=1):
+            if j.id == job_id:
+                return i
+        return None
+
+    def stats(self) -> dict:
+        """Conteo de trabajos retenidos por estado."""
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {s: statuses.count(s) for s in (EN_COLA, EJECUTANDO, *TERMINADOS)}
+
+    def discard(self, job_id: str):
+        """Olvida un trabajo terminado (su resultado ya se recogió)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.terminated:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = True):
+        """Cancela lo que está en cola y cierra el pool."""
+        with self._lock:
+            queued = [job_id for job_id, j in self._jobs.items() if j.status == EN_COLA]
+        for job_id in queued:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=wait)
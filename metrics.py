@@ -0,0 +1,97 @@
+"""
+Instrumentación por etapa del procesamiento.
+
+Cada etapa registra tiempo de reloj, filas producidas, memoria del intermedio
+(DataFrame con `deep=True` o arreglos NumPy) y el pico de RSS del proceso que la ejecutó
+(las fuentes cargadas en el pool reportan el pico de su propio proceso).
+Los registros se exponen como DataFrame (hoja "Diagnostico") y como JSON para monitoreo.
+`on_record` (opcional) recibe cada registro nuevo, p. ej. para mostrar el avance de un trabajo.
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:  # Windows
+    HAS_RESOURCE = False
+
+
+COLUMNS = ["etapa", "segundos", "filas", "memoria_mb", "rss_pico_mb", "detalle"]
+
+
+def peak_rss_mb() -> float | None:
+    """Pico de memoria residente del proceso actual en MB (None si no se puede medir)."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def memory_mb(obj) -> float | None:
+    """Memoria en MB de un DataFrame/Series, un arreglo NumPy o un dict de ellos."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        sizes = [memory_mb(v) for v in obj.values()]
+        return round(sum(s for s in sizes if s is not None), 3)
+    if isinstance(obj, pd.DataFrame):
+        nbytes = obj.memory_usage(index=True, deep=True).sum()
+    elif isinstance(obj, pd.Series):
+        nbytes = obj.memory_usage(index=True, deep=True)
+    elif isinstance(obj, np.ndarray):
+        nbytes = obj.nbytes
+    else:
+        return None
+    return round(nbytes / (1024 * 1024), 3)
+
+
+class Metrics:
+    """Registros de instrumentación (uno por etapa, en orden de ejecución)."""
+
+    def __init__(self, records=None, on_record=None):
+        self.records = [dict(r) for r in records or []]
+        self.on_record = on_record
+
+    def add(self, etapa: str, segundos: float, filas=None, memoria_mb=None, rss_pico_mb=None, detalle=""):
+        """Agrega el registro de una etapa ya medida."""
+        self.records.append({
+            "etapa": etapa,
+            "segundos": round(float(segundos), 4),
+            "filas": None if filas is None else int(filas),
+            "memoria_mb": memoria_mb,
+            "rss_pico_mb": peak_rss_mb() if rss_pico_mb is None else rss_pico_mb,
+            "detalle": detalle,
+        })
+        if self.on_record is not None:
+            self.on_record(self.records[-1])
+
+    @contextmanager
+    def stage(self, etapa: str, detalle: str = ""):
+        """
+        Mide una etapa. El bloque puede completar filas, memoria y detalle:
+
+            with metrics.stage("_process_retiros") as st:
+                ret = ...
+                st["filas"], st["memoria_mb"] = len(ret), memory_mb(ret)
+        """
+        info = {"filas": None, "memoria_mb": None, "detalle": detalle}
+        t0 = time.perf_counter()
+        yield info
+        self.add(etapa, time.perf_counter() - t0, **info)
+
+    def frame(self) -> pd.DataFrame:
+        """Registros como DataFrame."""
+        return pd.DataFrame(self.records, columns=COLUMNS).astype({"filas": "Int64"})
+
+    def to_json(self, **extra) -> str:
+        """JSON con los registros en 'etapas' y los campos extra (periodo, archivo, ...)."""
+        total = round(sum(r["segundos"] for r in self.records), 4)
+        return json.dumps({**extra, "segundos_total": total, "etapas": self.records},
+                          ensure_ascii=False, default=str)
@@ -1,111 +1,324 @@
 """
 Parsers para archivos SAP y otros formatos.
 """
-import re
 import io
+import os
+import re
+import numpy as np
 import pandas as pd
-from utils import clean_id
+from utils import clean_ids
 
 
-def _parse_sap_from_dataframe(raw: pd.DataFrame) -> pd.DataFrame:
-    """Parse SAP data desde un DataFrame."""
-    date_re = re.compile(r"^\d{2}\.\d{2}\.\d{4}$")
-    num_re = re.compile(r"^\d{6,15}$")
+SAP_COLUMNS = ["id", "ini", "fin", "pernr"]
+
+DATE_PATTERN = r"\d{2}\.\d{2}\.\d{4}"
+NUM_PATTERN = r"\d{6,15}"
+
+
+def _sap_frame(df: pd.DataFrame | None) -> pd.DataFrame:
+    """Arma el DataFrame SAP (id, ini, fin, pernr) limpiando los IDs por columna."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=SAP_COLUMNS)
+    df = df[SAP_COLUMNS].reset_index(drop=True)
+    df["id"] = clean_ids(df["id"])
+    return df
+
 
-    def parse_row(row):
-        s = "\t".join([str(v) for v in row if pd.notna(v)])
-        parts = [p.strip() for p in re.split(r"\t+", s) if p.strip() != ""]
+def _select_sap_fields(dates: pd.DataFrame, nums: pd.DataFrame) -> pd.DataFrame:
+    """
+    Selecciona los campos SAP por fila a partir de los tokens encontrados.
+    `dates` y `nums` tienen columnas (row, tok) en orden de aparición. Por fila:
+    ini/fin = primeras dos fechas, pernr = primer número, cédula = el número más largo
+    distinto de pernr (el primero en caso de empate). Se descartan filas incompletas.
+    """
+    dates = dates.assign(k=dates.groupby("row").cumcount())
+    nums = nums.assign(k=nums.groupby("row").cumcount())
 
-        dates = [p for p in parts if date_re.match(p)]
-        if len(dates) < 2:
-            return None
+    ini = dates.loc[dates["k"] == 0].set_index("row")["tok"]
+    fin = dates.loc[dates["k"] == 1].set_index("row")["tok"]
+    pernr = nums.loc[nums["k"] == 0].set_index("row")["tok"]
 
-        nums = [p for p in parts if num_re.match(p)]
-        if len(nums) < 2:
-            return None
+    cand = nums.loc[nums["k"] > 0]
+    cand = cand[cand["tok"].to_numpy() != pernr.reindex(cand["row"]).to_numpy()]
+    cedula = (
+        cand.assign(n=cand["tok"].str.len())
+        .sort_values(["row", "n", "k"], ascending=[True, False, True], kind="stable")
+        .drop_duplicates("row")
+        .set_index("row")["tok"]
+    )
 
-        pernr = nums[0]
-        cand = [n for n in nums[1:] if n != pernr]
-        if not cand:
-            return None
-        cedula = max(cand, key=len)
+    rows = fin.index.intersection(cedula.index).sort_values()
+    out = pd.DataFrame({
+        "id": cedula.reindex(rows),
+        "ini": pd.to_datetime(ini.reindex(rows), format="%d.%m.%Y", errors="coerce"),
+        "fin": pd.to_datetime(fin.reindex(rows), format="%d.%m.%Y", errors="coerce"),
+        "pernr": pernr.reindex(rows),
+    })
+    out = out[out["ini"].notna() & out["fin"].notna()]
+    out["ini"] = out["ini"].dt.date
+    out["fin"] = out["fin"].dt.date
+    return out
 
-        ini = pd.to_datetime(dates[0], format="%d.%m.%Y", errors="coerce")
-        fin = pd.to_datetime(dates[1], format="%d.%m.%Y", errors="coerce")
-        if pd.isna(ini) or pd.isna(fin):
-            return None
 
-        return {"id": clean_id(cedula), "ini": ini.date(), "fin": fin.date(), "pernr": pernr}
+def _parse_sap_from_dataframe(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse SAP data desde un DataFrame (vectorizado).
+    Cada celda no nula se parte por tabuladores en tokens; fechas y números deben
+    coincidir completos con el token.
+    """
+    arr = raw.to_numpy(dtype=object)
+    mask = pd.notna(arr)
+    rows, _ = np.nonzero(mask)
+    tokens = pd.Series(arr[mask], index=rows, dtype=object).astype(str)
+    if tokens.str.contains("\t", regex=False).any():
+        tokens = tokens.str.split("\t").explode()
+    tokens = tokens.str.strip()
+    tokens = tokens[tokens != ""]
+
+    tok = pd.DataFrame({"row": tokens.index.to_numpy(), "tok": tokens.to_numpy()})
+    dates = tok[tok["tok"].str.fullmatch(DATE_PATTERN)]
+    nums = tok[tok["tok"].str.fullmatch(NUM_PATTERN)]
+    return _sap_frame(_select_sap_fields(dates, nums))
 
-    rows = []
-    for i in range(len(raw)):
-        pr = parse_row(raw.iloc[i].tolist())
-        if pr:
-            rows.append(pr)
 
-    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=["id", "ini", "fin", "pernr"])
+def _extract_tokens(lines: pd.Series, pattern: str) -> pd.DataFrame:
+    """Todas las coincidencias de pattern (como palabra completa) por línea, en orden."""
+    found = lines.str.findall(rf"\b{pattern}\b").explode().dropna()
+    return pd.DataFrame({
+        "row": found.index.to_numpy(),
+        "tok": found.to_numpy(dtype=object),
+    })
 
 
 def _parse_sap_from_text_lines(lines) -> pd.DataFrame:
-    """Parse SAP data desde líneas de texto."""
-    date_re = re.compile(r"\b\d{2}\.\d{2}\.\d{4}\b")
-    num_re = re.compile(r"\b\d{6,15}\b")
-
-    out = []
-    for line in lines:
-        dates = date_re.findall(line)
-        if len(dates) < 2:
-            continue
+    """Parse SAP data desde líneas de texto (vectorizado con findall por columna)."""
+    lines = pd.Series(list(lines), dtype=object)
+    if lines.empty:
+        return _sap_frame(None)
+    return _sap_frame(_select_sap_fields(
+        _extract_tokens(lines, DATE_PATTERN),
+        _extract_tokens(lines, NUM_PATTERN),
+    ))
 
-        nums = num_re.findall(line)
-        if len(nums) < 2:
-            continue
 
-        pernr = nums[0]
-        cand = [n for n in nums[1:] if n != pernr]
-        if not cand:
-            continue
+# =========================
+# Modo streaming (texto / HTML grandes)
+# =========================
+SNIFF_BYTES = 64 * 1024
+STREAM_BATCH_ROWS = 50_000
+STREAM_MIN_BYTES = 16 * 1024 * 1024  # desde este tamaño parse_sap_report usa streaming
+
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def _open_binary(source):
+    """Abre bytes, ruta o archivo binario como stream binario (sin copiar el contenido)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    return source
+
+
+def _sniff_is_html(head: bytes) -> bool:
+    """Detecta HTML mirando solo los primeros KB."""
+    head = head.lower()
+    return b"<table" in head or b"<html" in head or b"<!doctype html" in head
+
+
+def _iter_text_lines(stream):
+    """Líneas del reporte de texto leídas por bloques (mismo corte que str.splitlines)."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="ignore")
+    for line in text:
+        yield from line.splitlines()
+
+
+def _cell_text(td) -> str:
+    """Texto de una celda normalizado como en pd.read_html."""
+    return _RE_WHITESPACE.sub(" ", "".join(td.itertext()).strip())
+
+
+def _iter_html_rows(stream):
+    """
+    Filas de la primera tabla HTML con lxml.etree.iterparse (incremental).
+    Omite el encabezado (thead o filas iniciales solo con th), expande colspan/rowspan
+    como pd.read_html y libera cada fila procesada.
+    """
+    from lxml import etree
 
-        cedula = max(cand, key=len)
+    depth = 0           # anidamiento de tablas
+    in_thead = False
+    seen_body = False
+    remainder = []      # (índice, texto, filas restantes) por rowspan
 
-        ini = pd.to_datetime(dates[0], format="%d.%m.%Y", errors="coerce")
-        fin = pd.to_datetime(dates[1], format="%d.%m.%Y", errors="coerce")
-        if pd.isna(ini) or pd.isna(fin):
+    for event, el in etree.iterparse(stream, events=("start", "end"), tag=("table", "thead", "tr"),
+                                     html=True, recover=True):
+        if el.tag == "table":
+            depth += 1 if event == "start" else -1
+            if event == "end" and depth == 0:
+                break
+            continue
+        if el.tag == "thead":
+            in_thead = event == "start"
             continue
+        if event != "end" or depth != 1:
+            continue
+
+        cells = [c for c in el if c.tag in ("td", "th")]
+        header = in_thead or (not seen_body and cells and all(c.tag == "th" for c in cells))
+        if not header and cells:
+            seen_body = True
+            texts, next_remainder, index = [], [], 0
+            for td in cells:
+                while remainder and remainder[0][0] <= index:
+                    prev_i, prev_text, prev_rows = remainder.pop(0)
+                    texts.append(prev_text)
+                    if prev_rows > 1:
+                        next_remainder.append((prev_i, prev_text, prev_rows - 1))
+                    index += 1
+                text = _cell_text(td)
+                rowspan = int(td.get("rowspan") or 1)
+                colspan = int(td.get("colspan") or 1)
+                for _ in range(colspan):
+                    texts.append(text)
+                    if rowspan > 1:
+                        next_remainder.append((index, text, rowspan - 1))
+                    index += 1
+            for prev_i, prev_text, prev_rows in remainder:
+                texts.append(prev_text)
+                if prev_rows > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rows - 1))
+            remainder = next_remainder
+            yield texts
 
-        out.append({"id": clean_id(cedula), "ini": ini.date(), "fin": fin.date(), "pernr": pernr})
+        # Liberar la fila y las ya procesadas para acotar memoria
+        el.clear()
+        parent = el.getparent()
+        while parent is not None and el.getprevious() is not None:
+            del parent[0]
 
-    return pd.DataFrame(out) if out else pd.DataFrame(columns=["id", "ini", "fin", "pernr"])
+    while remainder:
+        yield [t for _, t, _ in remainder]
+        remainder = [(i, t, n - 1) for i, t, n in remainder if n > 1]
 
 
-def parse_sap_report(file_bytes: bytes, filename: str) -> pd.DataFrame:
+def _batched(items, size):
+    """Agrupa un iterable en listas de hasta `size` elementos."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_sap_batches(source, batch_size: int = STREAM_BATCH_ROWS):
     """
-    Parser robusto para archivos SAP en diferentes formatos.
-    Intenta: Excel (.xls, .xlsx), HTML, y texto plano.
+    Parsea un reporte SAP de texto o HTML en modo streaming.
+
+    Detecta el formato con los primeros KB y luego recorre el archivo por bloques
+    (texto línea a línea, HTML con iterparse), entregando DataFrames (id, ini, fin, pernr)
+    por lotes de hasta `batch_size` filas de entrada. La memoria queda acotada por el lote.
+    Un HTML sin filas de tabla (p. ej. un spool dentro de <pre>) se vuelve a leer como texto.
+
+    Args:
+        source: bytes, ruta al archivo o archivo binario abierto.
     """
-    # 1) Excel por extensión
+    stream = _open_binary(source)
     try:
-        if filename.endswith(".xls"):
-            raw = pd.read_excel(io.BytesIO(file_bytes), sheet_name=0, header=None, engine="xlrd")
-        else:
-            raw = pd.read_excel(io.BytesIO(file_bytes), sheet_name=0, header=None, engine="openpyxl")
-        return _parse_sap_from_dataframe(raw)
-    except Exception:
-        pass
+        head = stream.read(SNIFF_BYTES)
+        stream.seek(0)
+        if _sniff_is_html(head):
+            found = False
+            for rows in _batched(_iter_html_rows(stream), batch_size):
+                found = True
+                yield _parse_sap_from_dataframe(pd.DataFrame(rows))
+            if found:
+                return
+            stream.seek(0)
+        for lines in _batched(_iter_text_lines(stream), batch_size):
+            yield _parse_sap_from_text_lines(lines)
+    finally:
+        if stream is not source:
+            stream.close()
 
-    # 2) HTML / texto
-    try:
-        txt = file_bytes.decode("utf-8", errors="ignore")
-    except Exception:
-        txt = file_bytes.decode("latin-1", errors="ignore")
 
-    if "<table" in txt.lower():
+def parse_sap_stream(source, batch_size: int = STREAM_BATCH_ROWS) -> pd.DataFrame:
+    """Consolida los lotes de iter_sap_batches en un único DataFrame SAP."""
+    batches = [b for b in iter_sap_batches(source, batch_size) if not b.empty]
+    return pd.concat(batches, ignore_index=True) if batches else _sap_frame(None)
+
+
+# =========================
+# Detección de formato
+# =========================
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # .xls binario (BIFF)
+ZIP_MAGIC = b"PK\x03\x04"                          # .xlsx (Office Open XML)
+
+
+def sniff_sap_format(head: bytes) -> str:
+    """
+    Detecta el formato real del archivo SAP por sus primeros bytes:
+    'xls' (OLE2), 'xlsx' (ZIP), 'html' o 'text'. Las descargas de spool SAP con
+    extensión .xls suelen ser HTML o texto tabulado.
+    """
+    if head.startswith(OLE2_MAGIC):
+        return "xls"
+    if head.startswith(ZIP_MAGIC):
+        return "xlsx"
+    if _sniff_is_html(head[:SNIFF_BYTES]):
+        return "html"
+    return "text"
+
+
+def read_head(source, n: int = SNIFF_BYTES) -> bytes:
+    """Primeros n bytes de bytes o de una ruta."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:n])
+    with open(source, "rb") as f:
+        return f.read(n)
+
+
+def parse_sap_report(file_bytes, stream: bool | None = None, fmt: str | None = None) -> pd.DataFrame:
+    """
+    Parser robusto para archivos SAP en diferentes formatos.
+    El formato se detecta por contenido (sniff_sap_format, no por el nombre del archivo) y se
+    despacha directo al parser que corresponde: Excel (.xls / .xlsx), HTML o texto plano.
+    `file_bytes` puede ser una ruta: en modo streaming el archivo se lee por bloques desde disco.
+    Con stream=True, HTML y texto se parsean por lotes sin decodificar el archivo completo;
+    con stream=None se activa automáticamente desde STREAM_MIN_BYTES.
+    Las celdas HTML se leen como texto en ambos modos (sin la inferencia de tipos de
+    pd.read_html, que con celdas vacías convierte los IDs a float y los descarta).
+    """
+    is_path = isinstance(file_bytes, (str, os.PathLike))
+    fmt = fmt or sniff_sap_format(read_head(file_bytes))
+    if stream is None:
+        size = os.path.getsize(file_bytes) if is_path else len(file_bytes)
+        stream = size >= STREAM_MIN_BYTES
+
+    # 1) Excel real (binario o xlsx)
+    if fmt in ("xls", "xlsx"):
         try:
-            tables = pd.read_html(txt)
-            if tables:
-                raw = tables[0].astype(str).reset_index(drop=True)
-                return _parse_sap_from_dataframe(raw)
+            engine = "xlrd" if fmt == "xls" else "openpyxl"
+            source = os.fspath(file_bytes) if is_path else io.BytesIO(file_bytes)
+            raw = pd.read_excel(source, sheet_name=0, header=None, engine=engine)
+            return _parse_sap_from_dataframe(raw)
         except Exception:
-            pass
+            # Excel dañado o protegido: se intenta como texto
+            fmt = "text"
+
+    # 2) HTML / texto
+    if stream:
+        return parse_sap_stream(file_bytes)
+    if is_path:
+        with open(file_bytes, "rb") as f:
+            file_bytes = f.read()
+
+    if fmt == "html":
+        rows = list(_iter_html_rows(io.BytesIO(file_bytes)))
+        if rows:
+            return _parse_sap_from_dataframe(pd.DataFrame(rows))
 
-    return _parse_sap_from_text_lines(txt.splitlines())
+    return _parse_sap_from_text_lines(file_bytes.decode("utf-8", errors="ignore").splitlines())
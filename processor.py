@@ -1,83 +1,259 @@
 """
 Procesador principal: toda la lógica de cálculos y generación de reportes.
 """
+import os
+import time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from datetime import timedelta
 from io import BytesIO
 
-from utils import (
-    clean_id, expand_ranges, effective_date_from_list,
-    safe_select, find_col, normalize_cols
+from utils import clip_ranges, safe_select, to_display
+from sources import SOURCE_COLUMNS, SOURCE_KEYS, SOURCE_REQUIRED, load_sources, process_pool
+from grid import DenseGrid
+from metrics import Metrics, memory_mb
+from reference import ReferenceProcessor, compare_sheets
+from writers import (
+    TABLE_FORMATS, Sheets, sheet_chunks, sheet_rows, tables_file_name, write_excel, write_tables_zip
 )
-from parsers import parse_sap_report
+import rules
 
 
-class AusenciasProcessor:
-    """Procesador de ausencias sin soporte."""
+# Etapas que registran prepare y evaluate (en `metrics` y en `progress`). La carga registra
+# además 'carga:<fuente>' por cada fuente y 'parse_sap_report' si el SAP no viene de la caché;
+# evaluate agrega 'shadow_referencia', '_build_excel' y 'tablas_zip' según las opciones.
+PREPARE_STAGES = ("_validate_columns", "_process_retiros", "_process_masterdata", "universo_ids")
+EVALUATE_STAGES = (
+    "_effective_dates", "_process_ausentismos_reporte", "recorte_sap", "_build_grid", "listas_fechas",
+    "_calculate_ausencias_sin_soporte", "_generate_summary", "hojas_adicionales",
+)
+
+
+def expected_stages(prepare: bool = True) -> int:
+    """
+    Etapas que registra prepare (si `prepare`) + evaluate sin salidas ni modo sombra: el total
+    de una barra de avance. Es cota superior: con el SAP en caché hay una etapa menos.
+    """
+    n = len(EVALUATE_STAGES)
+    if prepare:
+        n += len(SOURCE_KEYS) + 1 + len(PREPARE_STAGES)
+    return n
+
+
+class PreparedDataset:
+    """
+    Datos preparados que no dependen del periodo: fuentes normalizadas, mapeo de columnas,
+    universo de IDs, listas de retiros/ingresos y atributos de MasterData alineados a los IDs.
+    Se puede evaluar contra varios periodos sin volver a leer ni normalizar archivos.
+    `logs` y `metrics` (registros de instrumentación) son los de la preparación.
+    `files` (archivos originales) solo se conserva en modo sombra.
+    """
+
+    def __init__(self, src, col_map, ids, ret_list, ing_list, info_master, autorizado, logs, metrics=None,
+                 files=None):
+        self.src = src
+        self.col_map = col_map
+        self.ids = ids
+        self.ret_list = ret_list
+        self.ing_list = ing_list
+        self.info_master = info_master
+        self.autorizado = autorizado
+        self.logs = logs
+        self.metrics = metrics or []
+        self.files = files
+
+
+# Datos preparados de cada proceso del pool de evaluación de periodos
+_WORKER_PREPARED = None
+
+
+def _init_period_worker(prepared):
+    """Inicializa un proceso del pool: recibe los datos preparados una sola vez."""
+    global _WORKER_PREPARED
+    _WORKER_PREPARED = prepared
+
+
+def _evaluate_period(period, write_engine, tables_format, shadow, compact, build_excel, build_tables, output_dir,
+                     return_dfs=True):
+    """
+    Evalúa un periodo (inicio, fin) sobre los datos preparados del proceso. Sin `return_dfs`
+    el resultado no trae las hojas (no se materializan para enviarlas al proceso principal).
+    """
+    processor = AusenciasProcessor(*period, write_engine=write_engine, tables_format=tables_format, shadow=shadow,
+                                   compact=compact)
+    result = processor.evaluate(_WORKER_PREPARED, build_excel=build_excel, build_tables=build_tables,
+                                output_dir=output_dir)
+    return result if return_dfs else {**result, 'dfs': None}
 
-    def __init__(self, period_start, period_end):
+
+class AusenciasProcessor:
+    """
+    Procesador de ausencias sin soporte.
+    Con `shadow=True` cada periodo también se calcula con la implementación de referencia
+    (`reference.py`) y las diferencias quedan en los logs y en el resultado ('shadow').
+    Con `compact=True` el grid guarda los atributos con tipos compactos (id, función, estado
+    y listas como categóricas; fechas efectivas como datetime64[D]) y las filas de detalle se
+    arman sin objetos por celda; las hojas vuelven a los tipos de presentación al generarse,
+    así que el resultado es el mismo que sin el modo compacto.
+    `progress` (opcional) se llama con el registro de cada etapa de prepare / evaluate al
+    cerrarse; si lanza una excepción (p. ej. al cancelar un trabajo) el procesamiento se corta.
+    """
+
+    def __init__(self, period_start, period_end, read_engine: str | None = None,
+                 workers: int | None = None, cache=None, write_engine: str | None = None,
+                 tables_format: str | None = None, shadow: bool = False, compact: bool = False,
+                 progress=None):
         self.period_start = period_start
         self.period_end = period_end
+        self.read_engine = read_engine
+        self.workers = workers
+        self.cache = cache
+        self.write_engine = write_engine
+        if tables_format is not None and tables_format not in TABLE_FORMATS:
+            raise ValueError(f"Formato de tablas no soportado: {tables_format}")
+        self.tables_format = tables_format
+        self.shadow = shadow
+        self.compact = compact
+        self.progress = progress
         self.logs = []
+        self.metrics = Metrics(on_record=progress)
 
     def log(self, msg: str):
         """Agrega un mensaje al log."""
         self.logs.append(msg)
 
-    def process(self, files: dict) -> dict:
+    def process(self, files: dict, build_excel: bool = True) -> dict:
         """
         Procesa todos los archivos y genera el reporte.
 
         Args:
             files: Dict con keys: 'horas', 'ausrep', 'retiros', 'md', 'func', 'aussap'
-                   Cada value es un dict con 'bytes' y 'name'
+                   Cada value es un dict con 'bytes' (o 'path', ruta en disco) y 'name'
+            build_excel: Si es False no se genera el libro Excel (solo dfs y, si hay
+                   tables_format, el zip de tablas)
 
         Returns:
-            Dict con keys: 'dfs' (hojas del Excel), 'logs', 'excel_bytes', 'file_name'
+            Dict con keys: 'dfs' (hojas del Excel), 'logs', 'excel_bytes', 'file_name',
+            'tables_bytes', 'tables_file_name' (zip Parquet / CSV.gz si hay tables_format)
         """
-        # Leer archivos
-        horas = normalize_cols(pd.read_excel(BytesIO(files['horas']['bytes']), sheet_name=0, engine="openpyxl"))
-        ausrep = normalize_cols(pd.read_excel(BytesIO(files['ausrep']['bytes']), sheet_name=0, engine="openpyxl"))
-        retiros = normalize_cols(pd.read_excel(BytesIO(files['retiros']['bytes']), sheet_name=0, engine="openpyxl"))
-        md = normalize_cols(pd.read_excel(BytesIO(files['md']['bytes']), sheet_name=0, engine="openpyxl"))
-        func = normalize_cols(pd.read_excel(BytesIO(files['func']['bytes']), sheet_name=0, engine="openpyxl"))
+        prepared = self.prepare(files)
+        if prepared is None:
+            return None
+        return self.evaluate(prepared, build_excel=build_excel)
 
-        aussap2 = parse_sap_report(files['aussap']['bytes'], files['aussap']['name'])
+    def prepare(self, files: dict) -> PreparedDataset | None:
+        """
+        Lee, normaliza y prepara todo lo que no depende del periodo.
+        Retorna None si faltan columnas (el detalle queda en los logs).
+        """
+        # Leer y normalizar las fuentes (en paralelo si hay workers disponibles); cada fuente
+        # se registra apenas queda lista, así `progress` avanza (y puede cortar) durante la carga
+        loaded = load_sources(files, workers=self.workers, engine=self.read_engine, log=self.log, cache=self.cache,
+                              on_loaded=self._record_load)
 
         # Validar columnas
-        col_map = self._validate_columns(horas, ausrep, retiros, md, func)
+        with self.metrics.stage("_validate_columns"):
+            col_map = self._validate_columns({key: cols for key, (cols, _, _) in loaded.items() if key in SOURCE_COLUMNS})
         if col_map is None:
             return None
 
-        # Procesar marcaciones TS
-        marc = self._process_marcaciones(horas, col_map['h_id'], col_map['h_fecha'])
-
-        # Procesar ausentismos reporte
-        ausrep_days = self._process_ausentismos_reporte(ausrep, col_map)
-
-        # Procesar retiros
-        ret_list = self._process_retiros(retiros, col_map)
-
-        # Procesar MasterData
-        ing_list, authorized_ids, md2 = self._process_masterdata(md, func, col_map)
-
-        # Procesar SAP
-        aussap_days = expand_ranges(aussap2, self.period_start, self.period_end)
-
-        # Crear universo y grid
-        grid, info_master = self._build_grid(
-            marc, ausrep_days, aussap_days, ret_list, ing_list,
-            authorized_ids, md2, horas, ausrep, aussap2, retiros
-        )
+        src = {key: frame for key, (_, frame, _) in loaded.items()}
+
+        # Listas de retiros e ingresos por ID, funciones autorizadas
+        with self.metrics.stage("_process_retiros") as st:
+            ret_list = self._process_retiros(src["retiros"])
+            st["filas"], st["memoria_mb"] = len(ret_list), memory_mb(ret_list)
+        with self.metrics.stage("_process_masterdata") as st:
+            ing_list, authorized_ids, md2 = self._process_masterdata(src["md"], src["func"])
+            st["filas"], st["memoria_mb"] = len(md2), memory_mb(md2)
+            st["detalle"] = f"autorizados={len(authorized_ids)}"
+
+        # Universo de IDs y atributos por ID
+        with self.metrics.stage("universo_ids") as st:
+            ids = pd.Index(pd.concat([
+                pd.Series(list(authorized_ids), dtype=object),
+                *[pd.Series(src[key]["id"].unique()).astype(object) for key in ("horas", "ausrep", "aussap", "retiros")]
+            ]).dropna().unique())
+
+            # ListaRetiros / ListaIngresos se arman en cada periodo, solo para los IDs considerados
+            universe = DenseGrid(ids, self.period_start, self.period_start)
+            info_master = pd.DataFrame({
+                "id": ids,
+                "funcion": universe.lookup(md2, "funcion"),
+            })
+            autorizado = pd.Series(universe.lookup(md2, "autorizado_TS")).eq(True).to_numpy()
+            st["filas"], st["memoria_mb"] = len(ids), memory_mb(info_master)
+
+        return PreparedDataset(src, col_map, ids, ret_list, ing_list, info_master, autorizado,
+                               list(self.logs), self.metrics.records, files=files if self.shadow else None)
+
+    def _record_load(self, key: str, result: tuple):
+        """Log y métricas de una fuente cargada."""
+        _, frame, meta = result
+        filas = len(frame) if frame is not None else 0
+        origen = "caché" if meta.get("cache") else f"{meta['segundos']:.2f}s"
+        self.log(f"[Carga] {key}: formato={meta['formato']} | filas={filas} | {origen}")
+        if "segundos_parseo" in meta:
+            self.metrics.add("parse_sap_report", meta["segundos_parseo"], filas=meta.get("filas_parseo"),
+                             rss_pico_mb=meta.get("rss_pico_mb"), detalle=f"formato={meta['formato']}")
+        self.metrics.add(f"carga:{key}", meta["segundos"], filas=filas,
+                         memoria_mb=meta.get("memoria_mb", memory_mb(frame)), rss_pico_mb=meta.get("rss_pico_mb"),
+                         detalle=f"formato={meta['formato']}" + (" | caché" if meta.get("cache") else ""))
+
+    def evaluate(self, prepared: PreparedDataset, build_excel: bool = True, build_tables: bool = True,
+                 output_dir=None) -> dict:
+        """
+        Evalúa el periodo del procesador sobre datos ya preparados.
+        Con `output_dir` las salidas se escriben directamente en esa carpeta (no quedan en memoria).
 
-        # Calcular ausencias sin soporte
-        aus_sin_out = self._calculate_ausencias_sin_soporte(grid, info_master)
+        Returns:
+            Dict con keys: 'dfs' (hojas del Excel), 'logs', 'file_name', 'excel_bytes', 'excel_path',
+            'tables_file_name', 'tables_bytes', 'tables_path', 'metrics' (registros por etapa),
+            'metrics_json', 'shadow' (diferencias frente a la referencia; None sin modo sombra)
+        """
+        src = prepared.src
+        self.logs = list(prepared.logs)
+        self.metrics = Metrics(prepared.metrics, on_record=self.progress)
+
+        # Retiro / ingreso efectivo al cierre del periodo
+        with self.metrics.stage("_effective_dates") as st:
+            ret_eff = self._effective_dates(prepared.ret_list, "FechaRetiro", "RetiroEfectivo")
+            ing_eff = self._effective_dates(prepared.ing_list, "ingreso", "IngresoEfectivo")
+            st["filas"] = len(ret_eff) + len(ing_eff)
+
+        # Rangos de ausentismos (reporte y SAP) recortados al periodo
+        with self.metrics.stage("_process_ausentismos_reporte") as st:
+            ausrep_rng = self._process_ausentismos_reporte(src["ausrep"])
+            st["filas"], st["memoria_mb"] = len(ausrep_rng), memory_mb(ausrep_rng)
+        with self.metrics.stage("recorte_sap") as st:
+            aussap_rng = clip_ranges(src["aussap"], self.period_start, self.period_end)
+            st["filas"], st["memoria_mb"] = len(aussap_rng), memory_mb(aussap_rng)
+
+        # Grid
+        with self.metrics.stage("_build_grid") as st:
+            grid = self._build_grid(prepared, ausrep_rng, aussap_rng, ret_eff, ing_eff)
+            st["filas"] = grid.shape[0] * grid.shape[1]
+            st["memoria_mb"] = round(memory_mb(grid.cells) + memory_mb(grid.attrs), 3)
+            st["detalle"] = f"ids={grid.shape[0]} | dias={grid.shape[1]}"
+
+        # Listas de fechas (texto) solo de los IDs que llegan a las hojas
+        with self.metrics.stage("listas_fechas") as st:
+            info_master = self._info_master(prepared, grid)
+            st["filas"], st["memoria_mb"] = int(grid.attrs["considerar"].sum()), memory_mb(info_master)
+
+        # Calcular ausencias sin soporte (hoja perezosa: se genera por partes al escribirla)
+        with self.metrics.stage("_calculate_ausencias_sin_soporte", detalle="perezosa") as st:
+            aus_sin_rows, aus_sin_chunks = self._calculate_ausencias_sin_soporte(grid, info_master)
+            st["filas"] = aus_sin_rows
 
         # Generar resumen
-        summary = self._generate_summary(grid, info_master)
+        with self.metrics.stage("_generate_summary") as st:
+            summary = self._generate_summary(grid, info_master)
+            st["filas"], st["memoria_mb"] = len(summary), memory_mb(summary)
 
         # Hojas adicionales
+        t_extra = time.perf_counter()
         retiros_fuera = summary[summary["estado_periodo"] == "Retirado antes del periodo"].copy()
         retiros_fuera["TieneMovEnPeriodo"] = np.where(
             (retiros_fuera["DiasConMarcacion"] > 0) | (retiros_fuera["DiasAusReporte"] > 0) | (retiros_fuera["DiasAusSAP"] > 0),
@@ -90,6 +266,8 @@ class AusenciasProcessor:
             ((summary["estado_periodo"] == "Ingreso posterior al periodo") & (summary["DiasConMarcacion"] > 0)) |
             ((summary["Ingreso"].notna()) & (summary["Retiro"].notna()) & (summary["Retiro"] < summary["Ingreso"]) & (summary["DiasConMarcacion"] > 0))
         ].copy()
+        self.metrics.add("hojas_adicionales", time.perf_counter() - t_extra,
+                         filas=len(retiros_fuera) + len(ingresos_post) + len(inconsistencias))
 
         # Parámetros
         params = pd.DataFrame({
@@ -101,250 +279,334 @@ class AusenciasProcessor:
             ],
             "Valor": [
                 str(self.period_start), str(self.period_end),
-                str(col_map['md_id']),
+                str(prepared.col_map['md_id']),
                 "Fecha retiro = Desde - 1 día",
                 "Ingreso = Fecha (Clase de fecha contiene 'alta')",
                 "Activos: SOLO IDs en MasterData con función autorizada (TS)",
-                str(len(set(func[col_map['f_func']].dropna().astype(str).str.strip().unique()))),
-                str(len(aussap2))
+                str(len(src["func"])),
+                str(len(src["aussap"]))
             ]
         })
 
-        dfs = {
-            "Parametros": params,
-            "Ausencias_sin_soporte": aus_sin_out,
-            "Resumen_periodo": summary,
-            "Retiros_fuera_rango": retiros_fuera,
-            "Ingresos_posteriores": ingresos_post,
-            "Inconsistencias": inconsistencias,
-        }
+        dfs = Sheets()
+        dfs.add("Parametros", params)
+        dfs.add_lazy("Ausencias_sin_soporte", aus_sin_rows, aus_sin_chunks)
+        dfs.add("Resumen_periodo", summary)
+        dfs.add("Retiros_fuera_rango", retiros_fuera)
+        dfs.add("Ingresos_posteriores", ingresos_post)
+        dfs.add("Inconsistencias", inconsistencias)
+
+        shadow = self._shadow_compare(prepared, dfs) if self.shadow else None
+        # Etapas hasta aquí (la escritura de salidas queda en 'metrics' / 'metrics_json')
+        dfs.add("Diagnostico", self.metrics.frame())
 
-        excel_bytes = self._build_excel(dfs)
         file_name = f"Ausencias_sin_soporte_{self.period_start}_{self.period_end}.xlsx"
+        outputs = self._outputs(dfs, file_name, build_excel, build_tables, output_dir)
 
         return {
             'dfs': dfs,
             'logs': self.logs,
-            'excel_bytes': excel_bytes,
-            'file_name': file_name
+            'file_name': file_name,
+            **outputs,
+            'period': (self.period_start, self.period_end),
+            'metrics': self.metrics.records,
+            'metrics_json': self.metrics.to_json(periodo_inicio=self.period_start, periodo_fin=self.period_end),
+            'shadow': shadow,
         }
 
-    def _validate_columns(self, horas, ausrep, retiros, md, func) -> dict | None:
-        """Valida y retorna el mapeo de columnas."""
-        col_h_id = find_col(horas, ["IdentificacionEmpleado", "IdentificaciónEmpleado"])
-        col_h_fecha = find_col(horas, ["FechaEntrada", "Fecha Entrada"])
-
-        col_ar_id = find_col(ausrep, ["Identificacion", "Identificación"])
-        col_ar_ini = find_col(ausrep, ["Fecha_Inicio", "Fecha Inicio"])
-        col_ar_fin = find_col(ausrep, ["Fecha_Final", "Fecha Final"])
-
-        col_r_id = find_col(retiros, ["Número ID", "Numero ID", "Nº ID", "No ID"])
-        col_r_desde = find_col(retiros, ["Desde"])
-
-        col_md_id = find_col(md, [
-            "N° pers.", "Nº pers.", "N°pers.", "Nºpers.", "No pers.", "Nro pers.",
-            "Numero pers.", "Número pers.", "Numero de personal", "Numero personal",
-            "Número ID", "Numero ID"
-        ])
-        col_md_func = find_col(md, ["Función", "Funcion"])
-        col_md_clase = find_col(md, ["Clase de fecha", "Clase Fecha"])
-        col_md_fecha = find_col(md, ["Fecha"])
-
-        col_f_func = find_col(func, ["Función", "Funcion"])
-
-        self.log(f"[TS] ID={col_h_id} | Fecha={col_h_fecha}")
-        self.log(f"[Aus Rep] ID={col_ar_id} | Ini={col_ar_ini} | Fin={col_ar_fin}")
-        self.log(f"[Retiros] ID={col_r_id} | Desde={col_r_desde}")
-        self.log(f"[MD] ID={col_md_id} | Func={col_md_func} | Clase={col_md_clase} | Fecha={col_md_fecha}")
-        self.log(f"[Funcs] Func={col_f_func}")
-
-        missing = []
-        if not col_h_id or not col_h_fecha:
-            missing.append("Rep_Horas_laboradas: IdentificacionEmpleado / FechaEntrada")
-        if not col_ar_id or not col_ar_ini or not col_ar_fin:
-            missing.append("Rep_aususentismos: Identificacion / Fecha_Inicio / Fecha_Final")
-        if not col_r_id or not col_r_desde:
-            missing.append("Retiros: Número ID / Desde")
-        if not col_md_id or not col_md_func or not col_md_clase or not col_md_fecha:
-            missing.append("Md_activos: N° pers. / Función / Clase de fecha / Fecha")
-        if not col_f_func:
-            missing.append("funciones_marcación: Función")
+    def _shadow_compare(self, prepared: PreparedDataset, dfs) -> list[str]:
+        """Calcula el periodo con la implementación de referencia y compara todas sus hojas."""
+        if prepared.files is None:
+            self.log("[Shadow] Sin archivos originales (prepare sin shadow=True); no se compara")
+            return []
+        with self.metrics.stage("shadow_referencia") as st:
+            expected = ReferenceProcessor(self.period_start, self.period_end).process(prepared.files)
+            diffs = ["la referencia no encontró las columnas requeridas"] if expected is None else compare_sheets(expected, dfs)
+            st["detalle"] = f"diferencias={len(diffs)}"
+        if diffs:
+            for d in diffs:
+                self.log(f"[Shadow] DIFERENCIA {d}")
+        else:
+            self.log("[Shadow] Sin diferencias frente a la implementación de referencia")
+        return diffs
+
+    def process_periods(self, files: dict, periods: list, workers: int | None = None,
+                        consolidated: bool = False):
+        """
+        Procesa varios periodos con una sola lectura de archivos.
 
-        if missing:
-            self.log(f"[ERROR] Columnas faltantes: {missing}")
+        Args:
+            files: Igual que en process()
+            periods: Lista de tuplas (inicio, fin)
+            workers: Procesos para evaluar periodos (None = uno por núcleo)
+            consolidated: Si es True retorna un solo resultado con todos los periodos
+
+        Returns:
+            Lista de resultados (uno por periodo, como process()) o un resultado consolidado;
+            None si faltan columnas.
+        """
+        prepared = self.prepare(files)
+        if prepared is None:
             return None
+        results = self.evaluate_periods(prepared, periods, workers=workers,
+                                        build_excel=not consolidated, build_tables=not consolidated)
+        return self.consolidate(results) if consolidated else results
+
+    def evaluate_periods(self, prepared: PreparedDataset, periods: list, workers: int | None = None,
+                         build_excel: bool = True, build_tables: bool = True, output_dir=None,
+                         return_dfs: bool | None = None) -> list[dict]:
+        """
+        Evalúa varios periodos sobre los mismos datos preparados. Con más de un worker usa
+        un pool de procesos (cada proceso recibe los datos preparados una vez); si el pool
+        no se puede crear cae a evaluación secuencial.
+        Con `output_dir` las salidas ya quedan en disco y por defecto los resultados no traen
+        las hojas ('dfs' = None): enviarlas desde el pool obliga a materializar la hoja de
+        detalle de cada periodo. `return_dfs=True` las conserva (p. ej. para consolidar o CSV).
+        """
+        periods = [tuple(p) for p in periods]
+        if return_dfs is None:
+            return_dfs = output_dir is None
+        workers = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+        workers = min(workers, len(periods))
+
+        if workers > 1:
+            # Solo la creación del pool cae a secuencial; los errores de los workers se propagan
+            ex = None
+            try:
+                ex = process_pool(workers, initializer=_init_period_worker, initargs=(prepared,))
+                n = len(periods)
+                pending = ex.map(_evaluate_period, periods, [self.write_engine] * n,
+                                 [self.tables_format] * n, [self.shadow] * n, [self.compact] * n,
+                                 [build_excel] * n, [build_tables] * n, [output_dir] * n,
+                                 [return_dfs] * n)
+            except (OSError, NotImplementedError) as e:
+                if ex is not None:
+                    ex.shutdown(cancel_futures=True)
+                    ex = None
+                self.log(f"[Periodos] Pool de procesos no disponible ({type(e).__name__}: {e}); evaluación secuencial")
+            if ex is not None:
+                with ex:
+                    return list(pending)
+
+        results = []
+        for p in periods:
+            result = AusenciasProcessor(*p, write_engine=self.write_engine, tables_format=self.tables_format,
+                                        shadow=self.shadow, compact=self.compact).evaluate(
+                prepared, build_excel=build_excel, build_tables=build_tables, output_dir=output_dir)
+            results.append(result if return_dfs else {**result, 'dfs': None})
+        return results
+
+    def consolidate(self, results: list[dict], build_excel: bool = True, build_tables: bool = True,
+                    output_dir=None) -> dict:
+        """Une los resultados de varios periodos en un solo libro (columna 'Periodo' en cada hoja)."""
+        dfs = Sheets()
+        for sheet in results[0]['dfs']:
+            n_rows = sum(sheet_rows(r['dfs'], sheet) for r in results)
+            dfs.add_lazy(sheet, n_rows, self._consolidated_chunks(results, sheet))
+
+        start, end = results[0]['period'][0], results[-1]['period'][1]
+        logs = [*results[0]['logs'], f"[Periodos] {len(results)} periodos consolidados ({start} a {end})"]
+        file_name = f"Ausencias_sin_soporte_{start}_{end}.xlsx"
+
+        # Etapas de cada periodo (marcadas con el periodo) + escritura del consolidado
+        self.metrics = Metrics()
+        outputs = self._outputs(dfs, file_name, build_excel, build_tables, output_dir)
+        metrics = Metrics([
+            {**rec, "periodo": f"{r['period'][0]}_{r['period'][1]}"} for r in results for rec in r['metrics']
+        ] + self.metrics.records)
 
         return {
-            'h_id': col_h_id, 'h_fecha': col_h_fecha,
-            'ar_id': col_ar_id, 'ar_ini': col_ar_ini, 'ar_fin': col_ar_fin,
-            'r_id': col_r_id, 'r_desde': col_r_desde,
-            'md_id': col_md_id, 'md_func': col_md_func, 'md_clase': col_md_clase, 'md_fecha': col_md_fecha,
-            'f_func': col_f_func
+            'dfs': dfs,
+            'logs': logs,
+            'file_name': file_name,
+            **outputs,
+            'period': (start, end),
+            'metrics': metrics.records,
+            'metrics_json': metrics.to_json(periodo_inicio=start, periodo_fin=end),
+            'shadow': None if results[0].get('shadow') is None else [
+                f"{r['period'][0]}_{r['period'][1]}: {d}" for r in results for d in r['shadow']
+            ],
         }
 
-    def _process_marcaciones(self, horas, col_id, col_fecha):
-        """Procesa marcaciones de TS."""
-        horas2 = horas.copy()
-        horas2["id"] = horas2[col_id].apply(clean_id)
-        horas2["fecha"] = pd.to_datetime(horas2[col_fecha], errors="coerce").dt.date
-        return horas2[horas2["id"].notna() & horas2["fecha"].notna()][["id", "fecha"]].drop_duplicates()
-
-    def _process_ausentismos_reporte(self, ausrep, col_map):
-        """Procesa ausentismos del reporte."""
-        ausrep2 = ausrep.copy()
-        ausrep2["id"] = ausrep2[col_map['ar_id']].apply(clean_id)
-        ausrep2["ini"] = pd.to_datetime(ausrep2[col_map['ar_ini']], errors="coerce").dt.date
-        ausrep2["fin"] = pd.to_datetime(ausrep2[col_map['ar_fin']], errors="coerce").dt.date
-        return expand_ranges(ausrep2, self.period_start, self.period_end)
-
-    def _process_retiros(self, retiros, col_map):
-        """Procesa retiros."""
-        retiros2 = retiros.copy()
-        retiros2["id"] = retiros2[col_map['r_id']].apply(clean_id)
-        retiros2["Desde_dt"] = pd.to_datetime(retiros2[col_map['r_desde']], errors="coerce").dt.date
-        retiros2["FechaRetiro"] = retiros2["Desde_dt"].apply(
-            lambda d: d - timedelta(days=1) if pd.notna(d) else None
-        )
-
-        ret_list = (
-            retiros2.groupby("id")["FechaRetiro"]
-            .apply(lambda s: sorted(set([d for d in s.dropna()])))
-            .reset_index()
-        )
-        ret_list["RetiroEfectivo"] = ret_list["FechaRetiro"].apply(
-            lambda lst: effective_date_from_list(lst, self.period_end)
-        )
-        ret_list["ListaRetiros"] = ret_list["FechaRetiro"].apply(
-            lambda lst: ", ".join([d.isoformat() for d in lst]) if isinstance(lst, list) else ""
-        )
-        return ret_list
-
-    def _process_masterdata(self, md, func, col_map):
-        """Procesa MasterData y funciones autorizadas."""
-        md2 = md.copy()
-        md2["id"] = md2[col_map['md_id']].apply(clean_id)
-        md2["funcion"] = md2[col_map['md_func']].astype(str).str.strip()
-        md2["clase_fecha"] = md2[col_map['md_clase']].astype(str).str.strip()
-        md2["fecha_clase"] = pd.to_datetime(md2[col_map['md_fecha']], errors="coerce").dt.date
-
-        md2["ingreso"] = np.where(
-            md2["clase_fecha"].str.lower().str.contains("alta"),
-            md2["fecha_clase"],
-            pd.NaT
-        )
-        md2["ingreso"] = pd.to_datetime(md2["ingreso"], errors="coerce").dt.date
-
-        auth_funcs = set(func[col_map['f_func']].dropna().astype(str).str.strip().unique())
-        md2["autorizado_TS"] = md2["funcion"].isin(auth_funcs)
-
-        ing_list = (
-            md2.groupby("id")["ingreso"]
-            .apply(lambda s: sorted(set([d for d in s.dropna()])))
-            .reset_index()
-        )
-        ing_list["IngresoEfectivo"] = ing_list["ingreso"].apply(
-            lambda lst: effective_date_from_list(lst, self.period_end)
-        )
-        ing_list["ListaIngresos"] = ing_list["ingreso"].apply(
-            lambda lst: ", ".join([d.isoformat() for d in lst]) if isinstance(lst, list) else ""
-        )
-
-        authorized_ids = set(md2.loc[md2["autorizado_TS"] & md2["id"].notna(), "id"].unique())
+    def _validate_columns(self, found: dict) -> dict | None:
+        """Valida y retorna el mapeo de columnas (found: fuente -> columnas detectadas)."""
+        col_map = {k: v for cols in found.values() for k, v in cols.items()}
 
-        return ing_list, authorized_ids, md2
+        self.log(f"[TS] ID={col_map['h_id']} | Fecha={col_map['h_fecha']}")
+        self.log(f"[Aus Rep] ID={col_map['ar_id']} | Ini={col_map['ar_ini']} | Fin={col_map['ar_fin']}")
+        self.log(f"[Retiros] ID={col_map['r_id']} | Desde={col_map['r_desde']}")
+        self.log(f"[MD] ID={col_map['md_id']} | Func={col_map['md_func']} | Clase={col_map['md_clase']} | Fecha={col_map['md_fecha']}")
+        self.log(f"[Funcs] Func={col_map['f_func']}")
 
-    def _build_grid(self, marc, ausrep_days, aussap_days, ret_list, ing_list,
-                    authorized_ids, md2, horas, ausrep, aussap2, retiros):
-        """Construye el grid completo con todos los IDs y fechas."""
-        horas2_ids = horas.copy()
-        horas2_ids["id"] = horas2_ids[horas2_ids.columns[0]].apply(clean_id)
+        missing = [SOURCE_REQUIRED[key] for key, cols in found.items() if not all(cols.values())]
 
-        ausrep2_ids = ausrep.copy()
-        ausrep2_ids["id"] = ausrep2_ids[ausrep2_ids.columns[0]].apply(clean_id)
+        if missing:
+            self.log(f"[ERROR] Columnas faltantes: {missing}")
+            return None
 
-        retiros2_ids = retiros.copy()
-        retiros2_ids["id"] = retiros2_ids[retiros2_ids.columns[0]].apply(clean_id)
+        return col_map
 
-        ids_union = pd.Index(pd.concat([
-            pd.Series(list(authorized_ids)),
-            horas2_ids["id"], ausrep2_ids["id"], aussap2["id"], retiros2_ids["id"]
-        ]).dropna().unique())
+    def _process_ausentismos_reporte(self, ausrep):
+        """Procesa ausentismos del reporte (rangos recortados al periodo)."""
+        return clip_ranges(ausrep, self.period_start, self.period_end)
 
-        all_dates = pd.date_range(self.period_start, self.period_end, freq="D").date
-        grid = pd.MultiIndex.from_product([ids_union, all_dates], names=["id", "fecha"]).to_frame(index=False)
+    @staticmethod
+    def _date_table(ids, dates, col):
+        """
+        Fechas por ID como tabla (id, col) ordenada por (id, fecha), sin repetidos.
+        Los IDs sin ninguna fecha válida quedan con una fila NaT (lista vacía).
+        """
+        table = pd.DataFrame({"id": ids, col: dates}).drop_duplicates()
+        valid = table[col].notna()
+        with_dates = table["id"].isin(table.loc[valid, "id"].unique())
+        return table[valid | ~with_dates].sort_values(["id", col], kind="stable").reset_index(drop=True)
 
-        # Agregar flags
-        grid = grid.merge(marc.assign(tiene_marcacion=True), on=["id", "fecha"], how="left")
-        grid["tiene_marcacion"] = grid["tiene_marcacion"].fillna(False)
+    def _process_retiros(self, retiros):
+        """Procesa retiros: fechas de retiro por ID (id, FechaRetiro), independiente del periodo."""
+        return self._date_table(retiros["id"], retiros["fecha_retiro"], "FechaRetiro")
 
-        grid = grid.merge(ausrep_days.assign(tiene_aus_rep=True), on=["id", "fecha"], how="left")
-        grid["tiene_aus_rep"] = grid["tiene_aus_rep"].fillna(False)
+    def _process_masterdata(self, md, func):
+        """Procesa MasterData y funciones autorizadas (independiente del periodo)."""
+        md2 = md.assign(autorizado_TS=md["funcion"].isin(set(func["funcion"])))
+        ing_list = self._date_table(md2["id"], md2["ingreso"], "ingreso")
+        authorized_ids = set(md2.loc[md2["autorizado_TS"], "id"].unique())
 
-        grid = grid.merge(aussap_days.assign(tiene_aus_sap=True), on=["id", "fecha"], how="left")
-        grid["tiene_aus_sap"] = grid["tiene_aus_sap"].fillna(False)
+        return ing_list, authorized_ids, md2
 
-        grid = grid.merge(ret_list[["id", "RetiroEfectivo"]], on="id", how="left")
-        grid = grid.merge(ing_list[["id", "IngresoEfectivo"]], on="id", how="left")
-        grid = grid.merge(md2[["id", "autorizado_TS", "funcion"]].drop_duplicates("id"), on="id", how="left")
-        grid["autorizado_TS"] = grid["autorizado_TS"].fillna(False)
+    def _effective_dates(self, table, date_col, out_col):
+        """
+        Fecha efectiva por ID: la más reciente que no supera el fin del periodo
+        (máximo por ID sobre las fechas <= fin; None si ninguna califica). En modo compacto
+        la fecha queda como datetime64[D] (NaT si ninguna califica).
+        """
+        ids = table["id"].drop_duplicates()
+        ok = table[date_col] <= pd.Timestamp(self.period_end)
+        eff = table.loc[ok].groupby("id", observed=True)[date_col].max()
+        pos = pd.Index(ids).get_indexer(eff.index)
+        if self.compact:
+            values = np.full(len(ids), np.datetime64("NaT", "D"))
+            values[pos] = eff.to_numpy("datetime64[D]")
+        else:
+            values = np.full(len(ids), None, dtype=object)
+            values[pos] = eff.dt.date.to_numpy(dtype=object)
+        return pd.DataFrame({"id": ids.to_numpy(), out_col: values})
+
+    @staticmethod
+    def _date_lists(table, date_col, ids) -> pd.DataFrame:
+        """
+        Texto 'AAAA-MM-DD, AAAA-MM-DD, ...' (fechas ascendentes) de los IDs `ids` presentes en la
+        tabla; cadena vacía si el ID no tiene fechas válidas.
+        """
+        sub = table[table["id"].isin(ids)]
+        sub_ids = sub["id"].to_numpy(dtype=object)
+        if not len(sub_ids):
+            return pd.DataFrame({"id": sub_ids, "lista": sub_ids})
+
+        # La tabla viene ordenada por (id, fecha): cada ID es un bloque contiguo
+        starts = np.flatnonzero(np.r_[True, sub_ids[1:] != sub_ids[:-1]])
+        last = np.r_[starts[1:] - 1, len(sub_ids) - 1]
+        dates = sub[date_col].to_numpy("datetime64[D]")
+        text = np.where(np.isnat(dates), "", np.datetime_as_string(dates, unit="D")).astype(object)
+        sep = np.full(len(text), ", ", dtype=object)
+        sep[last] = ""
+        return pd.DataFrame({"id": sub_ids[starts], "lista": np.add.reduceat(text + sep, starts)})
+
+    def _info_master(self, prepared, grid):
+        """Atributos de MasterData por ID con ListaRetiros / ListaIngresos de los IDs considerados."""
+        considered = grid.ids[grid.attrs["considerar"]]
+        info_master = prepared.info_master.copy()
+        info_master["ListaRetiros"] = grid.lookup(self._date_lists(prepared.ret_list, "FechaRetiro", considered), "lista")
+        info_master["ListaIngresos"] = grid.lookup(self._date_lists(prepared.ing_list, "ingreso", considered), "lista")
+        if self.compact:
+            for col in ("ListaRetiros", "ListaIngresos"):
+                info_master[col] = info_master[col].astype("category")
+        return info_master
+
+    def _build_grid(self, prepared, ausrep_rng, aussap_rng, ret_eff, ing_eff):
+        """Construye el grid denso con todos los IDs y fechas del periodo."""
+        grid = DenseGrid(prepared.ids, self.period_start, self.period_end, compact=self.compact)
+        date_type = "datetime64[D]" if self.compact else object
+
+        # Atributos por ID
+        grid.attrs["RetiroEfectivo"] = grid.lookup(ret_eff, "RetiroEfectivo", dtype=date_type)
+        grid.attrs["IngresoEfectivo"] = grid.lookup(ing_eff, "IngresoEfectivo", dtype=date_type)
+        grid.attrs["autorizado_TS"] = prepared.autorizado
+        funcion = prepared.info_master["funcion"]
+        grid.attrs["funcion"] = pd.Categorical(funcion) if self.compact else funcion.to_numpy()
+
+        # Estado y vigencia (vectorizado: estado por ID, vigencia por fecha vs límites del ID)
+        estado = rules.estado_codes(
+            grid.attrs["RetiroEfectivo"], grid.attrs["IngresoEfectivo"], self.period_start, self.period_end
+        )
+        if self.compact:
+            grid.attrs["estado_periodo"] = pd.Categorical.from_codes(estado, categories=rules.ESTADOS)
+        else:
+            grid.attrs["estado_periodo"] = np.asarray(rules.ESTADOS, dtype=object)[estado]
+        grid.cells["vigente_dia"] = rules.vigente(
+            grid.dates, grid.attrs["IngresoEfectivo"], grid.attrs["RetiroEfectivo"]
+        )
 
-        # Estado y vigencia
-        grid["estado_periodo"] = [
-            self._estado_periodo(r, i)
-            for r, i in zip(grid["RetiroEfectivo"], grid["IngresoEfectivo"])
-        ]
+        # Flags diarios
+        grid.cells["tiene_marcacion"] = grid.mark_days(prepared.src["horas"])
+        grid.cells["tiene_aus_rep"] = grid.mark_ranges(ausrep_rng)
+        grid.cells["tiene_aus_sap"] = grid.mark_ranges(aussap_rng)
 
-        grid["vigente_dia"] = [
-            self._vigente(d, i, r)
-            for d, i, r in zip(grid["fecha"], grid["IngresoEfectivo"], grid["RetiroEfectivo"])
-        ]
+        grid.cells["sin_soporte"] = (
+            grid.cells["vigente_dia"]
+            & (~grid.cells["tiene_marcacion"])
+            & (~grid.cells["tiene_aus_rep"])
+            & (~grid.cells["tiene_aus_sap"])
+        )
 
-        grid["sin_soporte"] = (
-            grid["vigente_dia"]
-            & (~grid["tiene_marcacion"])
-            & (~grid["tiene_aus_rep"])
-            & (~grid["tiene_aus_sap"])
+        grid.attrs["considerar_activo_TS"], grid.attrs["considerar"] = rules.considerar(
+            grid.attrs["estado_periodo"], grid.attrs["autorizado_TS"]
         )
 
-        grid["considerar_activo_TS"] = (grid["estado_periodo"] == "Activo (MD)") & (grid["autorizado_TS"])
-        grid["considerar"] = grid["considerar_activo_TS"] | grid["estado_periodo"].isin([
-            "Retirado en el periodo", "Retirado antes del periodo", "Retiro despues del periodo",
-            "Sin masterdata (posible retirado)"
-        ])
-
-        # Info master
-        info_master = pd.DataFrame({"id": ids_union})
-        info_master = info_master.merge(md2[["id", "funcion"]].drop_duplicates("id"), on="id", how="left")
-        info_master = info_master.merge(ret_list[["id", "ListaRetiros"]], on="id", how="left")
-        info_master = info_master.merge(ing_list[["id", "ListaIngresos"]], on="id", how="left")
-
-        return grid, info_master
-
-    def _estado_periodo(self, ret, ing):
-        """Determina el estado del empleado en el periodo."""
-        if pd.isna(ret):
-            if pd.isna(ing):
-                return "Sin masterdata (posible retirado)"
-            if ing > self.period_end:
-                return "Ingreso posterior al periodo"
-            return "Activo (MD)"
-        if ret < self.period_start:
-            return "Retirado antes del periodo"
-        if ret <= self.period_end:
-            return "Retirado en el periodo"
-        return "Retiro despues del periodo"
-
-    def _vigente(self, d, ing, ret):
-        """Determina si el empleado está vigente en una fecha."""
-        if pd.notna(ing) and d < ing:
-            return False
-        if pd.notna(ret) and d > ret:
-            return False
-        return True
+        return grid
+
+    @staticmethod
+    def _consolidated_chunks(results, sheet):
+        """Partes de la hoja consolidada: las de cada periodo con la columna 'Periodo' al inicio."""
+        def chunks(size):
+            for r in results:
+                periodo = f"{r['period'][0]}_{r['period'][1]}"
+                for chunk in sheet_chunks(r['dfs'], sheet, size):
+                    yield chunk.assign(Periodo=periodo)[["Periodo", *chunk.columns]]
+        return chunks
 
     def _calculate_ausencias_sin_soporte(self, grid, info_master):
-        """Calcula ausencias sin soporte."""
-        aus_sin = grid[grid["considerar"] & grid["sin_soporte"]].merge(info_master, on="id", how="left")
+        """
+        Calcula ausencias sin soporte, ordenadas por estado, id y fecha, sin materializarlas:
+        se ordenan los IDs (no las celdas) y cada parte se arma solo con sus IDs.
+        Retorna (total de filas, chunks(size) -> DataFrames de a lo sumo size filas).
+        """
+        mask = grid.attrs["considerar"][:, None] & grid.cells["sin_soporte"]
+        per_row = mask.sum(axis=1)
+
+        rows = np.flatnonzero(per_row)
+        keys = pd.DataFrame({"estado": grid.attrs["estado_periodo"][rows], "id": grid.ids.to_numpy()[rows]})
+        rows = rows[keys.sort_values(["estado", "id"]).index.to_numpy()]
+        cum = np.cumsum(per_row[rows])
+        total = int(cum[-1]) if len(cum) else 0
+
+        def chunks(size):
+            start = 0
+            while True:
+                done = int(cum[start - 1]) if start else 0
+                end = max(int(np.searchsorted(cum, done + size, side="right")), start + 1)
+                yield self._detail_frame(grid, info_master, mask, rows[start:end])
+                start = end
+                if start >= len(rows):
+                    break
+
+        return total, chunks
+
+    def _detail_frame(self, grid, info_master, mask, rows):
+        """Filas de detalle de los IDs `rows` (en ese orden, fechas ascendentes)."""
+        lists = {c: info_master[c].array if self.compact else info_master[c].to_numpy()
+                 for c in ("ListaIngresos", "ListaRetiros")}
+        aus_sin = grid.frame(mask, rows=rows, extra=lists)
+        # En modo compacto el estado es categórico y el mapeo se hace una vez por estado
         aus_sin["Observacion"] = aus_sin["estado_periodo"].map(self._obs)
 
         detail_cols = [
@@ -353,7 +615,8 @@ class AusenciasProcessor:
             "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap",
             "sin_soporte", "Observacion", "ListaIngresos", "ListaRetiros"
         ]
-        return safe_select(aus_sin, detail_cols).sort_values(["estado_periodo", "id", "fecha"])
+        aus_sin = safe_select(aus_sin, detail_cols)
+        return to_display(aus_sin) if self.compact else aus_sin
 
     def _obs(self, stt):
         """Genera observación según estado."""
@@ -365,56 +628,90 @@ class AusenciasProcessor:
         }.get(stt, "Sin marcación y sin ausentismo (Reporte + SAP)")
 
     def _generate_summary(self, grid, info_master):
-        """Genera resumen por ID."""
-        g = grid[grid["considerar"]].merge(info_master, on="id", how="left")
+        """
+        Genera resumen por ID. Los contadores son sumas por fila de las matrices booleanas
+        y los atributos se toman por ID (info_master está alineado a grid.ids), sin armar
+        filas id × fecha.
+        """
+        # IDs considerados en orden de id (el orden previo al ordenamiento final)
+        rows = np.flatnonzero(grid.attrs["considerar"])
+        rows = rows[np.argsort(grid.ids.to_numpy()[rows], kind="stable")]
+
+        counts = {
+            col: grid.cells[flag].sum(axis=1, dtype=np.int64)[rows]
+            for col, flag in [
+                ("DiasVigente", "vigente_dia"),
+                ("DiasConMarcacion", "tiene_marcacion"),
+                ("DiasAusReporte", "tiene_aus_rep"),
+                ("DiasAusSAP", "tiene_aus_sap"),
+                ("DiasSinSoporte", "sin_soporte"),
+            ]
+        }
 
-        need_cols = [
-            "funcion", "autorizado_TS", "estado_periodo",
-            "IngresoEfectivo", "RetiroEfectivo",
-            "ListaIngresos", "ListaRetiros",
-            "fecha", "vigente_dia",
-            "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap",
-            "sin_soporte"
-        ]
+        # Última marcación: última columna con True en cada fila
+        marc = grid.cells["tiene_marcacion"][rows]
+        last = marc.shape[1] - 1 - np.argmax(marc[:, ::-1], axis=1)
+        ultima = np.full(len(rows), np.nan, dtype=object)
+        has = marc.any(axis=1)
+        ultima[has] = grid.dates.astype(object)[last[has]]
+
+        def attr(values):
+            # Atributo por ID con None en los nulos (como la reducción "first" por grupo)
+            values = np.asarray(values, dtype=object)[rows]
+            return np.where(pd.isna(values), None, values)
+
+        summary = pd.DataFrame({
+            "id": grid.ids.to_numpy()[rows],
+            "funcion": attr(grid.attrs["funcion"]),
+            "autorizado_TS": grid.attrs["autorizado_TS"][rows].astype(bool),
+            "estado_periodo": grid.attrs["estado_periodo"][rows],
+            "Ingreso": attr(grid.attrs["IngresoEfectivo"]),
+            "Retiro": attr(grid.attrs["RetiroEfectivo"]),
+            "ListaIngresos": attr(info_master["ListaIngresos"]),
+            "ListaRetiros": attr(info_master["ListaRetiros"]),
+            "DiasPeriodo": np.full(len(rows), grid.shape[1], dtype=np.int64),
+            **counts,
+            "UltimaMarcacion": ultima,
+        })
+        # En modo compacto el estado es categórico con categorías en orden alfabético
+        summary = summary.sort_values(["estado_periodo", "DiasSinSoporte"], ascending=[True, False])
+        return to_display(summary) if self.compact else summary
 
-        for c in need_cols:
-            if c not in g.columns:
-                if c in ["vigente_dia", "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap", "sin_soporte", "autorizado_TS"]:
-                    g[c] = False
+    def _outputs(self, dfs, file_name, build_excel, build_tables, output_dir) -> dict:
+        """
+        Genera el libro Excel (si build_excel) y el zip de tablas (si build_tables y hay tables_format):
+        en disco si hay output_dir, en memoria si no.
+        """
+        out = {'excel_bytes': None, 'excel_path': None,
+               'tables_file_name': None, 'tables_bytes': None, 'tables_path': None}
+
+        if build_excel:
+            with self.metrics.stage("_build_excel", detalle=self.write_engine or "") as st:
+                if output_dir is not None:
+                    out['excel_path'] = Path(output_dir) / file_name
+                    out['excel_path'].parent.mkdir(parents=True, exist_ok=True)
+                    write_excel(dfs, out['excel_path'], engine=self.write_engine)
                 else:
-                    g[c] = np.nan
-
-        for c in ["vigente_dia", "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap", "sin_soporte", "autorizado_TS"]:
-            g[c] = g[c].fillna(False)
-
-        summary = g.groupby("id").agg(
-            funcion=("funcion", "first"),
-            autorizado_TS=("autorizado_TS", "first"),
-            estado_periodo=("estado_periodo", "first"),
-            Ingreso=("IngresoEfectivo", "first"),
-            Retiro=("RetiroEfectivo", "first"),
-            ListaIngresos=("ListaIngresos", "first"),
-            ListaRetiros=("ListaRetiros", "first"),
-            DiasPeriodo=("fecha", "nunique"),
-            DiasVigente=("vigente_dia", "sum"),
-            DiasConMarcacion=("tiene_marcacion", "sum"),
-            DiasAusReporte=("tiene_aus_rep", "sum"),
-            DiasAusSAP=("tiene_aus_sap", "sum"),
-            DiasSinSoporte=("sin_soporte", "sum"),
-        ).reset_index()
-
-        ultima_marc = g[g["tiene_marcacion"]].groupby("id")["fecha"].max().rename("UltimaMarcacion")
-        summary = summary.merge(ultima_marc, on="id", how="left").sort_values(
-            ["estado_periodo", "DiasSinSoporte"], ascending=[True, False]
-        )
+                    out['excel_bytes'] = self._build_excel(dfs)
+                st["filas"] = sum(sheet_rows(dfs, name) for name in dfs)
+
+        if build_tables and self.tables_format:
+            with self.metrics.stage("tablas_zip", detalle=self.tables_format) as st:
+                out['tables_file_name'] = tables_file_name(file_name, self.tables_format)
+                if output_dir is not None:
+                    out['tables_path'] = Path(output_dir) / out['tables_file_name']
+                    out['tables_path'].parent.mkdir(parents=True, exist_ok=True)
+                    write_tables_zip(dfs, out['tables_path'], self.tables_format)
+                else:
+                    buffer = BytesIO()
+                    write_tables_zip(dfs, buffer, self.tables_format)
+                    out['tables_bytes'] = buffer.getvalue()
+                st["filas"] = sum(sheet_rows(dfs, name) for name in dfs)
 
-        return summary
+        return out
 
     def _build_excel(self, dfs: dict) -> bytes:
-        """Construye archivo Excel con múltiples hojas."""
+        """Construye archivo Excel con múltiples hojas (escritura en streaming)."""
         buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-            for sh, df in dfs.items():
-                df.to_excel(writer, sheet_name=sh[:31], index=False)
-        buffer.seek(0)
-        return buffer.read()
+        write_excel(dfs, buffer, engine=self.write_engine)
+        return buffer.getvalue()  # comparte el buffer interno, sin copia adicional
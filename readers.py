@@ -0,0 +1,153 @@
+"""
+Lectura de los archivos Excel de entrada.
+
+Primero se lee solo la fila de encabezados, se detectan las columnas necesarias con
+`find_col` y después se cargan únicamente esas columnas. Motores:
+- "openpyxl": modo `read_only` iterando `values_only` fila a fila (siempre disponible).
+- "calamine": la hoja se carga una sola vez con `python-calamine` (si está instalado) y de sus
+  filas se convierten solo las columnas necesarias, como lo hace el lector calamine de pandas.
+El resultado es el mismo que `pd.read_excel(..., engine="openpyxl")` restringido a esas columnas.
+Los archivos pueden llegar como bytes o como ruta (se leen desde disco sin copiarlos a memoria).
+"""
+import os
+from datetime import date, timedelta
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from utils import find_col
+
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+
+def default_engine() -> str:
+    """Motor por defecto: calamine si está instalado, si no openpyxl."""
+    return "calamine" if HAS_CALAMINE else "openpyxl"
+
+
+def _as_file(source):
+    """bytes -> BytesIO; una ruta se pasa como str."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    return os.fspath(source)
+
+
+def _convert_cell(v):
+    """Convierte un valor de celda igual que el lector openpyxl de pandas."""
+    from openpyxl.cell.cell import ERROR_CODES
+
+    if v is None:
+        return ""
+    if isinstance(v, str) and v in ERROR_CODES:
+        return np.nan
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        val = int(v)
+        return val if val == v else float(v)
+    return v
+
+
+def _header_names(header: list) -> list[str]:
+    """Nombres de columna como los deja pandas (Unnamed/duplicados) + normalize_cols."""
+    cols = TextParser([list(header)], header=0, skip_blank_lines=False).read().columns
+    return [str(c).strip() for c in cols]
+
+
+def _select(names: list[str], candidates: dict) -> tuple[dict, list[int]]:
+    """Detecta las columnas de cada clave y retorna (mapeo clave->columna, posiciones a leer)."""
+    found = {k: find_col(pd.DataFrame(columns=names), cands) for k, cands in candidates.items()}
+    positions = sorted({names.index(c) for c in found.values() if c is not None})
+    return found, positions
+
+
+def _read_openpyxl(file_bytes: bytes, candidates: dict) -> pd.DataFrame:
+    """Streaming con openpyxl read_only: solo se convierten las celdas de las columnas necesarias."""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(_as_file(file_bytes), read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        names = _header_names([_convert_cell(v) for v in header])
+        _, positions = _select(names, candidates)
+        if not positions:
+            return pd.DataFrame(columns=names)
+
+        data = [[names[i] for i in positions]]
+        last_with_data = 0
+        for row in rows:
+            n = len(row)
+            values = [_convert_cell(row[i]) if i < n else "" for i in positions]
+            data.append(values)
+            if any(v != "" for v in values):
+                last_with_data = len(data) - 1
+    finally:
+        wb.close()
+
+    return TextParser(data[: last_with_data + 1], header=0, skip_blank_lines=False).read()
+
+
+def _convert_calamine_cell(v):
+    """Convierte un valor de celda igual que el lector calamine de pandas."""
+    if isinstance(v, float):
+        val = int(v)
+        return val if val == v else v
+    if isinstance(v, date):
+        return pd.Timestamp(v)
+    if isinstance(v, timedelta):
+        return pd.Timedelta(v)
+    return v
+
+
+def _read_calamine(file_bytes: bytes, candidates: dict) -> pd.DataFrame:
+    """
+    Lectura con calamine (Rust). La hoja se parsea una vez: el encabezado sale de su primera
+    fila y de las demás se convierten solo las columnas necesarias.
+    """
+    from python_calamine import CalamineWorkbook
+
+    wb = CalamineWorkbook.from_object(_as_file(file_bytes))
+    try:
+        rows = wb.get_sheet_by_index(0).to_python(skip_empty_area=False)
+    finally:
+        wb.close()
+    if not rows:
+        return pd.DataFrame(columns=[])
+
+    names = _header_names([_convert_calamine_cell(v) for v in rows[0]])
+    _, positions = _select(names, candidates)
+    if not positions:
+        return pd.DataFrame(columns=names)
+
+    data = [[names[i] for i in positions]]
+    data.extend([_convert_calamine_cell(row[i]) for i in positions] for row in rows[1:])
+    df = TextParser(data, header=0, skip_blank_lines=False).read()
+    df.columns = [names[i] for i in positions]
+    return df
+
+
+READERS = {
+    "openpyxl": _read_openpyxl,
+    "calamine": _read_calamine,
+}
+
+
+def read_excel_columns(file_bytes: bytes, candidates: dict, engine: str | None = None) -> pd.DataFrame:
+    """
+    Lee la primera hoja (bytes o ruta) cargando solo las columnas que coinciden con `candidates`
+    (clave -> lista de nombres aceptados). Retorna un DataFrame con nombres normalizados.
+    """
+    engine = engine or default_engine()
+    if engine not in READERS:
+        raise ValueError(f"Motor de lectura no soportado: {engine}")
+    return READERS[engine](file_bytes, candidates)
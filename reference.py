@@ -0,0 +1,506 @@
+"""
+Implementación de referencia y comparación de resultados.
+
+`ReferenceProcessor` es el cálculo original fila por fila (lectura con openpyxl, parser SAP
+por línea, expansión de rangos día a día, grid como producto cartesiano con merges y reglas
+evaluadas celda a celda). Es lento, pero es la definición del resultado de negocio: cualquier
+ruta optimizada de `AusenciasProcessor` debe producir las mismas hojas.
+
+`compare_sheets` compara hoja por hoja (columnas y conjunto de filas), los conteos por
+`estado_periodo` y `DiasSinSoporte` por ID. Se usa en `test_equivalence.py` y en el modo
+sombra (`AusenciasProcessor(..., shadow=True)`), que corre esta referencia junto al cálculo
+normal y deja las diferencias en los logs.
+"""
+import io
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import clean_id, find_col, normalize_cols, safe_select
+
+
+# =========================
+# Parser SAP y rangos (fila por fila)
+# =========================
+def _parse_sap_row(dates: list, nums: list) -> dict | None:
+    """Campos SAP de una fila: ini/fin = primeras fechas, pernr = primer número, cédula = el más largo."""
+    if len(dates) < 2 or len(nums) < 2:
+        return None
+    pernr = nums[0]
+    cand = [n for n in nums[1:] if n != pernr]
+    if not cand:
+        return None
+    cedula = max(cand, key=len)
+
+    ini = pd.to_datetime(dates[0], format="%d.%m.%Y", errors="coerce")
+    fin = pd.to_datetime(dates[1], format="%d.%m.%Y", errors="coerce")
+    if pd.isna(ini) or pd.isna(fin):
+        return None
+    return {"id": clean_id(cedula), "ini": ini.date(), "fin": fin.date(), "pernr": pernr}
+
+
+def _parse_sap_from_dataframe(raw: pd.DataFrame) -> pd.DataFrame:
+    """Parse SAP data desde un DataFrame."""
+    date_re = re.compile(r"^\d{2}\.\d{2}\.\d{4}$")
+    num_re = re.compile(r"^\d{6,15}$")
+
+    rows = []
+    for i in range(len(raw)):
+        s = "\t".join([str(v) for v in raw.iloc[i].tolist() if pd.notna(v)])
+        parts = [p.strip() for p in re.split(r"\t+", s) if p.strip() != ""]
+        pr = _parse_sap_row([p for p in parts if date_re.match(p)], [p for p in parts if num_re.match(p)])
+        if pr:
+            rows.append(pr)
+    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=["id", "ini", "fin", "pernr"])
+
+
+def _parse_sap_from_text_lines(lines) -> pd.DataFrame:
+    """Parse SAP data desde líneas de texto."""
+    date_re = re.compile(r"\b\d{2}\.\d{2}\.\d{4}\b")
+    num_re = re.compile(r"\b\d{6,15}\b")
+
+    out = []
+    for line in lines:
+        pr = _parse_sap_row(date_re.findall(line), num_re.findall(line))
+        if pr:
+            out.append(pr)
+    return pd.DataFrame(out) if out else pd.DataFrame(columns=["id", "ini", "fin", "pernr"])
+
+
+def parse_sap_report(file_bytes: bytes, filename: str) -> pd.DataFrame:
+    """
+    Parser SAP de referencia: intenta Excel según la extensión (.xls con xlrd), luego HTML
+    y por último texto plano.
+    """
+    try:
+        engine = "xlrd" if filename.endswith(".xls") else "openpyxl"
+        raw = pd.read_excel(io.BytesIO(file_bytes), sheet_name=0, header=None, engine=engine)
+        return _parse_sap_from_dataframe(raw)
+    except Exception:
+        pass
+
+    txt = file_bytes.decode("utf-8", errors="ignore")
+    if "<table" in txt.lower():
+        try:
+            tables = pd.read_html(io.StringIO(txt))
+            if tables:
+                raw = tables[0].astype(str).reset_index(drop=True)
+                return _parse_sap_from_dataframe(raw)
+        except Exception:
+            pass
+
+    return _parse_sap_from_text_lines(txt.splitlines())
+
+
+def expand_ranges(df, p_start, p_end, id_col="id", ini_col="ini", fin_col="fin"):
+    """Convierte rangos (ini-fin) a (id,fecha) diario recortado al periodo, día por día."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["id", "fecha"])
+    dfp = df[df[id_col].notna() & df[ini_col].notna() & df[fin_col].notna()].copy()
+    dfp = dfp[(dfp[fin_col] >= p_start) & (dfp[ini_col] <= p_end)]
+    out = []
+    for _, r in dfp.iterrows():
+        ini = max(r[ini_col], p_start)
+        fin = min(r[fin_col], p_end)
+        d = ini
+        while d <= fin:
+            out.append((r[id_col], d))
+            d += timedelta(days=1)
+    return pd.DataFrame(out, columns=["id", "fecha"]).drop_duplicates() if out else pd.DataFrame(columns=["id", "fecha"])
+
+
+def effective_date_from_list(lst, end_date):
+    """Selecciona la fecha más reciente que no supere end_date."""
+    cand = [d for d in (lst or []) if d <= end_date]
+    return max(cand) if cand else None
+
+
+# =========================
+# Procesador de referencia
+# =========================
+class ReferenceProcessor:
+    """Cálculo de referencia de las hojas del reporte para un periodo."""
+
+    def __init__(self, period_start, period_end):
+        self.period_start = period_start
+        self.period_end = period_end
+        self.logs = []
+
+    def log(self, msg: str):
+        """Agrega un mensaje al log."""
+        self.logs.append(msg)
+
+    def process(self, files: dict) -> dict | None:
+        """
+        Calcula las hojas del reporte (sin Excel).
+
+        Args:
+            files: Igual que en AusenciasProcessor.process()
+
+        Returns:
+            Dict hoja -> DataFrame, o None si faltan columnas
+        """
+        content = {key: f['bytes'] if f.get('bytes') is not None else Path(f['path']).read_bytes()
+                   for key, f in files.items()}
+        read = {key: normalize_cols(pd.read_excel(io.BytesIO(content[key]), sheet_name=0, engine="openpyxl"))
+                for key in ("horas", "ausrep", "retiros", "md", "func")}
+        horas, ausrep, retiros, md, func = (read[k] for k in ("horas", "ausrep", "retiros", "md", "func"))
+        aussap2 = parse_sap_report(content['aussap'], files['aussap']['name'])
+
+        col_map = self._validate_columns(horas, ausrep, retiros, md, func)
+        if col_map is None:
+            return None
+
+        marc = self._process_marcaciones(horas, col_map['h_id'], col_map['h_fecha'])
+        ausrep_days = self._process_ausentismos_reporte(ausrep, col_map)
+        ret_list = self._process_retiros(retiros, col_map)
+        ing_list, authorized_ids, md2 = self._process_masterdata(md, func, col_map)
+        aussap_days = expand_ranges(aussap2, self.period_start, self.period_end)
+
+        grid, info_master = self._build_grid(
+            marc, ausrep_days, aussap_days, ret_list, ing_list,
+            authorized_ids, md2, horas, ausrep, aussap2, retiros
+        )
+        aus_sin_out = self._calculate_ausencias_sin_soporte(grid, info_master)
+        summary = self._generate_summary(grid, info_master)
+
+        retiros_fuera = summary[summary["estado_periodo"] == "Retirado antes del periodo"].copy()
+        retiros_fuera["TieneMovEnPeriodo"] = np.where(
+            (retiros_fuera["DiasConMarcacion"] > 0) | (retiros_fuera["DiasAusReporte"] > 0) | (retiros_fuera["DiasAusSAP"] > 0),
+            "SI", "NO"
+        )
+        ingresos_post = summary[summary["estado_periodo"] == "Ingreso posterior al periodo"].copy()
+        inconsistencias = summary[
+            ((summary["estado_periodo"] == "Ingreso posterior al periodo") & (summary["DiasConMarcacion"] > 0)) |
+            ((summary["Ingreso"].notna()) & (summary["Retiro"].notna()) & (summary["Retiro"] < summary["Ingreso"]) & (summary["DiasConMarcacion"] > 0))
+        ].copy()
+
+        params = pd.DataFrame({
+            "Parametro": [
+                "Periodo_inicio", "Periodo_fin",
+                "MD_id_col_usada",
+                "Regla_retiro", "Regla_ingreso", "Regla_activos_TS",
+                "Cantidad_funciones_autorizadas", "Ausentismos_SAP_parseados"
+            ],
+            "Valor": [
+                str(self.period_start), str(self.period_end),
+                str(col_map['md_id']),
+                "Fecha retiro = Desde - 1 día",
+                "Ingreso = Fecha (Clase de fecha contiene 'alta')",
+                "Activos: SOLO IDs en MasterData con función autorizada (TS)",
+                str(len(set(func[col_map['f_func']].dropna().astype(str).str.strip().unique()))),
+                str(len(aussap2))
+            ]
+        })
+
+        return {
+            "Parametros": params,
+            "Ausencias_sin_soporte": aus_sin_out,
+            "Resumen_periodo": summary,
+            "Retiros_fuera_rango": retiros_fuera,
+            "Ingresos_posteriores": ingresos_post,
+            "Inconsistencias": inconsistencias,
+        }
+
+    def _validate_columns(self, horas, ausrep, retiros, md, func) -> dict | None:
+        """Valida y retorna el mapeo de columnas."""
+        col_map = {
+            'h_id': find_col(horas, ["IdentificacionEmpleado", "IdentificaciónEmpleado"]),
+            'h_fecha': find_col(horas, ["FechaEntrada", "Fecha Entrada"]),
+            'ar_id': find_col(ausrep, ["Identificacion", "Identificación"]),
+            'ar_ini': find_col(ausrep, ["Fecha_Inicio", "Fecha Inicio"]),
+            'ar_fin': find_col(ausrep, ["Fecha_Final", "Fecha Final"]),
+            'r_id': find_col(retiros, ["Número ID", "Numero ID", "Nº ID", "No ID"]),
+            'r_desde': find_col(retiros, ["Desde"]),
+            'md_id': find_col(md, [
+                "N° pers.", "Nº pers.", "N°pers.", "Nºpers.", "No pers.", "Nro pers.",
+                "Numero pers.", "Número pers.", "Numero de personal", "Numero personal",
+                "Número ID", "Numero ID"
+            ]),
+            'md_func': find_col(md, ["Función", "Funcion"]),
+            'md_clase': find_col(md, ["Clase de fecha", "Clase Fecha"]),
+            'md_fecha': find_col(md, ["Fecha"]),
+            'f_func': find_col(func, ["Función", "Funcion"]),
+        }
+        missing = [k for k, v in col_map.items() if not v]
+        if missing:
+            self.log(f"[ERROR] Columnas faltantes: {missing}")
+            return None
+        return col_map
+
+    def _process_marcaciones(self, horas, col_id, col_fecha):
+        """Procesa marcaciones de TS."""
+        horas2 = horas.copy()
+        horas2["id"] = horas2[col_id].apply(clean_id)
+        horas2["fecha"] = pd.to_datetime(horas2[col_fecha], errors="coerce").dt.date
+        return horas2[horas2["id"].notna() & horas2["fecha"].notna()][["id", "fecha"]].drop_duplicates()
+
+    def _process_ausentismos_reporte(self, ausrep, col_map):
+        """Procesa ausentismos del reporte."""
+        ausrep2 = ausrep.copy()
+        ausrep2["id"] = ausrep2[col_map['ar_id']].apply(clean_id)
+        ausrep2["ini"] = pd.to_datetime(ausrep2[col_map['ar_ini']], errors="coerce").dt.date
+        ausrep2["fin"] = pd.to_datetime(ausrep2[col_map['ar_fin']], errors="coerce").dt.date
+        return expand_ranges(ausrep2, self.period_start, self.period_end)
+
+    def _process_retiros(self, retiros, col_map):
+        """Procesa retiros."""
+        retiros2 = retiros.copy()
+        retiros2["id"] = retiros2[col_map['r_id']].apply(clean_id)
+        retiros2["Desde_dt"] = pd.to_datetime(retiros2[col_map['r_desde']], errors="coerce").dt.date
+        retiros2["FechaRetiro"] = retiros2["Desde_dt"].apply(
+            lambda d: d - timedelta(days=1) if pd.notna(d) else None
+        )
+
+        ret_list = (
+            retiros2.groupby("id")["FechaRetiro"]
+            .apply(lambda s: sorted(set([d for d in s.dropna()])))
+            .reset_index()
+        )
+        ret_list["RetiroEfectivo"] = ret_list["FechaRetiro"].apply(
+            lambda lst: effective_date_from_list(lst, self.period_end)
+        )
+        ret_list["ListaRetiros"] = ret_list["FechaRetiro"].apply(
+            lambda lst: ", ".join([d.isoformat() for d in lst]) if isinstance(lst, list) else ""
+        )
+        return ret_list
+
+    def _process_masterdata(self, md, func, col_map):
+        """Procesa MasterData y funciones autorizadas."""
+        md2 = md.copy()
+        md2["id"] = md2[col_map['md_id']].apply(clean_id)
+        md2["funcion"] = md2[col_map['md_func']].astype(str).str.strip()
+        md2["clase_fecha"] = md2[col_map['md_clase']].astype(str).str.strip()
+        md2["fecha_clase"] = pd.to_datetime(md2[col_map['md_fecha']], errors="coerce").dt.date
+
+        md2["ingreso"] = np.where(
+            md2["clase_fecha"].str.lower().str.contains("alta"),
+            md2["fecha_clase"],
+            pd.NaT
+        )
+        md2["ingreso"] = pd.to_datetime(md2["ingreso"], errors="coerce").dt.date
+
+        auth_funcs = set(func[col_map['f_func']].dropna().astype(str).str.strip().unique())
+        md2["autorizado_TS"] = md2["funcion"].isin(auth_funcs)
+
+        ing_list = (
+            md2.groupby("id")["ingreso"]
+            .apply(lambda s: sorted(set([d for d in s.dropna()])))
+            .reset_index()
+        )
+        ing_list["IngresoEfectivo"] = ing_list["ingreso"].apply(
+            lambda lst: effective_date_from_list(lst, self.period_end)
+        )
+        ing_list["ListaIngresos"] = ing_list["ingreso"].apply(
+            lambda lst: ", ".join([d.isoformat() for d in lst]) if isinstance(lst, list) else ""
+        )
+
+        authorized_ids = set(md2.loc[md2["autorizado_TS"] & md2["id"].notna(), "id"].unique())
+        return ing_list, authorized_ids, md2
+
+    def _build_grid(self, marc, ausrep_days, aussap_days, ret_list, ing_list,
+                    authorized_ids, md2, horas, ausrep, aussap2, retiros):
+        """Construye el grid completo con todos los IDs y fechas."""
+        ids_union = pd.Index(pd.concat([
+            pd.Series(list(authorized_ids)),
+            horas[horas.columns[0]].apply(clean_id),
+            ausrep[ausrep.columns[0]].apply(clean_id),
+            aussap2["id"],
+            retiros[retiros.columns[0]].apply(clean_id),
+        ]).dropna().unique())
+
+        all_dates = pd.date_range(self.period_start, self.period_end, freq="D").date
+        grid = pd.MultiIndex.from_product([ids_union, all_dates], names=["id", "fecha"]).to_frame(index=False)
+
+        grid = grid.merge(marc.assign(tiene_marcacion=True), on=["id", "fecha"], how="left")
+        grid["tiene_marcacion"] = grid["tiene_marcacion"].notna()
+        grid = grid.merge(ausrep_days.assign(tiene_aus_rep=True), on=["id", "fecha"], how="left")
+        grid["tiene_aus_rep"] = grid["tiene_aus_rep"].notna()
+        grid = grid.merge(aussap_days.assign(tiene_aus_sap=True), on=["id", "fecha"], how="left")
+        grid["tiene_aus_sap"] = grid["tiene_aus_sap"].notna()
+
+        grid = grid.merge(ret_list[["id", "RetiroEfectivo"]], on="id", how="left")
+        grid = grid.merge(ing_list[["id", "IngresoEfectivo"]], on="id", how="left")
+        grid = grid.merge(md2[["id", "autorizado_TS", "funcion"]].drop_duplicates("id"), on="id", how="left")
+        grid["autorizado_TS"] = grid["autorizado_TS"].eq(True)
+
+        grid["estado_periodo"] = [
+            self._estado_periodo(r, i)
+            for r, i in zip(grid["RetiroEfectivo"], grid["IngresoEfectivo"])
+        ]
+        grid["vigente_dia"] = [
+            self._vigente(d, i, r)
+            for d, i, r in zip(grid["fecha"], grid["IngresoEfectivo"], grid["RetiroEfectivo"])
+        ]
+        grid["sin_soporte"] = (
+            grid["vigente_dia"]
+            & (~grid["tiene_marcacion"])
+            & (~grid["tiene_aus_rep"])
+            & (~grid["tiene_aus_sap"])
+        )
+
+        grid["considerar_activo_TS"] = (grid["estado_periodo"] == "Activo (MD)") & (grid["autorizado_TS"])
+        grid["considerar"] = grid["considerar_activo_TS"] | grid["estado_periodo"].isin([
+            "Retirado en el periodo", "Retirado antes del periodo", "Retiro despues del periodo",
+            "Sin masterdata (posible retirado)"
+        ])
+
+        info_master = pd.DataFrame({"id": ids_union})
+        info_master = info_master.merge(md2[["id", "funcion"]].drop_duplicates("id"), on="id", how="left")
+        info_master = info_master.merge(ret_list[["id", "ListaRetiros"]], on="id", how="left")
+        info_master = info_master.merge(ing_list[["id", "ListaIngresos"]], on="id", how="left")
+        return grid, info_master
+
+    def _estado_periodo(self, ret, ing):
+        """Determina el estado del empleado en el periodo."""
+        if pd.isna(ret):
+            if pd.isna(ing):
+                return "Sin masterdata (posible retirado)"
+            if ing > self.period_end:
+                return "Ingreso posterior al periodo"
+            return "Activo (MD)"
+        if ret < self.period_start:
+            return "Retirado antes del periodo"
+        if ret <= self.period_end:
+            return "Retirado en el periodo"
+        return "Retiro despues del periodo"
+
+    def _vigente(self, d, ing, ret):
+        """Determina si el empleado está vigente en una fecha."""
+        if pd.notna(ing) and d < ing:
+            return False
+        if pd.notna(ret) and d > ret:
+            return False
+        return True
+
+    def _calculate_ausencias_sin_soporte(self, grid, info_master):
+        """Calcula ausencias sin soporte."""
+        # El grid ya trae la función; unir info_master completo duplicaría la columna (funcion_x / funcion_y)
+        aus_sin = grid[grid["considerar"] & grid["sin_soporte"]].merge(
+            info_master.drop(columns="funcion"), on="id", how="left")
+        aus_sin["Observacion"] = aus_sin["estado_periodo"].map(self._obs)
+
+        detail_cols = [
+            "id", "funcion", "autorizado_TS", "fecha", "estado_periodo",
+            "IngresoEfectivo", "RetiroEfectivo",
+            "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap",
+            "sin_soporte", "Observacion", "ListaIngresos", "ListaRetiros"
+        ]
+        return safe_select(aus_sin, detail_cols).sort_values(["estado_periodo", "id", "fecha"])
+
+    def _obs(self, stt):
+        """Genera observación según estado."""
+        return {
+            "Activo (MD)": "Activo autorizado TS: sin marcación y sin ausentismo (Reporte + SAP)",
+            "Retirado en el periodo": "Retirado: sin marcación y sin ausentismo (Reporte + SAP) hasta fecha retiro",
+            "Retiro despues del periodo": "Retiro posterior: sin marcación y sin ausentismo (Reporte + SAP) en el periodo",
+            "Sin masterdata (posible retirado)": "Sin masterdata: sin marcación y sin ausentismo (Reporte + SAP) en el periodo"
+        }.get(stt, "Sin marcación y sin ausentismo (Reporte + SAP)")
+
+    def _generate_summary(self, grid, info_master):
+        """Genera resumen por ID."""
+        g = grid[grid["considerar"]].merge(info_master.drop(columns="funcion"), on="id", how="left")
+
+        need_cols = [
+            "funcion", "autorizado_TS", "estado_periodo",
+            "IngresoEfectivo", "RetiroEfectivo",
+            "ListaIngresos", "ListaRetiros",
+            "fecha", "vigente_dia",
+            "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap",
+            "sin_soporte"
+        ]
+        flags = ["vigente_dia", "tiene_marcacion", "tiene_aus_rep", "tiene_aus_sap", "sin_soporte", "autorizado_TS"]
+        for c in need_cols:
+            if c not in g.columns:
+                g[c] = False if c in flags else np.nan
+
+        summary = g.groupby("id").agg(
+            funcion=("funcion", "first"),
+            autorizado_TS=("autorizado_TS", "first"),
+            estado_periodo=("estado_periodo", "first"),
+            Ingreso=("IngresoEfectivo", "first"),
+            Retiro=("RetiroEfectivo", "first"),
+            ListaIngresos=("ListaIngresos", "first"),
+            ListaRetiros=("ListaRetiros", "first"),
+            DiasPeriodo=("fecha", "nunique"),
+            DiasVigente=("vigente_dia", "sum"),
+            DiasConMarcacion=("tiene_marcacion", "sum"),
+            DiasAusReporte=("tiene_aus_rep", "sum"),
+            DiasAusSAP=("tiene_aus_sap", "sum"),
+            DiasSinSoporte=("sin_soporte", "sum"),
+        ).reset_index()
+
+        ultima_marc = g[g["tiene_marcacion"]].groupby("id")["fecha"].max().rename("UltimaMarcacion")
+        return summary.merge(ultima_marc, on="id", how="left").sort_values(
+            ["estado_periodo", "DiasSinSoporte"], ascending=[True, False]
+        )
+
+
+# =========================
+# Comparación
+# =========================
+def _value(v):
+    """Valor de negocio de una celda: nulos -> None, fechas -> ISO, números enteros -> int."""
+    if v is None or (not isinstance(v, (list, tuple, np.ndarray)) and pd.isna(v)):
+        return None
+    if isinstance(v, (pd.Timestamp, datetime)):
+        return v.date().isoformat() if v == pd.Timestamp(v).normalize() else v.isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return int(v) if float(v).is_integer() else float(v)
+    return str(v)
+
+
+def _rows(df: pd.DataFrame) -> Counter:
+    """Multiconjunto de filas normalizadas."""
+    cols = [[_value(v) for v in df[c].astype(object)] for c in df.columns]
+    return Counter(zip(*cols))
+
+
+def compare_sheets(expected: dict, actual, sheets=None, max_examples: int = 3) -> list[str]:
+    """
+    Diferencias de `actual` (dfs de AusenciasProcessor) frente a `expected` (referencia).
+    Por hoja: columnas, cantidad y conjunto de filas; además conteos por `estado_periodo`
+    y `DiasSinSoporte` por ID del resumen. Lista vacía = resultados equivalentes.
+    """
+    diffs = []
+    for name in sheets or expected:
+        exp = expected[name]
+        if name not in actual:
+            diffs.append(f"{name}: falta la hoja")
+            continue
+        act = actual[name]
+        if list(map(str, exp.columns)) != list(map(str, act.columns)):
+            diffs.append(f"{name}: columnas {list(exp.columns)} != {list(act.columns)}")
+            continue
+        if len(exp) != len(act):
+            diffs.append(f"{name}: {len(exp)} filas en la referencia, {len(act)} en el resultado")
+
+        if "estado_periodo" in exp.columns:
+            e_cnt = exp["estado_periodo"].value_counts().to_dict()
+            a_cnt = act["estado_periodo"].value_counts().to_dict()
+            if e_cnt != a_cnt:
+                diffs.append(f"{name}: conteo por estado_periodo {e_cnt} != {a_cnt}")
+
+        if "DiasSinSoporte" in exp.columns:
+            e_dias = exp.set_index("id")["DiasSinSoporte"].astype(int)
+            a_dias = act.set_index("id")["DiasSinSoporte"].astype(int).reindex(e_dias.index)
+            bad = e_dias[e_dias.ne(a_dias)]
+            if len(bad):
+                ejemplos = ", ".join(f"{i}: {e_dias[i]} != {a_dias[i]}" for i in bad.index[:max_examples])
+                diffs.append(f"{name}: DiasSinSoporte distinto en {len(bad)} IDs ({ejemplos})")
+
+        e_rows, a_rows = _rows(exp), _rows(act)
+        if e_rows != a_rows:
+            solo_ref = list((e_rows - a_rows).elements())
+            solo_act = list((a_rows - e_rows).elements())
+            diffs.append(f"{name}: {len(solo_ref)} filas solo en la referencia, {len(solo_act)} solo en el resultado"
+                         f" (ej. referencia {solo_ref[:max_examples]}, resultado {solo_act[:max_examples]})")
+    return diffs
@@ -0,0 +1,83 @@
+"""
+Reglas de negocio vectorizadas (estado del empleado en el periodo y vigencia diaria).
+
+Equivalen a `ReferenceProcessor._estado_periodo` y `ReferenceProcessor._vigente`
+(reference.py), pero operan sobre arreglos completos: el estado se calcula una vez por ID y la vigencia es
+una comparación del eje de fechas contra los límites ingreso/retiro de cada ID.
+"""
+import numpy as np
+
+from utils import to_day64
+
+
+ESTADO_ACTIVO = "Activo (MD)"
+ESTADO_RETIRADO_EN = "Retirado en el periodo"
+ESTADO_RETIRADO_ANTES = "Retirado antes del periodo"
+ESTADO_RETIRO_DESPUES = "Retiro despues del periodo"
+ESTADO_INGRESO_POSTERIOR = "Ingreso posterior al periodo"
+ESTADO_SIN_MD = "Sin masterdata (posible retirado)"
+
+# Estados que siempre se consideran (además de los activos autorizados en TS)
+ESTADOS_CONSIDERADOS = [
+    ESTADO_RETIRADO_EN, ESTADO_RETIRADO_ANTES, ESTADO_RETIRO_DESPUES, ESTADO_SIN_MD,
+]
+
+# Todos los estados en orden alfabético: el código de cada estado es su posición, así
+# ordenar por código equivale a ordenar por texto
+ESTADOS = sorted([
+    ESTADO_ACTIVO, ESTADO_RETIRADO_EN, ESTADO_RETIRADO_ANTES,
+    ESTADO_RETIRO_DESPUES, ESTADO_INGRESO_POSTERIOR, ESTADO_SIN_MD,
+])
+
+
+def estado_codes(ret, ing, period_start, period_end) -> np.ndarray:
+    """
+    Estado de cada ID según su retiro e ingreso efectivos (mismo orden de reglas que
+    `ReferenceProcessor._estado_periodo`), como código int8 (posición en ESTADOS).
+    """
+    ret = to_day64(ret)
+    ing = to_day64(ing)
+    ps = np.datetime64(period_start, "D")
+    pe = np.datetime64(period_end, "D")
+
+    sin_ret = np.isnat(ret)
+    conds = [
+        sin_ret & np.isnat(ing),
+        sin_ret & (ing > pe),
+        sin_ret,
+        ret < ps,
+        ret <= pe,
+    ]
+    choices = [
+        ESTADO_SIN_MD,
+        ESTADO_INGRESO_POSTERIOR,
+        ESTADO_ACTIVO,
+        ESTADO_RETIRADO_ANTES,
+        ESTADO_RETIRADO_EN,
+    ]
+    codes = [ESTADOS.index(c) for c in choices]
+    return np.select(conds, codes, default=ESTADOS.index(ESTADO_RETIRO_DESPUES)).astype(np.int8)
+
+
+def estado_periodo(ret, ing, period_start, period_end) -> np.ndarray:
+    """Como `estado_codes`, pero retorna un arreglo de objetos (str) del mismo largo."""
+    return np.asarray(ESTADOS, dtype=object)[estado_codes(ret, ing, period_start, period_end)]
+
+
+def vigente(dates, ing, ret) -> np.ndarray:
+    """
+    Matriz booleana (IDs × fechas): True si la fecha no es anterior al ingreso ni
+    posterior al retiro (límites nulos no restringen), como `ReferenceProcessor._vigente`.
+    """
+    dates = to_day64(dates)[None, :]
+    ing = to_day64(ing)[:, None]
+    ret = to_day64(ret)[:, None]
+    antes_ingreso = ~np.isnat(ing) & (dates < ing)
+    despues_retiro = ~np.isnat(ret) & (dates > ret)
+    return ~(antes_ingreso | despues_retiro)
+
+
+def considerar(estado, autorizado_ts) -> tuple[np.ndarray, np.ndarray]:
+    """Retorna (considerar_activo_TS, considerar) por ID."""
+    activo_ts = (estado == ESTADO_ACTIVO) & np.asarray(autorizado_ts, dtype=bool)
+    return activo_ts, activo_ts | np.isin(estado, ESTADOS_CONSIDERADOS)
@@ -0,0 +1,271 @@
+"""
+Normalización de las fuentes de entrada.
+
+Cada archivo se parsea y normaliza una sola vez a un intermedio compacto (ID limpio como
+categórico, fechas datetime64 sin hora) que comparten todas las etapas posteriores.
+Las fuentes son independientes entre sí, por lo que `load_sources` puede cargarlas en
+paralelo en un pool de procesos (el parseo de XML de openpyxl no libera el GIL).
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics import memory_mb, peak_rss_mb
+from utils import clean_ids, find_col
+from readers import read_excel_columns
+from parsers import SNIFF_BYTES, parse_sap_report, read_head, sniff_sap_format
+
+
+# Columnas candidatas por fuente (clave del col_map -> nombres aceptados)
+SOURCE_COLUMNS = {
+    "horas": {
+        "h_id": ["IdentificacionEmpleado", "IdentificaciónEmpleado"],
+        "h_fecha": ["FechaEntrada", "Fecha Entrada"],
+    },
+    "ausrep": {
+        "ar_id": ["Identificacion", "Identificación"],
+        "ar_ini": ["Fecha_Inicio", "Fecha Inicio"],
+        "ar_fin": ["Fecha_Final", "Fecha Final"],
+    },
+    "retiros": {
+        "r_id": ["Número ID", "Numero ID", "Nº ID", "No ID"],
+        "r_desde": ["Desde"],
+    },
+    "md": {
+        "md_id": [
+            "N° pers.", "Nº pers.", "N°pers.", "Nºpers.", "No pers.", "Nro pers.",
+            "Numero pers.", "Número pers.", "Numero de personal", "Numero personal",
+            "Número ID", "Numero ID"
+        ],
+        "md_func": ["Función", "Funcion"],
+        "md_clase": ["Clase de fecha", "Clase Fecha"],
+        "md_fecha": ["Fecha"],
+    },
+    "func": {
+        "f_func": ["Función", "Funcion"],
+    },
+}
+
+# Mensaje de columnas faltantes por fuente
+SOURCE_REQUIRED = {
+    "horas": "Rep_Horas_laboradas: IdentificacionEmpleado / FechaEntrada",
+    "ausrep": "Rep_aususentismos: Identificacion / Fecha_Inicio / Fecha_Final",
+    "retiros": "Retiros: Número ID / Desde",
+    "md": "Md_activos: N° pers. / Función / Clase de fecha / Fecha",
+    "func": "funciones_marcación: Función",
+}
+
+
+def detect_columns(key: str, df: pd.DataFrame) -> dict:
+    """Detecta las columnas de una fuente (None si no se encuentra)."""
+    return {k: find_col(df, cands) for k, cands in SOURCE_COLUMNS[key].items()}
+
+
+def _ids(col) -> pd.Series:
+    """IDs limpios como categórico."""
+    return clean_ids(col).astype("category")
+
+
+def _dates(col) -> pd.Series:
+    """Fechas datetime64 sin hora (NaT si no se puede convertir)."""
+    return pd.to_datetime(col, errors="coerce").dt.normalize()
+
+
+def normalize_horas(horas: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """Marcaciones TS: (id, fecha) únicos con ID válido."""
+    out = pd.DataFrame({"id": _ids(horas[cols["h_id"]]), "fecha": _dates(horas[cols["h_fecha"]])})
+    return out[out["id"].notna()].drop_duplicates().reset_index(drop=True)
+
+
+def normalize_ausrep(ausrep: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """Ausentismos del reporte: rangos (id, ini, fin) con ID válido."""
+    out = pd.DataFrame({
+        "id": _ids(ausrep[cols["ar_id"]]),
+        "ini": _dates(ausrep[cols["ar_ini"]]),
+        "fin": _dates(ausrep[cols["ar_fin"]]),
+    })
+    return out[out["id"].notna()].reset_index(drop=True)
+
+
+def normalize_retiros(retiros: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """Retiros: (id, fecha_retiro) con fecha_retiro = Desde - 1 día."""
+    out = pd.DataFrame({
+        "id": _ids(retiros[cols["r_id"]]),
+        "fecha_retiro": _dates(retiros[cols["r_desde"]]) - np.timedelta64(1, "D"),
+    })
+    return out[out["id"].notna()].reset_index(drop=True)
+
+
+def normalize_md(md: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """MasterData: (id, funcion, ingreso) con ingreso = Fecha si Clase de fecha contiene 'alta'."""
+    clase = md[cols["md_clase"]].astype(str).str.strip()
+    fecha = _dates(md[cols["md_fecha"]])
+    out = pd.DataFrame({
+        "id": _ids(md[cols["md_id"]]),
+        "funcion": md[cols["md_func"]].astype(str).str.strip(),
+        "ingreso": fecha.where(clase.str.lower().str.contains("alta")),
+    })
+    return out[out["id"].notna()].reset_index(drop=True)
+
+
+def normalize_func(func: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """Funciones autorizadas para marcación (únicas)."""
+    funcs = func[cols["f_func"]].dropna().astype(str).str.strip().unique()
+    return pd.DataFrame({"funcion": funcs})
+
+
+def normalize_sap(aussap: pd.DataFrame) -> pd.DataFrame:
+    """Ausentismos SAP parseados: (id, ini, fin, pernr) con fechas datetime64."""
+    return pd.DataFrame({
+        "id": aussap["id"].astype("category"),
+        "ini": _dates(aussap["ini"]),
+        "fin": _dates(aussap["fin"]),
+        "pernr": aussap["pernr"].astype(object),
+    })
+
+
+NORMALIZERS = {
+    "horas": normalize_horas,
+    "ausrep": normalize_ausrep,
+    "retiros": normalize_retiros,
+    "md": normalize_md,
+    "func": normalize_func,
+}
+
+
+# Orden de carga: las cinco fuentes Excel y el reporte SAP
+SOURCE_KEYS = [*SOURCE_COLUMNS, "aussap"]
+
+# Versión de lectura/normalización: subirla invalida la caché de fuentes parseadas
+PARSER_VERSION = 2
+
+
+def file_source(entry: dict):
+    """Contenido de un archivo de entrada: sus 'bytes' o, si no vienen, su 'path' en disco."""
+    return entry["bytes"] if entry.get("bytes") is not None else entry["path"]
+
+
+def load_source(key: str, file_bytes, engine: str | None = None):
+    """
+    Lee y normaliza una fuente (bytes o ruta; con una ruta el reporte SAP grande se
+    parsea por bloques directo desde disco).
+    Retorna (columnas detectadas, intermedio, meta); el intermedio es None si faltan columnas.
+    meta incluye 'formato' detectado, 'segundos' de lectura + normalización, 'filas' y
+    'memoria_mb' del intermedio y 'rss_pico_mb' del proceso que hizo la carga; para SAP
+    además 'segundos_parseo' y 'filas_parseo' de parse_sap_report.
+    """
+    t0 = time.perf_counter()
+    if key == "aussap":
+        fmt = sniff_sap_format(read_head(file_bytes, SNIFF_BYTES))
+        parsed = parse_sap_report(file_bytes, fmt=fmt)
+        t_parse = time.perf_counter() - t0
+        frame = normalize_sap(parsed)
+        cols = {}
+        meta = {"formato": fmt, "segundos_parseo": t_parse, "filas_parseo": len(parsed)}
+    else:
+        raw = read_excel_columns(file_bytes, SOURCE_COLUMNS[key], engine=engine)
+        cols = detect_columns(key, raw)
+        frame = NORMALIZERS[key](raw, cols) if all(cols.values()) else None
+        meta = {"formato": "xlsx"}
+
+    meta.update({
+        "segundos": time.perf_counter() - t0,
+        "filas": 0 if frame is None else len(frame),
+        "memoria_mb": memory_mb(frame),
+        "rss_pico_mb": peak_rss_mb(),
+    })
+    return cols, frame, meta
+
+
+def default_workers() -> int:
+    """Workers por defecto: uno por fuente, sin superar los núcleos disponibles."""
+    return max(1, min(len(SOURCE_KEYS), os.cpu_count() or 1))
+
+
+def process_pool(workers: int, **kwargs) -> ProcessPoolExecutor:
+    """
+    Pool de procesos con arranque forkserver (spawn donde no existe). Nunca fork: la carga
+    corre en hilos del JobManager y un fork con otro hilo reteniendo un lock puede colgarse.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, **kwargs)
+
+
+def load_sources(files: dict, workers: int | None = None, engine: str | None = None,
+                 log=None, cache=None, on_loaded=None) -> dict:
+    """
+    Carga y normaliza las seis fuentes. Con workers > 1 usa un pool de procesos;
+    si el pool no se puede crear (plataforma, recursos) cae a carga secuencial. Un error al
+    parsear una fuente en el pool se propaga igual que en la carga secuencial.
+    Con `cache` (ParseCache) las fuentes ya vistas se leen de disco sin parsear
+    (en ese caso meta['segundos'] es el tiempo de lectura de la caché).
+    `on_loaded(key, resultado)` se llama apenas cada fuente queda lista (primero las de la
+    caché, luego las demás en orden). Si lanza una excepción la carga se corta: las fuentes
+    que no empezaron se cancelan; las que ya se están parseando en el pool terminan antes de
+    que la excepción salga de aquí.
+
+    Returns:
+        Dict key -> (columnas detectadas, intermedio, meta)
+    """
+    workers = default_workers() if workers is None else max(1, int(workers))
+    out = {}
+
+    def done(key, result):
+        out[key] = result
+        cols, frame, meta = result
+        if cache is not None and frame is not None and not meta.get("cache"):
+            try:
+                cache.put(keys[key], cols, frame, meta)
+            except OSError as e:
+                if log:
+                    log(f"[Caché] No se pudo guardar {key}: {e}")
+        if on_loaded is not None:
+            on_loaded(key, result)
+
+    keys = {}
+    if cache is not None:
+        for key in SOURCE_KEYS:
+            t0 = time.perf_counter()
+            keys[key] = cache.key(key, file_source(files[key]), PARSER_VERSION, engine or "")
+            hit = cache.get(keys[key])
+            if hit is not None:
+                cols, frame, meta = hit
+                meta.update({"segundos": time.perf_counter() - t0, "rss_pico_mb": peak_rss_mb()})
+                done(key, (cols, frame, meta))
+
+    pending = [key for key in SOURCE_KEYS if key not in out]
+    args = {key: (key, file_source(files[key]), engine) for key in pending}
+
+    if workers > 1 and len(pending) > 1:
+        # Solo la creación del pool cae a secuencial; los errores de los workers se propagan
+        ex = None
+        try:
+            ex = process_pool(min(workers, len(pending)))
+            futures = [ex.submit(load_source, *args[key]) for key in pending]
+        except (OSError, NotImplementedError) as e:
+            if ex is not None:
+                ex.shutdown(cancel_futures=True)
+                ex = None
+            if log:
+                log(f"[Carga] Pool de procesos no disponible ({type(e).__name__}: {e}); carga secuencial")
+        if ex is not None:
+            with ex:
+                try:
+                    for key, future in zip(pending, futures):
+                        done(key, future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+    # Secuencial (o lo que el pool no alcanzó a cargar)
+    for key in pending:
+        if key not in out:
+            done(key, load_source(*args[key]))
+
+    return {key: out[key] for key in SOURCE_KEYS}
@@ -0,0 +1,410 @@
+"""
+Generador de datos sintéticos para pruebas de rendimiento.
+
+Escribe versiones realistas de los seis archivos de entrada, con los mismos nombres de
+columna y las mismas irregularidades que traen los archivos reales:
+- Rep_Horas_laboradas: una marcación por día laborado (algunas dobles), con descanso semanal,
+  días sin marcación e IDs como número, decimal ("123.0") o texto con espacios.
+- Rep_aususentismos: vacaciones, incapacidades y licencias, algunas iniciadas antes del periodo.
+- Retiros: retiros en el periodo, antes (con marcaciones posteriores) y después.
+- Md_activos: fecha de alta, otras clases de fecha, reingresos e ingresos posteriores al periodo;
+  parte de los empleados no aparece en Master Data.
+- funciones_marcación: funciones autorizadas (más una fila vacía).
+- Ausentismos_SAP: listado SAP en texto plano, HTML con extensión .xls (como lo exporta SAP),
+  .xls binario (requiere `xlwt`) o .xlsx, con líneas de encabezado y totales.
+
+Uso:
+    python -m synthetic --employees 10000 --days 92 --sap html --out datos/
+
+Excel admite 1.048.576 filas por hoja: si las marcaciones no caben (50.000 empleados en 92 días)
+se conserva una muestra aleatoria de ese tamaño y el recorte queda en el manifiesto.
+"""
+import argparse
+import io
+import json
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from writers import EXCEL_MAX_ROWS, write_excel
+
+try:
+    import xlwt
+    HAS_XLWT = True
+except ImportError:
+    HAS_XLWT = False
+
+
+SAP_FORMATS = ["text", "html", "xls", "xlsx"]
+MANIFEST = "manifiesto.json"
+
+# Nombre de archivo por fuente (el de SAP depende del formato)
+FILE_NAMES = {
+    "horas": "Rep_Horas_laboradas.xlsx",
+    "ausrep": "Rep_aususentismos.xlsx",
+    "retiros": "Retiros.xlsx",
+    "md": "Md_activos.xlsx",
+    "func": "funciones_marcación.xlsx",
+}
+SAP_FILE_NAMES = {
+    "text": "Ausentismos_SAP.txt",
+    "html": "Ausentismos_SAP.xls",
+    "xls": "Ausentismos_SAP.xls",
+    "xlsx": "Ausentismos_SAP.xlsx",
+}
+
+# Función -> peso en la planta; las primeras son las autorizadas para marcar en TS
+FUNCIONES = {
+    "CAJERO": 30, "OPERADOR DE TIENDA": 25, "AUXILIAR DE BODEGA": 10, "PANADERO": 5,
+    "CARNICERO": 4, "SUBGERENTE DE TIENDA": 4, "GERENTE DE TIENDA": 3, "CONDUCTOR": 4,
+    "ANALISTA": 6, "COORDINADOR": 4, "JEFE DE AREA": 3, "DIRECTOR": 2,
+}
+FUNCIONES_AUTORIZADAS = list(FUNCIONES)[:8]
+
+# Tipo de ausentismo -> (probabilidad, duración mínima, duración máxima) en días
+AUSENTISMOS = {
+    "Vacaciones": (0.45, 6, 15),
+    "Incapacidad por enfermedad general": (0.35, 1, 10),
+    "Licencia remunerada": (0.12, 1, 3),
+    "Licencia de maternidad": (0.03, 60, 126),
+    "Calamidad doméstica": (0.05, 1, 5),
+}
+SAP_CLASES = {"Vacaciones": "0100", "Incapacidad por enfermedad general": "0200",
+              "Licencia remunerada": "0300", "Licencia de maternidad": "0400",
+              "Calamidad doméstica": "0500"}
+
+# Tasas por empleado (los retiros y ausentismos escalan con la duración del periodo)
+RATES = {
+    "sin_md": 0.02,              # no aparece en Master Data
+    "ingreso_en_periodo": 0.02,
+    "ingreso_posterior": 0.005,
+    "reingreso": 0.03,
+    "otra_clase_fecha": 0.4,
+    "retiro_mes": 0.03,          # retiro dentro del periodo, por cada 30 días
+    "retiro_antes": 0.01,        # retirado antes del periodo que sigue marcando
+    "retiro_despues": 0.01,
+    "ausrep_mes": 0.08,          # ausentismo en el reporte, por cada 30 días
+    "sap_mes": 0.1,              # ausentismo en SAP, por cada 30 días
+    "marca": 0.92,               # probabilidad de marcar un día laborable
+    "marca_descanso": 0.08,      # probabilidad de marcar el día de descanso
+    "marca_doble": 0.03,
+    "marca_no_autorizado": 0.05, # empleados sin función autorizada que igual marcan
+}
+
+
+def _sample(rng, n: int, rate: float) -> np.ndarray:
+    """Máscara booleana con probabilidad `rate` por empleado."""
+    return rng.random(n) < rate
+
+
+def _employee_ids(rng, n: int) -> np.ndarray:
+    """Cédulas únicas de 7 a 10 dígitos, en orden aleatorio."""
+    ids = np.unique(rng.integers(10_000_000, 1_300_000_000, size=int(n * 1.05) + 16))
+    return rng.permutation(ids)[:n]
+
+
+def render_ids(rng, ids: np.ndarray) -> np.ndarray:
+    """IDs como vienen en los reportes: entero, decimal o texto con espacios."""
+    kind = rng.integers(0, 10, size=len(ids))
+    out = ids.astype(object)
+    as_float = kind == 8
+    as_text = kind == 9
+    out[as_float] = ids[as_float].astype(float)
+    out[as_text] = np.char.add(np.char.add(" ", ids[as_text].astype(str)), " ").astype(object)
+    return out
+
+
+def _ranges(rng, ids: np.ndarray, start: date, days: int, rate_month: float):
+    """Rangos de ausentismo (id, inicio, fin, tipo) que tocan el periodo o su borde."""
+    n = rng.binomial(len(ids), min(rate_month * days / 30, 0.9))
+    who = rng.choice(ids, size=n)
+    tipos = list(AUSENTISMOS)
+    probs = np.array([AUSENTISMOS[t][0] for t in tipos])
+    tipo = rng.choice(len(tipos), size=n, p=probs / probs.sum())
+    low = np.array([AUSENTISMOS[t][1] for t in tipos])[tipo]
+    high = np.array([AUSENTISMOS[t][2] for t in tipos])[tipo]
+    dur = rng.integers(low, high + 1)
+    offset = rng.integers(-20, days, size=n)
+    ini = np.datetime64(start) + offset.astype("timedelta64[D]")
+    fin = ini + (dur - 1).astype("timedelta64[D]")
+    return pd.DataFrame({"id": who, "ini": ini, "fin": fin, "tipo": np.array(tipos, dtype=object)[tipo]})
+
+
+def _employees(rng, n: int, start: date, days: int) -> pd.DataFrame:
+    """Planta: id, función, alta, retiro (Desde - 1) y banderas de cada caso."""
+    p_start = np.datetime64(start)
+    ids = _employee_ids(rng, n)
+    names = list(FUNCIONES)
+    weights = np.array(list(FUNCIONES.values()), dtype=float)
+    funcion = np.array(names, dtype=object)[rng.choice(len(names), size=n, p=weights / weights.sum())]
+
+    # Antigüedad: la mayoría con años en la empresa, algunos ingresan durante o después
+    alta = p_start - rng.exponential(3 * 365, size=n).astype("timedelta64[D]") - np.timedelta64(1, "D")
+    en_periodo = _sample(rng, n, RATES["ingreso_en_periodo"])
+    alta[en_periodo] = p_start + rng.integers(0, days, size=en_periodo.sum()).astype("timedelta64[D]")
+    posterior = _sample(rng, n, RATES["ingreso_posterior"])
+    alta[posterior] = p_start + rng.integers(days, days + 30, size=posterior.sum()).astype("timedelta64[D]")
+
+    retiro = np.full(n, np.datetime64("NaT", "D"))
+    caso = rng.random(n)
+    r_en = caso < RATES["retiro_mes"] * days / 30
+    r_antes = (caso >= 0.5) & (caso < 0.5 + RATES["retiro_antes"])
+    r_despues = (caso >= 0.6) & (caso < 0.6 + RATES["retiro_despues"])
+    retiro[r_en] = p_start + rng.integers(0, days, size=r_en.sum()).astype("timedelta64[D]")
+    retiro[r_antes] = p_start - rng.integers(1, 60, size=r_antes.sum()).astype("timedelta64[D]")
+    retiro[r_despues] = p_start + rng.integers(days, days + 60, size=r_despues.sum()).astype("timedelta64[D]")
+    # Un retiro no puede ser anterior al alta
+    bad = ~np.isnat(retiro) & (retiro < alta)
+    alta[bad] = retiro[bad] - np.timedelta64(365, "D")
+
+    # En ns como las columnas que se derivan de estas (unir unidades distintas arma un NaT sin unidad)
+    return pd.DataFrame({
+        "id": ids,
+        "funcion": funcion,
+        "alta": alta.astype("datetime64[ns]"),
+        "retiro": retiro.astype("datetime64[ns]"),
+        "retiro_antes": r_antes,
+        "ingreso_posterior": posterior,
+        "sin_md": _sample(rng, n, RATES["sin_md"]),
+        "reingreso": _sample(rng, n, RATES["reingreso"]),
+    })
+
+
+def _horas(rng, emp: pd.DataFrame, start: date, days: int, absences: pd.DataFrame):
+    """Marcaciones diarias de TimeShift (vectorizado sobre la matriz empleado × día)."""
+    autorizado = emp["funcion"].isin(FUNCIONES_AUTORIZADAS).to_numpy()
+    marca = autorizado | _sample(rng, len(emp), RATES["marca_no_autorizado"])
+    emp = emp[marca]
+    n = len(emp)
+    p_start = np.datetime64(start)
+    day = p_start + np.arange(days).astype("timedelta64[D]")
+
+    descanso = rng.integers(0, 7, size=n)
+    weekday = (day.astype("datetime64[D]").view("int64") - 4) % 7  # 0 = lunes
+    prob = np.where(weekday[None, :] == descanso[:, None], RATES["marca_descanso"], RATES["marca"])
+
+    alta = emp["alta"].to_numpy(dtype="datetime64[D]")
+    retiro = emp["retiro"].to_numpy(dtype="datetime64[D]")
+    # Los que ingresan después del periodo marcan durante la inducción previa
+    vigente = (day[None, :] >= alta[:, None]) | emp["ingreso_posterior"].to_numpy()[:, None]
+    # Los retirados antes del periodo siguen marcando (caso de Retiros_fuera_rango)
+    activo_hasta = np.where(emp["retiro_antes"].to_numpy() | np.isnat(retiro), np.datetime64("2262-01-01"), retiro)
+    vigente &= day[None, :] <= activo_hasta.astype("datetime64[D]")[:, None]
+
+    # Quien está ausente no marca
+    pos = pd.Series(np.arange(n), index=emp["id"].to_numpy())
+    ab = absences[absences["id"].isin(pos.index)]
+    rows = pos.reindex(ab["id"]).to_numpy()
+    ini = np.clip((ab["ini"].to_numpy(dtype="datetime64[D]") - p_start).astype(int), 0, days)
+    fin = np.clip((ab["fin"].to_numpy(dtype="datetime64[D]") - p_start).astype(int) + 1, 0, days)
+    delta = np.zeros((n, days + 1), dtype=np.int32)
+    np.add.at(delta, (rows, ini), 1)
+    np.add.at(delta, (rows, fin), -1)
+    ausente = np.cumsum(delta, axis=1)[:, :days] > 0
+
+    marked = vigente & ~ausente & (rng.random((n, days)) < prob)
+    r, d = np.nonzero(marked)
+    doble = _sample(rng, len(r), RATES["marca_doble"])
+    r = np.concatenate([r, r[doble]])
+    d = np.concatenate([d, d[doble]])
+
+    minutes = np.where(rng.random(len(r)) < 0.6, rng.integers(6 * 60, 9 * 60, size=len(r)),
+                       rng.integers(13 * 60, 15 * 60, size=len(r)))
+    fecha = (day[d].astype("datetime64[m]") + minutes.astype("timedelta64[m]")).astype("datetime64[ns]")
+    horas = pd.DataFrame({
+        "IdentificacionEmpleado": render_ids(rng, emp["id"].to_numpy()[r]),
+        "FechaEntrada": fecha,
+        "HorasLaboradas": np.round(rng.normal(8, 0.6, size=len(r)).clip(4, 12), 2),
+    })
+    return horas.sort_values("FechaEntrada", kind="stable").reset_index(drop=True)
+
+
+def _masterdata(rng, emp: pd.DataFrame) -> pd.DataFrame:
+    """Md_activos: alta por empleado, otras clases de fecha y reingresos."""
+    emp = emp[~emp["sin_md"]]
+    parts = [pd.DataFrame({"N° pers.": emp["id"], "Función": emp["funcion"],
+                           "Clase de fecha": "Fecha de alta", "Fecha": emp["alta"]})]
+    otra = emp[_sample(rng, len(emp), RATES["otra_clase_fecha"])]
+    parts.append(pd.DataFrame({"N° pers.": otra["id"], "Función": otra["funcion"],
+                               "Clase de fecha": "Fecha de antigüedad",
+                               "Fecha": otra["alta"] - pd.to_timedelta(rng.integers(0, 400, size=len(otra)), unit="D")}))
+    re = emp[emp["reingreso"]]
+    parts.append(pd.DataFrame({"N° pers.": re["id"], "Función": re["funcion"],
+                               "Clase de fecha": "Alta reingreso",
+                               "Fecha": re["alta"] + pd.to_timedelta(rng.integers(30, 700, size=len(re)), unit="D")}))
+    md = pd.concat([p for p in parts if len(p)] or parts[:1], ignore_index=True)
+    md["Fecha"] = md["Fecha"].astype("datetime64[ns]")
+    return md.sample(frac=1, random_state=int(rng.integers(2**31))).reset_index(drop=True)
+
+
+def _retiros(rng, emp: pd.DataFrame) -> pd.DataFrame:
+    """Retiros: Desde = día siguiente al retiro; los reingresos traen un retiro histórico."""
+    ret = emp[emp["retiro"].notna()]
+    hist = emp[emp["reingreso"]]
+    parts = [
+        pd.DataFrame({"Número ID": ret["id"], "Desde": ret["retiro"] + np.timedelta64(1, "D")}),
+        pd.DataFrame({"Número ID": hist["id"],
+                      "Desde": hist["alta"] + pd.to_timedelta(rng.integers(1, 30, size=len(hist)), unit="D")}),
+    ]
+    # Sin partes vacías: pandas arma un NaT sin unidad para rellenarlas (DeprecationWarning)
+    out = pd.concat([p for p in parts if len(p)] or parts[:1], ignore_index=True)
+    out.insert(1, "Nombre", "EMPLEADO " + out["Número ID"].astype(str).str[-4:])
+    out.insert(2, "Medida", "Retiro voluntario")
+    out["Desde"] = out["Desde"].astype("datetime64[ns]")
+    return out.sort_values("Desde", kind="stable").reset_index(drop=True)
+
+
+def _sap_lines(sap: pd.DataFrame, pernr: pd.Series) -> list[list[str]]:
+    """Filas del listado SAP como textos (N° pers., cédula, inicio, fin, clase, texto)."""
+    return [
+        [p, str(i), a.strftime("%d.%m.%Y"), b.strftime("%d.%m.%Y"), SAP_CLASES[t], t]
+        for p, i, a, b, t in zip(pernr.reindex(sap["id"]).to_numpy(), sap["id"].to_numpy(),
+                                 pd.to_datetime(sap["ini"]), pd.to_datetime(sap["fin"]), sap["tipo"])
+    ]
+
+
+SAP_HEADER = ["N° pers.", "Número ID", "Inicio", "Fin", "Clase", "Texto clase"]
+
+
+def _sap_bytes(rows: list[list[str]], fmt: str, run_date: date) -> bytes:
+    """Listado SAP en el formato pedido, con encabezado de reporte y línea de totales."""
+    title = f"Absentismos y presencias  Fecha {run_date:%d.%m.%Y}"
+    total = f"Total registros {len(rows)}"
+    if fmt == "text":
+        sep = "-" * 96
+        lines = [title, sep, "|" + "|".join(SAP_HEADER) + "|", sep]
+        lines += ["|" + "|".join(f" {v} " for v in row) + "|" for row in rows]
+        lines += [sep, total]
+        return "\r\n".join(lines).encode("latin-1", errors="replace")
+    if fmt == "html":
+        body = "".join("<tr>" + "".join(f"<td>{v}</td>" for v in row) + "</tr>\n" for row in rows)
+        head = "".join(f"<th>{v}</th>" for v in SAP_HEADER)
+        return (f"<html><head><meta charset=\"utf-8\"></head><body><p>{title}</p>\n"
+                f"<table border=\"1\"><tr>{head}</tr>\n{body}</table><p>{total}</p></body></html>").encode("utf-8")
+    table = [[title], [], SAP_HEADER, *rows, [], [total]]
+    if fmt == "xlsx":
+        buf = io.BytesIO()
+        write_excel({"Sheet1": pd.DataFrame(rows, columns=SAP_HEADER)}, buf)
+        return buf.getvalue()
+    if fmt == "xls":
+        if not HAS_XLWT:
+            raise ValueError("El formato SAP 'xls' binario requiere xlwt instalado (use 'html')")
+        wb = xlwt.Workbook(encoding="utf-8")
+        ws = wb.add_sheet("Sheet1")
+        for r, row in enumerate(table):
+            for c, v in enumerate(row):
+                ws.write(r, c, v)
+        buf = io.BytesIO()
+        wb.save(buf)
+        return buf.getvalue()
+    raise ValueError(f"Formato SAP no soportado: {fmt}")
+
+
+def generate_inputs(n_employees: int = 1000, days: int = 31, start: date = date(2025, 1, 1),
+                    sap_format: str = "text", seed: int = 0):
+    """
+    Genera los seis archivos de entrada.
+
+    Returns:
+        (files, periodo_inicio, periodo_fin, manifiesto). `files` tiene la misma forma que usa
+        la app ({fuente: {"bytes", "name"}}); el manifiesto resume filas por fuente y recortes.
+    """
+    if sap_format not in SAP_FORMATS:
+        raise ValueError(f"Formato SAP no soportado: {sap_format}")
+    rng = np.random.default_rng(seed)
+    end = start + timedelta(days=days - 1)
+
+    emp = _employees(rng, n_employees, start, days)
+    ausrep = _ranges(rng, emp["id"].to_numpy(), start, days, RATES["ausrep_mes"])
+    sap = _ranges(rng, emp["id"].to_numpy(), start, days, RATES["sap_mes"])
+    horas = _horas(rng, emp, start, days, pd.concat([ausrep, sap], ignore_index=True))
+
+    manifest = {"empleados": n_employees, "dias": days, "inicio": str(start), "fin": str(end),
+                "sap_formato": sap_format, "semilla": seed}
+    cap = EXCEL_MAX_ROWS - 1
+    if len(horas) > cap:
+        manifest["horas_recortadas"] = len(horas) - cap
+        keep = np.sort(rng.choice(len(horas), size=cap, replace=False))
+        horas = horas.iloc[keep].reset_index(drop=True)
+
+    frames = {
+        "horas": horas,
+        "ausrep": pd.DataFrame({
+            "Identificación": render_ids(rng, ausrep["id"].to_numpy()),
+            "Nombre": "EMPLEADO",
+            "Fecha_Inicio": ausrep["ini"].astype("datetime64[ns]"),
+            "Fecha_Final": ausrep["fin"].astype("datetime64[ns]"),
+            "Tipo ausentismo": ausrep["tipo"],
+        }),
+        "retiros": _retiros(rng, emp),
+        "md": _masterdata(rng, emp),
+        "func": pd.DataFrame({"Función": [*FUNCIONES_AUTORIZADAS, None]}),
+    }
+    files = {}
+    for key, df in frames.items():
+        buf = io.BytesIO()
+        write_excel({"Sheet1": df}, buf)
+        files[key] = {"bytes": buf.getvalue(), "name": FILE_NAMES[key]}
+        manifest[f"filas_{key}"] = len(df)
+
+    pernr = pd.Series([f"{50_000_000 + i:08d}" for i in range(len(emp))], index=emp["id"].to_numpy())
+    files["aussap"] = {"bytes": _sap_bytes(_sap_lines(sap, pernr), sap_format, end + timedelta(days=1)),
+                       "name": SAP_FILE_NAMES[sap_format].lower()}
+    manifest["filas_aussap"] = len(sap)
+    return files, start, end, manifest
+
+
+def write_inputs(out_dir, **kwargs) -> dict:
+    """
+    Genera los archivos (mismos argumentos de generate_inputs) y los escribe en out_dir junto
+    con `manifiesto.json`, que guarda solo el nombre de cada archivo (la carpeta se puede mover).
+    Retorna el manifiesto como lo lee `read_manifest`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files, _, _, manifest = generate_inputs(**kwargs)
+    manifest["archivos"] = {}
+    for key, f in files.items():
+        (out_dir / f["name"]).write_bytes(f["bytes"])
+        manifest["archivos"][key] = f["name"]
+    (out_dir / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return read_manifest(out_dir)
+
+
+def read_manifest(case_dir) -> dict:
+    """
+    Lee `manifiesto.json` de case_dir con la ruta de cada archivo resuelta: las rutas relativas
+    son relativas a case_dir (las absolutas se respetan).
+    """
+    case_dir = Path(case_dir)
+    manifest = json.loads((case_dir / MANIFEST).read_text(encoding="utf-8"))
+    archivos = {}
+    for key, file in manifest["archivos"].items():
+        path = case_dir / file
+        if not path.exists() and (case_dir / Path(file).name).exists():
+            # Manifiestos anteriores guardaban la ruta desde el directorio de trabajo
+            path = case_dir / Path(file).name
+        archivos[key] = str(path)
+    manifest["archivos"] = archivos
+    return manifest
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m synthetic", description="Genera archivos de entrada sintéticos")
+    p.add_argument("--employees", type=int, default=1000, help="Empleados (por defecto 1000)")
+    p.add_argument("--days", type=int, default=31, help="Días del periodo (por defecto 31)")
+    p.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1), help="Inicio AAAA-MM-DD")
+    p.add_argument("--sap", choices=SAP_FORMATS, default="text", help="Formato del archivo SAP")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", type=Path, default=Path("datos_sinteticos"), help="Carpeta de salida")
+    args = p.parse_args(argv)
+    manifest = write_inputs(args.out, n_employees=args.employees, days=args.days, start=args.start,
+                            sap_format=args.sap, seed=args.seed)
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
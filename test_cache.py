@@ -0,0 +1,131 @@
+"""
+Caché de fuentes parseadas (cache.py): aciertos, llaves, expulsión LRU y entradas dañadas.
+
+    python -m pytest -q test_cache.py
+"""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import cache
+import sources
+from cache import ParseCache
+from sources import SOURCE_KEYS, load_sources
+from synthetic import generate_inputs
+
+
+def _frame(n=200, seed=0):
+    return pd.DataFrame({
+        "id": [str(80000000 + seed * 1000 + k % 50) for k in range(n)],
+        "fecha": pd.date_range("2025-01-01", periods=n, freq="D"),
+        "tipo": pd.Series(["VAC", None] * (n // 2), dtype=object),
+    })
+
+
+@pytest.fixture(params=["parquet", "pickle"])
+def storage(request, monkeypatch):
+    if request.param == "parquet" and not cache.HAS_PARQUET:
+        pytest.skip("pyarrow no instalado")
+    monkeypatch.setattr(cache, "HAS_PARQUET", request.param == "parquet")
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    files, _, _, _ = generate_inputs(80, 31, seed=6)
+    return files
+
+
+def _hits(loaded) -> dict:
+    return {key: bool(meta.get("cache")) for key, (_, _, meta) in loaded.items()}
+
+
+def test_miss_then_hit(tmp_path, storage):
+    pc = ParseCache(tmp_path)
+    key = ParseCache.key("horas", b"contenido", sources.PARSER_VERSION, "")
+    assert pc.get(key) is None
+
+    cols, frame = {"h_id": "Identificación"}, _frame()
+    pc.put(key, cols, frame, {"filas": len(frame)})
+    hit_cols, hit_frame, meta = pc.get(key)
+    assert hit_cols == cols and meta == {"filas": len(frame), "cache": True}
+    pd.testing.assert_frame_equal(hit_frame, frame)
+
+
+def test_key_from_path_matches_bytes(tmp_path):
+    path = tmp_path / "archivo.xlsx"
+    path.write_bytes(b"x" * (3 * 1024 * 1024 + 7))
+    assert ParseCache.key("md", path, 2, "") == ParseCache.key("md", path.read_bytes(), 2, "")
+
+
+def test_key_changes_with_content_version_and_engine(tmp_path, inputs, monkeypatch):
+    pc = ParseCache(tmp_path)
+    fresh = load_sources(inputs, workers=1, cache=pc)
+    hit = load_sources(inputs, workers=1, cache=pc)
+    assert not any(_hits(fresh).values()) and all(_hits(hit).values())
+    for key in SOURCE_KEYS:
+        assert hit[key][0] == fresh[key][0]
+        if fresh[key][1] is not None:
+            pd.testing.assert_frame_equal(hit[key][1], fresh[key][1])
+
+    # Otro motor de lectura o otra versión de parsers: todo se vuelve a parsear
+    assert not any(_hits(load_sources(inputs, workers=1, engine="openpyxl", cache=pc)).values())
+    monkeypatch.setattr(sources, "PARSER_VERSION", sources.PARSER_VERSION + 1)
+    assert not any(_hits(load_sources(inputs, workers=1, cache=pc)).values())
+    monkeypatch.undo()
+
+    # Otro contenido: solo esa fuente
+    sap = inputs["aussap"]
+    changed = {**inputs, "aussap": {**sap, "bytes": sap["bytes"] + b"\n"}}
+    assert _hits(load_sources(changed, workers=1, cache=pc)) == {key: key != "aussap" for key in SOURCE_KEYS}
+
+
+def test_lru_eviction(tmp_path, storage):
+    pc = ParseCache(tmp_path)
+    keys = [ParseCache.key("md", f"archivo {k}".encode()) for k in range(3)]
+    pc.put(keys[0], {}, _frame(seed=0), {})
+    entry = pc.size()
+    pc.max_bytes = int(2.5 * entry)
+    pc.put(keys[1], {}, _frame(seed=1), {})
+
+    # keys[0] es la más antigua, pero un acierto la vuelve la más reciente
+    now = time.time()
+    for key, age in ((keys[0], 200), (keys[1], 100)):
+        for p in tmp_path.glob(f"{key}.*"):
+            os.utime(p, (now - age, now - age))
+    assert pc.get(keys[0]) is not None
+
+    pc.put(keys[2], {}, _frame(seed=2), {})
+    assert pc.get(keys[1]) is None
+    assert pc.get(keys[0]) is not None and pc.get(keys[2]) is not None
+    assert pc.size() <= pc.max_bytes
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage", "missing"])
+def test_damaged_entry_is_a_miss(tmp_path, storage, damage):
+    pc = ParseCache(tmp_path)
+    key = ParseCache.key("retiros", b"contenido")
+    pc.put(key, {}, _frame(), {})
+    data = next(p for p in tmp_path.iterdir() if p.suffix in (".parquet", ".pkl"))
+    if damage == "truncate":
+        data.write_bytes(data.read_bytes()[: data.stat().st_size // 2])
+    elif damage == "garbage":
+        data.write_bytes(b"no es un intermedio")
+    else:
+        data.unlink()
+    assert pc.get(key) is None
+
+    # Una escritura nueva reemplaza la entrada dañada
+    pc.put(key, {}, _frame(), {})
+    pd.testing.assert_frame_equal(pc.get(key)[1], _frame())
+
+
+def test_partial_metadata_is_a_miss(tmp_path):
+    pc = ParseCache(tmp_path)
+    key = ParseCache.key("func", b"contenido")
+    pc.put(key, {}, _frame(), {})
+    meta = tmp_path / f"{key}.json"
+    meta.write_text(meta.read_text(encoding="utf-8")[:20], encoding="utf-8")
+    assert pc.get(key) is None
@@ -0,0 +1,84 @@
+"""
+Corrida por consola (cli.py): periodos mensuales, una salida por mes y libro consolidado.
+
+    python -m pytest -q test_cli.py
+"""
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from cli import FILE_ARGS, main, month_periods
+from processor import AusenciasProcessor
+from synthetic import write_inputs
+from writers import sheet_rows
+
+
+@pytest.fixture(scope="module")
+def case(tmp_path_factory):
+    """Archivos sintéticos de diciembre 2024 a enero 2025 (cambio de año)."""
+    return write_inputs(tmp_path_factory.mktemp("caso"), n_employees=120, days=62, start=date(2024, 12, 1), seed=8)
+
+
+def _args(manifest, out, *extra):
+    files = [arg for key in FILE_ARGS for arg in (f"--{key}", manifest["archivos"][key])]
+    return [*files, "--out", str(out), "--no-cache", *extra]
+
+
+def _files(manifest) -> dict:
+    return {key: {"path": path, "name": Path(path).name.lower()} for key, path in manifest["archivos"].items()}
+
+
+def _detail_rows(manifest, start, end) -> int:
+    dfs = AusenciasProcessor(start, end, workers=1).process(_files(manifest), build_excel=False)["dfs"]
+    return dfs.n_rows("Ausencias_sin_soporte")
+
+
+def test_month_periods_year_rollover():
+    assert month_periods("2024-11", "2025-02") == [
+        (date(2024, 11, 1), date(2024, 11, 30)),
+        (date(2024, 12, 1), date(2024, 12, 31)),
+        (date(2025, 1, 1), date(2025, 1, 31)),
+        (date(2025, 2, 1), date(2025, 2, 28)),
+    ]
+    assert month_periods("2024-02", "2024-02") == [(date(2024, 2, 1), date(2024, 2, 29))]
+    assert month_periods("2025-03", "2025-01") == []
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_one_workbook_per_month(case, tmp_path, capsys, workers):
+    assert main(_args(case, tmp_path, "--months", "2024-12", "2025-01", "--workers", workers)) == 0
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == ["Ausencias_sin_soporte_2024-12-01_2024-12-31.xlsx",
+                     "Ausencias_sin_soporte_2025-01-01_2025-01-31.xlsx"]
+    assert capsys.readouterr().out.split() == [str(tmp_path / n) for n in names]
+
+    detail = pd.read_excel(tmp_path / names[1], sheet_name="Ausencias_sin_soporte")
+    assert len(detail) == _detail_rows(case, date(2025, 1, 1), date(2025, 1, 31))
+
+
+def test_consolidated_workbook(case, tmp_path):
+    assert main(_args(case, tmp_path, "--months", "2024-12", "2025-01", "--consolidated", "--workers", "1")) == 0
+    path = tmp_path / "Ausencias_sin_soporte_2024-12-01_2025-01-31.xlsx"
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+    detail = pd.read_excel(path, sheet_name="Ausencias_sin_soporte")
+    assert detail.columns[0] == "Periodo"
+    counts = detail["Periodo"].value_counts().to_dict()
+    assert counts == {
+        "2024-12-01_2024-12-31": _detail_rows(case, date(2024, 12, 1), date(2024, 12, 31)),
+        "2025-01-01_2025-01-31": _detail_rows(case, date(2025, 1, 1), date(2025, 1, 31)),
+    }
+
+
+def test_periods_on_disk_skip_sheets(case, tmp_path):
+    processor = AusenciasProcessor(date(2024, 12, 1), date(2024, 12, 31), workers=1)
+    prepared = processor.prepare(_files(case))
+    periods = month_periods("2024-12", "2025-01")
+    on_disk = processor.evaluate_periods(prepared, periods, workers=2, output_dir=tmp_path)
+    assert [r["dfs"] for r in on_disk] == [None, None]
+    assert all(r["excel_path"].is_file() for r in on_disk)
+    in_memory = processor.evaluate_periods(prepared, periods, workers=2, build_excel=False)
+    assert [sheet_rows(r["dfs"], "Ausencias_sin_soporte") for r in in_memory] == [
+        _detail_rows(case, *p) for p in periods]
@@ -0,0 +1,375 @@
+"""
+Equivalencia entre AusenciasProcessor y la implementación de referencia (reference.py).
+
+    python -m pytest -q test_equivalence.py
+
+Corre sobre datos sintéticos (cada formato SAP, periodos de 31 y 92 días, un proceso y varios)
+y, si se define AUSENCIAS_RECORDED_DIR, sobre cada subcarpeta con archivos reales y un
+`manifiesto.json` con el mismo formato que escribe `python -m synthetic`
+("inicio", "fin" y "archivos": {fuente: ruta}; las rutas relativas son relativas a la subcarpeta).
+"""
+import io
+import os
+import zipfile
+from datetime import date, timedelta
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import parsers
+import readers
+import rules
+import writers
+from parsers import parse_sap_report
+from processor import AusenciasProcessor
+from reference import ReferenceProcessor, compare_sheets
+from reference import _parse_sap_from_dataframe as reference_sap_dataframe
+from reference import _parse_sap_from_text_lines as reference_sap_lines
+from reference import expand_ranges as reference_expand_ranges
+from reference import parse_sap_report as reference_parse_sap
+from sources import load_sources
+from synthetic import HAS_XLWT, SAP_FORMATS, generate_inputs, read_manifest, write_inputs
+from utils import clean_id, clean_ids, expand_ranges
+from writers import Sheets, available_table_formats, write_excel, write_tables_zip
+
+
+SYNTHETIC_CASES = [
+    (fmt, days) for fmt in SAP_FORMATS if fmt != "xls" or HAS_XLWT for days in (31, 92)
+]
+
+
+def _recorded_cases():
+    root = os.environ.get("AUSENCIAS_RECORDED_DIR")
+    if not root:
+        return []
+    return sorted(p.parent for p in Path(root).glob("*/manifiesto.json"))
+
+
+def _load_recorded(path: Path):
+    manifest = read_manifest(path)
+    files = {}
+    for key, file in manifest["archivos"].items():
+        file = Path(file)
+        files[key] = {"bytes": file.read_bytes(), "name": file.name.lower()}
+    return files, date.fromisoformat(manifest["inicio"]), date.fromisoformat(manifest["fin"])
+
+
+def _assert_equivalent(files, start, end, **kwargs):
+    expected = ReferenceProcessor(start, end).process(files)
+    result = AusenciasProcessor(start, end, cache=None, **kwargs).process(files, build_excel=False)
+    assert expected is not None and result is not None
+    assert compare_sheets(expected, result["dfs"]) == []
+
+
+@pytest.mark.parametrize("sap_format,days", SYNTHETIC_CASES)
+def test_synthetic(sap_format, days):
+    files, start, end, _ = generate_inputs(400, days, sap_format=sap_format, seed=days)
+    _assert_equivalent(files, start, end, workers=1)
+
+
+@pytest.mark.parametrize("days", [31, 92])
+def test_synthetic_compact(days):
+    files, start, end, _ = generate_inputs(400, days, seed=days + 1)
+    _assert_equivalent(files, start, end, workers=1, compact=True)
+
+
+@pytest.mark.parametrize("sap_format", ["text", "html"])
+def test_synthetic_streaming(sap_format, monkeypatch):
+    # Los sintéticos no llegan a STREAM_MIN_BYTES: se fuerza el parseo SAP por lotes
+    monkeypatch.setattr(parsers, "STREAM_MIN_BYTES", 0)
+    files, start, end, _ = generate_inputs(400, 31, sap_format=sap_format, seed=13)
+    _assert_equivalent(files, start, end, workers=1)
+
+
+def test_paths_streaming(tmp_path, monkeypatch):
+    # Archivos como rutas (como los pasa el CLI): el SAP se parsea por bloques desde disco
+    monkeypatch.setattr(parsers, "STREAM_MIN_BYTES", 0)
+    files, start, end, _ = generate_inputs(300, 31, sap_format="html", seed=17)
+    paths = {}
+    for key, f in files.items():
+        path = tmp_path / f"{key}_{f['name']}"
+        path.write_bytes(f["bytes"])
+        paths[key] = {"path": path, "name": f["name"]}
+    expected = ReferenceProcessor(start, end).process(files)
+    result = AusenciasProcessor(start, end, workers=2, cache=None).process(paths, build_excel=False)
+    assert compare_sheets(expected, result["dfs"]) == []
+
+
+SAP_PRE = (
+    b"<!DOCTYPE html><html><body><pre>\n Pers.No  Cedula      Desde       Hasta\n"
+    b" 00012345 1023456789  01.01.2025  03.01.2025\n"
+    b" 00012346 1023456790  05.01.2025  06.01.2025\n</pre></body></html>"
+)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_sap_html_without_table(stream):
+    # HTML sin <table> (spool en <pre>): se lee como texto, igual que la referencia
+    expected = reference_parse_sap(SAP_PRE, "sap.xls")
+    result = parse_sap_report(SAP_PRE, stream=stream)
+    assert len(expected) == 2
+    assert result.to_dict("list") == expected.to_dict("list")
+
+
+def test_sap_html_blank_cells():
+    # Con una celda vacía pd.read_html infiere float ('1023456789.0') y la referencia pierde
+    # todas las filas; las celdas se leen como texto y ambos modos conservan las filas válidas
+    rows = "".join(
+        f"<tr><td>{p}</td><td>{c}</td><td>01.01.2025</td><td>03.01.2025</td></tr>"
+        for p, c in [("00012345", "1023456789"), ("00012346", ""), ("00012347", "1023456791")]
+    )
+    html = (f"<html><body><table><tr><th>Pers</th><th>Cedula</th><th>Desde</th><th>Hasta</th></tr>"
+            f"{rows}</table></body></html>").encode()
+    assert reference_parse_sap(html, "sap.xls").empty
+    plain = parse_sap_report(html, stream=False)
+    streamed = parse_sap_report(html, stream=True)
+    assert plain.to_dict("list") == streamed.to_dict("list")
+    assert plain["id"].tolist() == ["1023456789", "1023456791"]
+    assert plain["pernr"].tolist() == ["00012345", "00012347"]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rules_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    start = date(2025, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+    end = start + timedelta(days=int(rng.integers(0, 92)))
+    ref = ReferenceProcessor(start, end)
+
+    def random_dates(n):
+        # Nulos y fechas alrededor del periodo, incluidos sus límites
+        offsets = rng.integers(-40, (end - start).days + 40, n)
+        values = [start + timedelta(days=int(o)) for o in offsets]
+        values[:4] = [start, end, start - timedelta(days=1), end + timedelta(days=1)]
+        return [None if rng.random() < 0.25 else v for v in values]
+
+    ret, ing = random_dates(500), random_dates(500)
+    assert rules.estado_periodo(ret, ing, start, end).tolist() == [
+        ref._estado_periodo(r if r is not None else np.nan, i if i is not None else np.nan)
+        for r, i in zip(ret, ing)]
+
+    dates = [start + timedelta(days=k) for k in range((end - start).days + 1)]
+    expected = [[ref._vigente(d, i if i is not None else np.nan, r if r is not None else np.nan) for d in dates]
+                for r, i in zip(ret, ing)]
+    assert rules.vigente(dates, ing, ret).tolist() == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_expand_ranges_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    start = date(2025, 1, 1) + timedelta(days=int(rng.integers(0, 365)))
+    end = start + timedelta(days=int(rng.integers(0, 62)))
+    n = 400
+    # Rangos alrededor del periodo: invertidos, de un día, fuera del periodo, nulos y repetidos por ID
+    ini = [start + timedelta(days=int(o)) for o in rng.integers(-30, (end - start).days + 30, n)]
+    fin = [d + timedelta(days=int(k)) for d, k in zip(ini, rng.integers(-5, 20, n))]
+    fin[:40] = ini[:40]
+    ids = [str(v) for v in rng.integers(1, 60, n)]
+    for col in (ids, ini, fin):
+        for k in np.flatnonzero(rng.random(n) < 0.05):
+            col[k] = None
+    df = pd.DataFrame({"id": ids, "ini": ini, "fin": fin})
+
+    expected = reference_expand_ranges(df, start, end).reset_index(drop=True)
+    result = expand_ranges(df, start, end).reset_index(drop=True)
+    assert result.values.tolist() == expected.values.tolist()
+
+
+CLEAN_ID_CASES = [
+    pd.Series([1.0, 2.5, np.nan, 1e10, 123456789.0, -3.0]),
+    pd.Series([7, 80012345, None], dtype="Int64"),
+    pd.Series([1, 22, 333]),
+    pd.Series([" 12 34 ", "", "   ", "12.0", "12.00", None, "abc.0", "1.0.0", "0"]),
+    pd.Series([1, "2.0", 3.5, None, 4.0, " 5 ", np.int64(6), np.nan]),
+    pd.Series([None, None], dtype=object),
+    pd.Series([True, False]),
+    pd.Series([], dtype=object),
+    # Columnas object por tipo de celda: numpy, enteros enormes, bool y tipos sin ruta en bloque
+    pd.Series([np.str_(" 7.0"), np.int32(8), np.int64(9), np.float32(1.5), True, 2 ** 70, ".0", "x\t"], dtype=object),
+    pd.Series([10, 2 ** 63, -4, None], dtype=object),
+    pd.Series([1.0, 2.5, None, "3.0", 4], dtype=object),
+]
+
+
+@pytest.mark.parametrize("values", CLEAN_ID_CASES, ids=range(len(CLEAN_ID_CASES)))
+def test_clean_ids_matches_scalar(values):
+    assert clean_ids(values).tolist() == [clean_id(v) for v in values]
+
+
+SAP_LINE_CASES = [
+    # Empate del número más largo: gana el primero
+    "01.01.2025 02.01.2025 1000001 12345678 87654321",
+    # El primer número (pernr) repetido no cuenta como cédula
+    "01.01.2025 02.01.2025 1000002 1000002 99887766",
+    "01.01.2025 02.01.2025 1000003 1000003",
+    # Límites de palabra: pegados a letras no son tokens; guion y barra sí separan
+    "01.01.2025 02.01.2025 A1000004 1000004B 1000005-99887766/1234567",
+    "x01.01.2025 02.01.2025 03.01.2025 1000006 55555555",
+    # Más de 15 dígitos no es un número; más de dos fechas, solo cuentan las dos primeras
+    "01.01.2025 02.01.2025 05.01.2025 1000007 1234567890123456 7777777",
+    # Incompletas o con fecha inválida: se descartan
+    "01.01.2025 1000008 66666666",
+    "01.01.2025 02.01.2025 1000009",
+    "31.02.2025 02.03.2025 1000010 44444444",
+    "",
+    "\t01.02.2025\t\t28.02.2025\t1000011\t  33333333 \t",
+]
+
+
+def _sap_records(df):
+    return [tuple(r) for r in df[["id", "ini", "fin", "pernr"]].itertuples(index=False)]
+
+
+def test_sap_fields_match_scalar():
+    lines = pd.Series(SAP_LINE_CASES)
+    assert _sap_records(parsers._parse_sap_from_text_lines(lines)) == _sap_records(reference_sap_lines(lines))
+
+    # Misma tabla como celdas separadas por tabuladores (ruta DataFrame)
+    raw = pd.DataFrame([line.split() or [None] for line in SAP_LINE_CASES])
+    assert _sap_records(parsers._parse_sap_from_dataframe(raw)) == _sap_records(reference_sap_dataframe(raw))
+
+
+@pytest.mark.skipif(not readers.HAS_CALAMINE, reason="python-calamine no instalado")
+@pytest.mark.parametrize("offset", [(1, 1), (1, 3)])
+def test_calamine_columns_match_pandas(offset):
+    # Encabezado corrido, duplicados, vacíos, errores y tipos mezclados: igual que pd.read_excel
+    import openpyxl
+    from datetime import datetime, time
+
+    rows = [[" ID ", "Fecha", "Valor", "Texto", "Texto", None, 2025],
+            [1, datetime(2025, 1, 2), 1.5, "NA", "x", 1, 2],
+            ["0012", date(2025, 1, 3), 2.0, "#N/A", None, None, None],
+            [None] * 7,
+            [3.0, datetime(2025, 1, 4, 10, 30), True, "", "y", None, None],
+            [None, None, time(8, 30), None, "solo otra", None, None]]
+    wb = openpyxl.Workbook()
+    for r, row in enumerate(rows, start=offset[0]):
+        for c, v in enumerate(row, start=offset[1]):
+            if v is not None:
+                wb.active.cell(row=r, column=c, value=v)
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    candidates = {"id": ["id"], "fecha": ["fecha"], "valor": ["valor"], "texto": ["texto.1"], "falta": ["otra"]}
+    got = readers.read_excel_columns(buf.getvalue(), candidates, engine="calamine")
+    expected = pd.read_excel(io.BytesIO(buf.getvalue()), engine="calamine")
+    expected.columns = [str(c).strip() for c in expected.columns]
+    assert list(got.columns) == ["ID", "Fecha", "Valor", "Texto.1"]
+    pd.testing.assert_frame_equal(got, expected[list(got.columns)])
+
+
+def test_synthetic_parallel_openpyxl():
+    files, start, end, _ = generate_inputs(400, 31, sap_format="html", seed=7)
+    _assert_equivalent(files, start, end, workers=2, read_engine="openpyxl")
+
+
+def test_parallel_worker_error_propagates():
+    # Un archivo dañado falla en el worker y sale tal cual: no se reintenta en secuencial
+    files, _, _, _ = generate_inputs(50, 31, seed=3)
+    files["retiros"] = {**files["retiros"], "bytes": b"no es un libro"}
+    logs = []
+    with pytest.raises(Exception):
+        load_sources(files, workers=2, cache=None, log=logs.append)
+    assert not any("no disponible" in line for line in logs)
+
+
+@pytest.mark.parametrize("path", _recorded_cases(), ids=lambda p: p.name)
+def test_recorded(path):
+    _assert_equivalent(*_load_recorded(path))
+
+
+def test_recorded_roundtrip(tmp_path, monkeypatch):
+    # Mismo flujo documentado: `python -m synthetic --out datos/caso` y AUSENCIAS_RECORDED_DIR=datos
+    monkeypatch.chdir(tmp_path)
+    write_inputs(Path("datos") / "caso", n_employees=60, days=31, seed=5)
+    monkeypatch.setenv("AUSENCIAS_RECORDED_DIR", "datos")
+    cases = _recorded_cases()
+    assert [p.name for p in cases] == ["caso"]
+
+    files, start, end = _load_recorded(cases[0])
+    expected, exp_start, exp_end, _ = generate_inputs(n_employees=60, days=31, seed=5)
+    assert (start, end) == (exp_start, exp_end)
+    assert {k: f["name"] for k, f in files.items()} == {k: f["name"].lower() for k, f in expected.items()}
+    # Los .xlsx guardan la hora de creación: se compara el contenido, no los bytes
+    for key, f in files.items():
+        if f["name"].endswith(".xlsx"):
+            pd.testing.assert_frame_equal(pd.read_excel(io.BytesIO(f["bytes"])),
+                                          pd.read_excel(io.BytesIO(expected[key]["bytes"])))
+        else:
+            assert f["bytes"] == expected[key]["bytes"]
+    _assert_equivalent(files, start, end, workers=1)
+
+
+def test_shadow_mode():
+    files, start, end, _ = generate_inputs(300, 31, seed=3)
+    result = AusenciasProcessor(start, end, workers=1, shadow=True).process(files, build_excel=False)
+    assert result["shadow"] == []
+    assert any(line.startswith("[Shadow] Sin diferencias") for line in result["logs"])
+
+
+def test_shadow_mode_detects_differences():
+    files, start, end, _ = generate_inputs(300, 31, seed=3)
+    expected = ReferenceProcessor(start, end).process(files)
+    changed = dict(expected)
+    changed["Ausencias_sin_soporte"] = expected["Ausencias_sin_soporte"].iloc[1:]
+    diffs = compare_sheets(expected, changed)
+    assert any("Ausencias_sin_soporte" in d and "estado_periodo" in d for d in diffs)
+
+
+@pytest.mark.parametrize("fmt", available_table_formats())
+def test_tables_zip_chunked(fmt):
+    files, start, end, _ = generate_inputs(300, 31, seed=3)
+    dfs = AusenciasProcessor(start, end, workers=1).process(files, build_excel=False)["dfs"]
+    # Columna sin tipo en las primeras partes (solo nulos) y con fechas después
+    late = pd.DataFrame({"id": list("abcdef"), "Retiro": [None] * 4 + [date(2025, 1, 2), None]})
+    sheets = {"Ausencias_sin_soporte": dfs["Ausencias_sin_soporte"], "Tardia": late}
+
+    whole, chunked = io.BytesIO(), io.BytesIO()
+    write_tables_zip(sheets, whole, fmt, chunk_rows=10 ** 9)
+    write_tables_zip(sheets, chunked, fmt, chunk_rows=2)
+    read = pd.read_parquet if fmt == "parquet" else partial(pd.read_csv, compression="gzip")
+    with zipfile.ZipFile(whole) as zw, zipfile.ZipFile(chunked) as zc:
+        assert zw.namelist() == zc.namelist()
+        for name in zw.namelist():
+            expected, got = read(io.BytesIO(zw.read(name))), read(io.BytesIO(zc.read(name)))
+            pd.testing.assert_frame_equal(got, expected)
+
+
+@pytest.mark.parametrize("engine", list(writers.WRITERS))
+def test_excel_split_sheets(engine, monkeypatch):
+    # Partes de 4 filas que cruzan el límite de 9 filas de datos por hoja (max_rows=10 con encabezado)
+    monkeypatch.setattr(writers, "CHUNK_ROWS", 4)
+    if engine == "xlsxwriter" and not writers.HAS_XLSXWRITER:
+        pytest.skip("xlsxwriter no instalado")
+
+    def frame(n):
+        return pd.DataFrame({
+            "id": [f"E{k:04d}" for k in range(n)],
+            "dias": np.arange(n) % 7,
+            "fecha": pd.date_range("2025-01-01", periods=n, freq="D"),
+        })
+
+    long_name = "Resumen_por_funcion_y_estado_xx"
+    sheets = Sheets()
+    sheets.add("Ausencias_sin_soporte", frame(23))
+    sheets.add_lazy(long_name, 19, lambda size: (frame(19).iloc[k:k + size] for k in range(0, 19, size)))
+    sheets.add("Exacta", frame(9))
+    sheets.add("Vacia", frame(0))
+
+    buf = io.BytesIO()
+    write_excel(sheets, buf, engine=engine, max_rows=10)
+    got = pd.read_excel(io.BytesIO(buf.getvalue()), sheet_name=None)
+    # Con el sufijo el nombre se recorta para no pasar de 31 caracteres
+    parts = {
+        "Ausencias_sin_soporte": ["Ausencias_sin_soporte", "Ausencias_sin_soporte_2", "Ausencias_sin_soporte_3"],
+        long_name: [long_name, long_name[:29] + "_2", long_name[:29] + "_3"],
+        "Exacta": ["Exacta"],
+    }
+    assert list(got) == [*(n for names in parts.values() for n in names), "Vacia"]
+    assert all(len(n) <= 31 for n in got) and all(len(df) <= 9 for df in got.values())
+    for name, names in parts.items():
+        joined = pd.concat([got[n] for n in names], ignore_index=True)
+        pd.testing.assert_frame_equal(joined, frame(sheets.n_rows(name)), check_dtype=False)
+    assert list(got["Vacia"].columns) == ["id", "dias", "fecha"] and got["Vacia"].empty
@@ -0,0 +1,129 @@
+"""
+Trabajos en segundo plano (jobs.py): límite de concurrencia, cola de admisión, avance y cancelación.
+
+    python -m pytest -q test_jobs.py
+"""
+import io
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELADO, EJECUTANDO, EN_COLA, ERROR, LISTO, JobManager, QueueFull
+from processor import EVALUATE_STAGES, PREPARE_STAGES, AusenciasProcessor, expected_stages
+from synthetic import generate_inputs
+from writers import write_excel, write_steps, write_tables_zip
+
+
+def _wait(job, timeout=60):
+    t0 = time.time()
+    while not job.terminated:
+        assert time.time() - t0 < timeout, f"el trabajo {job.id} no terminó"
+        time.sleep(0.01)
+    return job
+
+
+def _blocking(gate):
+    def fn(job):
+        gate.wait(10)
+        job.report({"etapa": "espera"})
+        return "ok"
+    return fn
+
+
+def test_concurrency_cap_and_queue():
+    gate = threading.Event()
+    jobs = JobManager(max_workers=1, max_queue=1)
+    first = jobs.submit(_blocking(gate))
+    while first.status != EJECUTANDO:
+        time.sleep(0.01)
+    second = jobs.submit(_blocking(gate))
+    assert second.status == EN_COLA and jobs.position(second.id) == 1
+    with pytest.raises(QueueFull):
+        jobs.submit(_blocking(gate))
+    gate.set()
+    assert _wait(first).result == "ok" and _wait(second).status == LISTO
+    jobs.shutdown()
+
+
+def test_cancel_queued_and_running():
+    gate = threading.Event()
+    jobs = JobManager(max_workers=1, max_queue=2)
+    running = jobs.submit(_blocking(gate))
+    while running.status != EJECUTANDO:
+        time.sleep(0.01)
+    queued = jobs.submit(_blocking(gate))
+    assert jobs.cancel(queued.id) and queued.status == CANCELADO
+    assert jobs.cancel(running.id)
+    gate.set()
+    assert _wait(running).status == CANCELADO and running.result is None
+    assert not jobs.cancel(running.id)
+    jobs.shutdown()
+
+
+def test_error_is_captured():
+    jobs = JobManager(max_workers=1)
+    job = _wait(jobs.submit(lambda job: 1 / 0))
+    assert job.status == ERROR and "ZeroDivisionError" in job.error
+    jobs.shutdown()
+
+
+def test_processor_progress_and_retention():
+    files, start, end, _ = generate_inputs(200, 31, seed=2)
+
+    def run(job):
+        return AusenciasProcessor(start, end, workers=1, progress=job.report).process(files, build_excel=False)
+
+    jobs = JobManager(max_workers=2, keep=1)
+    job = _wait(jobs.submit(run, total=expected_stages()))
+    assert job.status == LISTO and job.progress == 1.0
+    etapas = [r["etapa"] for r in job.result["metrics"]]
+    assert job.done == len(etapas) == expected_stages() and job.stage == etapas[-1]
+    assert [e for e in etapas if not e.startswith(("carga:", "parse_"))] == [*PREPARE_STAGES, *EVALUATE_STAGES]
+    assert jobs.get(job.id) is job
+
+    # Solo se retiene `keep` trabajos terminados
+    later = _wait(jobs.submit(lambda job: None))
+    assert jobs.get(job.id) is None and jobs.get(later.id) is later
+    jobs.shutdown()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cancel_during_load(workers):
+    files, start, end, _ = generate_inputs(100, 31, seed=4)
+    loaded, cancelled = threading.Event(), threading.Event()
+    seen = []
+
+    def run(job):
+        def progress(record):
+            seen.append(record["etapa"])
+            loaded.set()
+            cancelled.wait(10)
+            job.report(record)
+        return AusenciasProcessor(start, end, workers=workers, progress=progress).prepare(files)
+
+    jobs = JobManager(max_workers=1)
+    job = jobs.submit(run)
+    assert loaded.wait(60)
+    jobs.cancel(job.id)
+    cancelled.set()
+    # Se corta con la primera fuente cargada, sin seguir con las demás
+    assert _wait(job).status == CANCELADO and job.done == 0
+    assert len(seen) == 1 and seen[0].startswith(("carga:", "parse_"))
+    jobs.shutdown()
+
+
+def test_writer_progress():
+    files, start, end, _ = generate_inputs(200, 31, seed=2)
+    dfs = AusenciasProcessor(start, end, workers=1).process(files, build_excel=False)["dfs"]
+    for write in (lambda p: write_excel(dfs, io.BytesIO(), progress=p),
+                  lambda p: write_tables_zip(dfs, io.BytesIO(), "csv.gz", progress=p)):
+        records = []
+        write(records.append)
+        assert len(records) == write_steps(dfs) and records[0]["etapa"] == "Parametros"
+
+        # Una excepción del callback (cancelación) corta la escritura en la parte siguiente
+        def cancel(record):
+            raise RuntimeError("cancelado")
+        with pytest.raises(RuntimeError):
+            write(cancel)
@@ -0,0 +1,69 @@
+"""
+Visor paginado (viewer.py): filtros y páginas iguales a filtrar la hoja completa con pandas.
+
+    python -m pytest -q test_viewer.py
+"""
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from processor import AusenciasProcessor
+from synthetic import generate_inputs
+from viewer import ResultView, build_views
+
+
+def _nulls(df):
+    df = df.reset_index(drop=True).astype(object)
+    return df.where(df.notna(), None)
+
+
+@pytest.fixture(scope="module")
+def result():
+    files, start, end, _ = generate_inputs(600, 31, seed=11)
+    res = AusenciasProcessor(start, end, workers=1).process(files, build_excel=False)
+    detail = pd.concat(list(res["dfs"].iter_chunks("Ausencias_sin_soporte", 10 ** 9)), ignore_index=True)
+    return res["dfs"], detail, start
+
+
+def test_page_roundtrip_and_counts(result):
+    dfs, detail, _ = result
+    view = ResultView.from_sheet(dfs, "Ausencias_sin_soporte", date_col="fecha", chunk_rows=500)
+    assert len(view) == len(detail)
+    all_rows = view.page(view.filter(), 1, len(view))
+    assert list(all_rows.dtypes) == list(detail.dtypes)
+    assert _nulls(all_rows).equals(_nulls(detail))
+
+    expected = detail["estado_periodo"].value_counts().sort_index()
+    assert view.counts["estado_periodo"].tolist() == expected.index.tolist()
+    assert view.counts["filas"].tolist() == expected.tolist()
+
+
+def test_filters_match_pandas(result):
+    dfs, detail, start = result
+    view = build_views(dfs)["detalle"]
+    funciones = view.options("funcion")[:2]
+    desde, hasta = start + timedelta(days=3), start + timedelta(days=20)
+    positions = view.filter(estados=["Activo (MD)"], funciones=funciones, ids="1, 7", desde=desde, hasta=hasta)
+
+    fechas = pd.to_datetime(detail["fecha"]).dt.date
+    ids = detail["id"].astype(str)
+    expected = detail[
+        (detail["estado_periodo"] == "Activo (MD)") & detail["funcion"].isin(funciones)
+        & (ids.str.contains("1", regex=False) | ids.str.contains("7", regex=False))
+        & (fechas >= desde) & (fechas <= hasta)
+    ]
+    assert positions.tolist() == expected.index.tolist()
+
+    page = view.page(positions, 2, 10)
+    assert _nulls(page).equals(_nulls(expected.iloc[10:20]))
+    assert ResultView.n_pages(len(positions), 10) == max(1, -(-len(expected) // 10))
+
+
+def test_summary_view(result):
+    dfs, _, _ = result
+    view = build_views(dfs)["resumen"]
+    summary = dfs["Resumen_periodo"]
+    assert view.date_bounds() is None
+    assert len(view.filter(estados=["Retirado en el periodo"])) == (summary["estado_periodo"] == "Retirado en el periodo").sum()
+    assert len(view.filter(ids="no-existe")) == 0
@@ -5,7 +5,6 @@ import re
 import unicodedata
 import pandas as pd
 import numpy as np
-from datetime import timedelta
 
 
 def normalize_text(s: str) -> str:
@@ -53,37 +52,170 @@ def clean_id(x):
     return s if s else None
 
 
-def first_nonnull(series):
-    """Retorna el primer valor no nulo de una serie."""
-    for v in series:
-        if pd.notna(v) and str(v).strip() != "":
-            return v
-    return np.nan
+def _clean_str_ids(s: pd.Series) -> np.ndarray:
+    """Ruta `.str` de clean_ids para textos (strip, sin espacios, sin .0 final)."""
+    r = s.astype(object).str.strip().str.replace(" ", "", regex=False)
+    # ".0" final como el `\.0$` de clean_id (sin espacios al final ya no hay salto de línea)
+    end = r.str.endswith(".0", na=False).to_numpy(dtype=bool)
+    r = r.to_numpy(dtype=object, copy=True)
+    if end.any():
+        r[end] = [v[:-2] for v in r[end]]
+    r[pd.isna(r) | (r == "")] = None
+    return r
+
+
+def _clean_float_ids(v: np.ndarray) -> np.ndarray:
+    """Ruta numérica de clean_ids para flotantes (enteros por casting, resto como clean_id)."""
+    out = np.full(len(v), None, dtype=object)
+    ok = ~np.isnan(v)
+    entero = ok & np.isfinite(v) & (v == np.floor(v)) & (np.abs(v) < 2 ** 63)
+    out[entero] = v[entero].astype(np.int64).astype(str).astype(object)
+    otros = ok & ~entero
+    out[otros] = [clean_id(x) for x in v[otros]]
+    return out
+
+
+# Tipo exacto de la celda -> ruta de clean_ids en columnas object (los demás tipos van por clean_id)
+_ID_STR, _ID_INT, _ID_FLOAT = 1, 2, 3
+_ID_KINDS = {
+    str: _ID_STR, np.str_: _ID_STR,
+    int: _ID_INT, np.int64: _ID_INT, np.int32: _ID_INT,
+    float: _ID_FLOAT, np.float64: _ID_FLOAT,
+}
+_cell_type = np.frompyfunc(type, 1, 1)
+
+
+def _clean_object_ids(s: pd.Series) -> np.ndarray:
+    """
+    Ruta de clean_ids para columnas object mixtas: las celdas se separan por tipo en una
+    pasada; textos por `.str`, enteros y flotantes por casting en bloque y solo lo demás
+    (None, bool, otros tipos) celda a celda.
+    """
+    values = s.to_numpy(dtype=object)
+    kinds = pd.Series(_cell_type(values), dtype=object).map(_ID_KINDS).fillna(0).to_numpy(dtype=np.int8)
+    out = np.full(len(values), None, dtype=object)
+
+    is_str = kinds == _ID_STR
+    if is_str.any():
+        out[is_str] = _clean_str_ids(pd.Series(values[is_str], dtype=object))
+    is_int = kinds == _ID_INT
+    if is_int.any():
+        try:
+            out[is_int] = list(map(str, values[is_int].astype(np.int64).tolist()))
+        except OverflowError:
+            out[is_int] = [clean_id(v) for v in values[is_int]]
+    is_float = kinds == _ID_FLOAT
+    if is_float.any():
+        out[is_float] = _clean_float_ids(values[is_float].astype(float))
+    rest = kinds == 0
+    out[rest] = [clean_id(v) for v in values[rest]]
+    return out
+
+
+def clean_ids(series) -> pd.Series:
+    """
+    Versión por columna de clean_id (mismo resultado celda a celda).
+    Enteros y flotantes se resuelven por casting y textos con operaciones `.str`;
+    las columnas mixtas separan las celdas por tipo y solo las de otros tipos caen a clean_id.
+    """
+    s = series if isinstance(series, pd.Series) else pd.Series(series)
+    if s.empty:
+        return pd.Series([], index=s.index, dtype=object)
+
+    dtype = s.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        out = s.astype(object).apply(clean_id).to_numpy(dtype=object)
+    elif pd.api.types.is_integer_dtype(dtype):
+        out = np.full(len(s), None, dtype=object)
+        mask = s.notna().to_numpy()
+        out[mask] = s[mask].astype(np.int64).astype(str).to_numpy(dtype=object)
+    elif pd.api.types.is_float_dtype(dtype):
+        out = _clean_float_ids(s.to_numpy(dtype=float, na_value=np.nan))
+    else:
+        kind = pd.api.types.infer_dtype(s, skipna=True)
+        if kind in ("string", "empty"):
+            out = _clean_str_ids(s)
+        elif kind == "floating":
+            out = _clean_float_ids(pd.to_numeric(s).to_numpy(dtype=float, na_value=np.nan))
+        else:
+            out = _clean_object_ids(s)
+
+    return pd.Series(out, index=s.index, dtype=object)
+
+
+def to_day64(values) -> np.ndarray:
+    """Convierte fechas (date, Timestamp, texto) a un arreglo datetime64[D] (NaT si no aplica)."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    return pd.to_datetime(pd.Series(values), errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def to_display(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vuelve a los tipos de presentación de las hojas: categóricas a objetos (str) y fechas
+    datetime64 a `date` (None si es NaT). Las fechas se convierten una vez por valor distinto.
+    """
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.to_numpy(dtype=object)
+        elif values.dtype.kind == "M":
+            uniq, inv = np.unique(values.to_numpy("datetime64[D]"), return_inverse=True)
+            values = uniq.astype(object)[inv.ravel()]
+        out[col] = values
+    # Los arreglos de objetos se infieren igual que al armar las hojas sin el modo compacto
+    return pd.DataFrame(out, index=df.index)
+
+
+def clip_ranges(df, p_start, p_end, id_col="id", ini_col="ini", fin_col="fin"):
+    """
+    Recorta rangos (ini-fin) al periodo sin expandirlos a días.
+    Retorna un DataFrame (id, ini, fin) con fechas datetime64 y solo rangos válidos.
+    """
+    empty = pd.DataFrame({
+        "id": pd.Series(dtype=object),
+        "ini": pd.Series(dtype="datetime64[ns]"),
+        "fin": pd.Series(dtype="datetime64[ns]"),
+    })
+    if df is None or df.empty:
+        return empty
 
+    ids = df[id_col].to_numpy()
+    ini = to_day64(df[ini_col])
+    fin = to_day64(df[fin_col])
+    ps = np.datetime64(p_start, "D")
+    pe = np.datetime64(p_end, "D")
 
-def effective_date_from_list(lst, end_date):
-    """Selecciona la fecha más reciente que no supere end_date."""
-    cand = [d for d in (lst or []) if d <= end_date]
-    return max(cand) if cand else None
+    keep = pd.notna(ids) & ~np.isnat(ini) & ~np.isnat(fin) & (fin >= ps) & (ini <= pe)
+    ini = np.maximum(ini[keep], ps)
+    fin = np.minimum(fin[keep], pe)
+    ok = ini <= fin
+    if not ok.any():
+        return empty
+    return pd.DataFrame({"id": ids[keep][ok], "ini": ini[ok], "fin": fin[ok]})
 
 
 def expand_ranges(df, p_start, p_end, id_col="id", ini_col="ini", fin_col="fin"):
     """
     Convierte rangos (ini-fin) a (id,fecha) diario recortado al periodo.
+    Vectorizado: cada rango se repite tantas veces como días tiene y se suma el desfase.
     """
-    if df is None or df.empty:
+    rng = clip_ranges(df, p_start, p_end, id_col=id_col, ini_col=ini_col, fin_col=fin_col)
+    if rng.empty:
         return pd.DataFrame(columns=["id", "fecha"])
-    dfp = df[df[id_col].notna() & df[ini_col].notna() & df[fin_col].notna()].copy()
-    dfp = dfp[(dfp[fin_col] >= p_start) & (dfp[ini_col] <= p_end)]
-    out = []
-    for _, r in dfp.iterrows():
-        ini = max(r[ini_col], p_start)
-        fin = min(r[fin_col], p_end)
-        d = ini
-        while d <= fin:
-            out.append((r[id_col], d))
-            d += timedelta(days=1)
-    return pd.DataFrame(out, columns=["id", "fecha"]).drop_duplicates() if out else pd.DataFrame(columns=["id", "fecha"])
+
+    ini = rng["ini"].to_numpy().astype("datetime64[D]")
+    fin = rng["fin"].to_numpy().astype("datetime64[D]")
+    lens = (fin - ini).astype(np.int64) + 1
+    offsets = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+    fechas = np.repeat(ini, lens) + offsets.astype("timedelta64[D]")
+
+    out = pd.DataFrame({
+        "id": np.repeat(rng["id"].to_numpy(), lens),
+        "fecha": fechas.astype(object),
+    })
+    return out.drop_duplicates()
 
 
 def ensure_cols(df, cols):
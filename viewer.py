@@ -0,0 +1,186 @@
+"""
+Visor paginado de hojas grandes, con filtros resueltos en el servidor.
+
+`ResultView` guarda una hoja una sola vez con tipos compactos (texto como categóricas,
+fechas como datetime64), armada parte por parte desde `Sheets` sin materializar la hoja
+con objetos. Los filtros (estado_periodo, funcion, id y rango de fechas) se evalúan sobre
+los códigos de las categóricas y solo la página pedida vuelve a los tipos de presentación,
+así que al navegador solo viaja esa página. Los conteos por estado se calculan al armar la
+vista.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, union_categoricals
+
+from utils import to_display
+from writers import sheet_chunks, sheet_rows
+
+
+CHUNK_ROWS = 200_000
+
+
+def _compact_column(values: pd.Series):
+    """Columna con tipo compacto: texto -> categórica, `date` -> datetime64; el resto igual."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.array
+    if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+        kind = infer_dtype(values, skipna=True)
+        if kind in ("date", "datetime"):
+            return pd.to_datetime(values).to_numpy("datetime64[ns]")
+        if kind in ("string", "empty"):
+            return pd.Categorical(values.to_numpy(dtype=object))
+    return values.to_numpy()
+
+
+def _concat(parts: list):
+    """Une las partes de una columna (las categóricas con la unión de categorías)."""
+    if any(np.asarray(p).dtype.kind == "M" for p in parts if not isinstance(p, pd.Categorical)):
+        # Una parte sin ninguna fecha queda como categórica vacía: se pasa a NaT
+        parts = [np.full(len(p), np.datetime64("NaT", "ns"), dtype="datetime64[ns]")
+                 if isinstance(p, pd.Categorical) and p.isna().all() else p for p in parts]
+    if isinstance(parts[0], pd.Categorical):
+        if len(parts) == 1:
+            return parts[0]
+        if all(isinstance(p, pd.Categorical) for p in parts):
+            # Una parte sin valores tiene categorías vacías de tipo object; con pandas 3 las
+            # demás son de tipo str y union_categoricals exige el mismo tipo
+            cats = next((p.categories for p in parts if len(p.categories)), parts[0].categories)
+            parts = [p if len(p.categories) else pd.Categorical.from_codes(
+                np.full(len(p), -1), dtype=pd.CategoricalDtype(cats[:0])) for p in parts]
+            return union_categoricals(parts)
+        parts = [np.asarray(p, dtype=object) for p in parts]
+    if len({np.asarray(p).dtype for p in parts}) > 1:
+        parts = [np.asarray(p, dtype=object) for p in parts]
+    return np.concatenate(parts)
+
+
+class ResultView:
+    """
+    Hoja compacta con filtros y paginación. `date_col` es la columna del filtro por fechas
+    (None si la hoja no tiene una).
+    """
+
+    def __init__(self, df: pd.DataFrame, date_col: str | None = None):
+        self.frame = df
+        self.date_col = date_col if date_col in df.columns else None
+        self.counts = self._counts()
+        self._memo = (None, None)
+
+    @classmethod
+    def from_sheet(cls, dfs, name: str, date_col: str | None = None, chunk_rows: int = CHUNK_ROWS):
+        """Arma la vista de una hoja de `dfs` (Sheets o dict) parte por parte."""
+        columns = None
+        parts = {}
+        if sheet_rows(dfs, name):
+            for chunk in sheet_chunks(dfs, name, chunk_rows):
+                if columns is None:
+                    columns = list(chunk.columns)
+                for col in columns:
+                    parts.setdefault(col, []).append(_compact_column(chunk[col]))
+        if columns is None:
+            empty = next(iter(sheet_chunks(dfs, name, 1)))
+            return cls(empty.iloc[0:0], date_col)
+        return cls(pd.DataFrame({col: _concat(parts[col]) for col in columns}), date_col)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def _counts(self) -> pd.DataFrame:
+        """Filas por estado_periodo (orden alfabético)."""
+        if "estado_periodo" not in self.frame.columns:
+            return pd.DataFrame({"estado_periodo": [], "filas": []})
+        counts = self.frame["estado_periodo"].value_counts(sort=False, dropna=False)
+        counts = counts[counts > 0].sort_index()
+        return pd.DataFrame({"estado_periodo": counts.index.astype(object), "filas": counts.to_numpy()})
+
+    def options(self, col: str) -> list:
+        """Valores posibles de una columna para los filtros (categorías en uso, ordenadas)."""
+        if col not in self.frame.columns:
+            return []
+        values = self.frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            used = np.unique(values.cat.codes.to_numpy())
+            return sorted(values.cat.categories[used[used >= 0]].tolist())
+        return sorted(values.dropna().unique().tolist())
+
+    def date_bounds(self):
+        """(mínima, máxima) fecha de `date_col` como `date`, o None."""
+        if self.date_col is None or not len(self.frame):
+            return None
+        dates = self.frame[self.date_col]
+        if dates.isna().all():
+            return None
+        return dates.min().date(), dates.max().date()
+
+    def filter(self, estados=None, funciones=None, ids: str = "", desde=None, hasta=None) -> np.ndarray:
+        """
+        Posiciones de las filas que cumplen todos los filtros (vacío / None = sin filtro).
+        `ids` es texto con uno o varios IDs (separados por coma o espacio) que se buscan
+        como subcadena. Se recuerda el último filtro para paginar sin recalcular.
+        """
+        key = (tuple(estados or ()), tuple(funciones or ()), ids or "", desde, hasta)
+        if self._memo[0] == key:
+            return self._memo[1]
+
+        df = self.frame
+        mask = np.ones(len(df), dtype=bool)
+        if estados:
+            mask &= self._isin(df["estado_periodo"], estados)
+        if funciones:
+            mask &= self._isin(df["funcion"], funciones)
+        tokens = [t for t in re.split(r"[,\s;]+", ids or "") if t]
+        if tokens:
+            mask &= self._contains(df["id"], tokens)
+        if self.date_col is not None and (desde is not None or hasta is not None):
+            dates = df[self.date_col].to_numpy("datetime64[D]")
+            if desde is not None:
+                mask &= dates >= np.datetime64(desde, "D")
+            if hasta is not None:
+                mask &= dates <= np.datetime64(hasta, "D")
+
+        positions = np.flatnonzero(mask)
+        self._memo = (key, positions)
+        return positions
+
+    @staticmethod
+    def _isin(values: pd.Series, selected) -> np.ndarray:
+        """isin sobre los códigos si la columna es categórica (una comparación por categoría)."""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            wanted = np.flatnonzero(values.cat.categories.isin(list(selected)))
+            return np.isin(values.cat.codes.to_numpy(), wanted)
+        return values.isin(list(selected)).to_numpy()
+
+    @staticmethod
+    def _contains(values: pd.Series, tokens) -> np.ndarray:
+        """Filas cuyo valor contiene alguno de los textos (se busca en las categorías)."""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            cats = values.cat.categories.astype(str).to_series()
+            hit = np.zeros(len(cats), dtype=bool)
+            for t in tokens:
+                hit |= cats.str.contains(t, regex=False).to_numpy()
+            return np.isin(values.cat.codes.to_numpy(), np.flatnonzero(hit))
+        text = values.astype(str)
+        hit = np.zeros(len(values), dtype=bool)
+        for t in tokens:
+            hit |= text.str.contains(t, regex=False).to_numpy()
+        return hit
+
+    def page(self, positions: np.ndarray, page: int, page_size: int) -> pd.DataFrame:
+        """Página `page` (desde 1) de las filas `positions`, con tipos de presentación."""
+        start = max(page - 1, 0) * page_size
+        rows = positions[start:start + page_size]
+        return to_display(self.frame.iloc[rows])
+
+    @staticmethod
+    def n_pages(n_rows: int, page_size: int) -> int:
+        return max(1, -(-n_rows // page_size))
+
+
+def build_views(dfs) -> dict:
+    """Vistas de las hojas navegables del resultado: detalle (con fechas) y resumen."""
+    return {
+        "detalle": ResultView.from_sheet(dfs, "Ausencias_sin_soporte", date_col="fecha"),
+        "resumen": ResultView.from_sheet(dfs, "Resumen_periodo"),
+    }
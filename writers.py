@@ -0,0 +1,370 @@
+"""
+Escritura del libro Excel de salida.
+
+Las hojas se escriben fila por fila en modo streaming, sin mantener en memoria un objeto
+por celda. Motores:
+- "xlsxwriter": `constant_memory` (cada fila se vuelca a disco al pasar a la siguiente),
+  si `xlsxwriter` está instalado.
+- "openpyxl": libro `write_only` (siempre disponible).
+`pandas.to_excel` no sirve para estos modos porque genera las celdas por columna.
+El formato replica el de `to_excel`: encabezado en negrilla con borde, fechas AAAA-MM-DD,
+fechas con hora AAAA-MM-DD HH:MM:SS y nulos como celdas vacías. Los textos que empiezan
+con "=" se escriben como texto, no como fórmulas.
+
+Excel admite 1.048.576 filas por hoja: las hojas más grandes se reparten en hojas
+numeradas (`Hoja`, `Hoja_2`, ...). Las hojas se generan y escriben parte por parte
+(`CHUNK_ROWS` filas), sin armar antes el DataFrame completo de las hojas perezosas de `Sheets`.
+Con `progress` los escritores llaman progress({"etapa": hoja}) al terminar cada parte; si el
+callback lanza una excepción (p. ej. al cancelar un trabajo) la escritura se corta ahí.
+
+Para consumo automatizado (BI) `write_tables_zip` escribe cada hoja como Parquet o CSV
+gzip dentro de un zip, sin pasar por Excel; también parte por parte (un row group de
+Parquet o un bloque de CSV por parte).
+"""
+import gzip
+import io
+import zipfile
+from collections.abc import Mapping
+from datetime import date, datetime
+
+import pandas as pd
+
+try:
+    import xlsxwriter  # noqa: F401
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+# Máximo de caracteres en el nombre de una hoja
+MAX_SHEET_NAME = 31
+
+# Filas por hoja de Excel (incluye el encabezado)
+EXCEL_MAX_ROWS = 1_048_576
+
+DATE_FORMAT = "YYYY-MM-DD"
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+
+# Filas por parte al escribir (Excel, Parquet, CSV)
+CHUNK_ROWS = 200_000
+
+# Formato de tablas -> extensión de cada archivo dentro del zip
+TABLE_FORMATS = {
+    "parquet": ".parquet",
+    "csv.gz": ".csv.gz",
+}
+
+
+class Sheets(Mapping):
+    """
+    Hojas del reporte (nombre -> DataFrame). Además de DataFrames ya calculados admite hojas
+    perezosas, descritas por su total de filas y una función `chunks(size)` que genera la hoja
+    en partes consecutivas de a lo sumo `size` filas. Acceder a una hoja perezosa la materializa (una vez);
+    los escritores usan `iter_chunks` para no materializarla.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self._lazy = {}
+        self._order = []
+
+    def add(self, name: str, df: pd.DataFrame):
+        """Agrega una hoja ya calculada."""
+        self._order.append(name)
+        self._frames[name] = df
+
+    def add_lazy(self, name: str, n_rows: int, chunks):
+        """Agrega una hoja perezosa de n_rows filas generada por chunks(size)."""
+        self._order.append(name)
+        self._lazy[name] = (n_rows, chunks)
+
+    def n_rows(self, name: str) -> int:
+        """Filas de la hoja sin materializarla."""
+        if name in self._frames:
+            return len(self._frames[name])
+        return self._lazy[name][0]
+
+    def iter_chunks(self, name: str, size: int):
+        """DataFrames consecutivos de a lo sumo `size` filas (al menos uno, aunque esté vacío)."""
+        if name not in self._frames:
+            yield from self._lazy[name][1](size)
+            return
+        df = self._frames[name]
+        for start in range(0, max(len(df), 1), size):
+            yield df.iloc[start:start + size]
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        if name not in self._frames:
+            n_rows, chunks = self._lazy[name]
+            parts = list(chunks(max(n_rows, 1)))
+            self._frames[name] = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+        return self._frames[name]
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __reduce__(self):
+        # Entre procesos viajan como dict materializado (las hojas perezosas dependen del grid)
+        return dict, (dict(self.items()),)
+
+
+def sheet_rows(dfs, name: str) -> int:
+    """Filas de una hoja de `dfs` sin materializarla si es perezosa."""
+    return dfs.n_rows(name) if isinstance(dfs, Sheets) else len(dfs[name])
+
+
+def sheet_chunks(dfs, name: str, size: int):
+    """Partes de una hoja de `dfs` (Sheets o dict de DataFrames) de a lo sumo `size` filas."""
+    if isinstance(dfs, Sheets):
+        return dfs.iter_chunks(name, size)
+    df = dfs[name]
+    return (df.iloc[start:start + size] for start in range(0, max(len(df), 1), size))
+
+
+def _sheet_name(name: str, part: int) -> str:
+    """Nombre de la hoja `part` (1 = nombre original; luego `_2`, `_3`, ...)."""
+    if part == 1:
+        return name[:MAX_SHEET_NAME]
+    suffix = f"_{part}"
+    return f"{name[:MAX_SHEET_NAME - len(suffix)]}{suffix}"
+
+
+def _iter_blocks(dfs, max_rows: int, progress=None):
+    """
+    (hoja física, bloque de filas, hoja nueva) en orden de escritura. Las partes de cada hoja
+    se acomodan en hojas de a lo sumo max_rows filas (encabezado incluido); una parte que no
+    cabe se corta y continúa en la siguiente hoja numerada. Con `progress` se avisa cada
+    parte escrita (cuando el escritor pide el bloque siguiente).
+    """
+    cap = max_rows - 1
+    for name in dfs:
+        part, filled, new = 1, 0, True
+        for chunk in sheet_chunks(dfs, name, min(cap, CHUNK_ROWS)):
+            while len(chunk) > cap - filled:
+                take = cap - filled
+                yield _sheet_name(name, part), chunk.iloc[:take], new
+                chunk = chunk.iloc[take:]
+                part, filled, new = part + 1, 0, True
+            yield _sheet_name(name, part), chunk, new
+            filled += len(chunk)
+            new = False
+            if progress is not None:
+                progress({"etapa": name})
+
+
+def write_steps(dfs, chunk_rows: int = CHUNK_ROWS) -> int:
+    """Partes que escribe un escritor con `progress` (total para una barra de avance)."""
+    return sum(max(1, -(-sheet_rows(dfs, name) // chunk_rows)) for name in dfs)
+
+
+def default_engine() -> str:
+    """Motor por defecto: xlsxwriter si está instalado, si no openpyxl."""
+    return "xlsxwriter" if HAS_XLSXWRITER else "openpyxl"
+
+
+def _column_values(col: pd.Series) -> list:
+    """Valores de una columna como objetos Python, con None en lugar de NaN/NaT."""
+    if isinstance(col.dtype, pd.DatetimeTZDtype):
+        col = col.dt.tz_localize(None)
+    values = col.astype(object)
+    return values.where(col.notna(), None).tolist()
+
+
+def _column_format(col: pd.Series, values: list) -> str | None:
+    """Formato numérico de la columna: fecha, fecha con hora o ninguno."""
+    if pd.api.types.is_datetime64_any_dtype(col.dtype):
+        has_time = (col.dropna().dt.normalize() != col.dropna()).any()
+        return DATETIME_FORMAT if has_time else DATE_FORMAT
+    first = next((v for v in values if v is not None), None)
+    if isinstance(first, datetime):
+        return DATETIME_FORMAT
+    if isinstance(first, date):
+        return DATE_FORMAT
+    return None
+
+
+def _columns(df: pd.DataFrame) -> tuple[list[str], list[list], list[str | None]]:
+    """(encabezados, valores por columna, formato por columna)."""
+    names = [str(c) for c in df.columns]
+    values = [_column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    formats = [_column_format(df.iloc[:, i], v) for i, v in enumerate(values)]
+    return names, values, formats
+
+
+def _write_xlsxwriter(dfs, target, max_rows: int, progress=None):
+    """Streaming con xlsxwriter `constant_memory`."""
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(target, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+    })
+    header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    num_fmts = {f: wb.add_format({"num_format": f.lower()}) for f in (DATE_FORMAT, DATETIME_FORMAT)}
+    try:
+        ws, next_row = None, 0
+        for sheet, df, new in _iter_blocks(dfs, max_rows, progress):
+            names, values, formats = _columns(df)
+            if new:
+                ws = wb.add_worksheet(sheet)
+                ws.write_row(0, 0, names, header_fmt)
+                next_row = 1
+            cell_fmts = [num_fmts.get(f) for f in formats]
+            write = ws.write
+            for r, row in enumerate(zip(*values), start=next_row):
+                for c, v in enumerate(row):
+                    if v is not None:
+                        write(r, c, v, cell_fmts[c])
+            next_row += len(df)
+    finally:
+        wb.close()
+
+
+def _write_openpyxl(dfs, target, max_rows: int, progress=None):
+    """Streaming con openpyxl `write_only`."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    wb = Workbook(write_only=True)
+    thin = Side(style="thin")
+    header_font = Font(bold=True)
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_align = Alignment(horizontal="center", vertical="top")
+
+    ws = None
+    for sheet, df, new in _iter_blocks(dfs, max_rows, progress):
+        names, values, formats = _columns(df)
+        if new:
+            ws = wb.create_sheet(sheet)
+            header = []
+            for name in names:
+                cell = WriteOnlyCell(ws, value=name)
+                cell.font, cell.border, cell.alignment = header_font, header_border, header_align
+                header.append(cell)
+            ws.append(header)
+
+        dated = [c for c, f in enumerate(formats) if f is not None]
+        formula_like = [c for c, col in enumerate(values) if any(isinstance(v, str) and v.startswith("=") for v in col)]
+        for row in zip(*values):
+            if dated or formula_like:
+                row = list(row)
+                for c in dated:
+                    if row[c] is not None:
+                        cell = WriteOnlyCell(ws, value=row[c])
+                        cell.number_format = formats[c]
+                        row[c] = cell
+                for c in formula_like:
+                    if isinstance(row[c], str) and row[c].startswith("="):
+                        cell = WriteOnlyCell(ws, value=row[c])
+                        cell.data_type = "s"
+                        row[c] = cell
+            ws.append(row)
+
+    wb.save(target)
+
+
+WRITERS = {
+    "xlsxwriter": _write_xlsxwriter,
+    "openpyxl": _write_openpyxl,
+}
+
+
+def write_excel(dfs, target, engine: str | None = None, max_rows: int = EXCEL_MAX_ROWS, progress=None):
+    """
+    Escribe `dfs` (nombre de hoja -> DataFrame, o `Sheets`) como libro Excel en `target`
+    (ruta o archivo binario abierto), sin índice. Las hojas de más de max_rows filas
+    (encabezado incluido) se reparten en hojas numeradas.
+    """
+    engine = engine or default_engine()
+    if engine not in WRITERS:
+        raise ValueError(f"Motor de escritura no soportado: {engine}")
+    WRITERS[engine](dfs, target, max_rows, progress)
+
+
+def tables_file_name(file_name: str, fmt: str) -> str:
+    """Nombre del zip de tablas a partir del nombre del libro (…_parquet.zip / …_csv_gz.zip)."""
+    stem = file_name[:-5] if file_name.endswith(".xlsx") else file_name
+    return f"{stem}_{fmt.replace('.', '_')}.zip"
+
+
+def available_table_formats() -> list[str]:
+    """Formatos de tablas utilizables (Parquet requiere pyarrow)."""
+    return [f for f in TABLE_FORMATS if f != "parquet" or HAS_PARQUET]
+
+
+def write_sheet_csv(dfs, name: str, fh, chunk_rows: int = CHUNK_ROWS, progress=None):
+    """Escribe la hoja `name` de `dfs` como CSV en el archivo de texto `fh`, parte por parte."""
+    for i, chunk in enumerate(sheet_chunks(dfs, name, chunk_rows)):
+        chunk.to_csv(fh, index=False, header=i == 0)
+        if progress is not None:
+            progress({"etapa": name})
+
+
+def _write_sheet_parquet(dfs, name: str, fh, chunk_rows: int, progress=None):
+    """
+    Escribe la hoja `name` como Parquet en `fh`, un row group por parte. Una columna que en
+    las primeras partes solo tiene nulos aún no tiene tipo: esas partes se retienen (como
+    tablas Arrow) hasta que aparece el tipo y se escriben con el esquema unificado.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, pending = None, []
+    try:
+        for chunk in sheet_chunks(dfs, name, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is not None:
+                writer.write_table(table.cast(writer.schema))
+            else:
+                pending.append(table)
+                schema = pa.unify_schemas([t.schema for t in pending])
+                if not any(pa.types.is_null(f.type) for f in schema):
+                    writer = pq.ParquetWriter(fh, schema.with_metadata(table.schema.metadata))
+                    for t in pending:
+                        writer.write_table(t.cast(writer.schema))
+                    pending = []
+            if progress is not None:
+                progress({"etapa": name})
+        if writer is None:
+            schema = pa.unify_schemas([t.schema for t in pending])
+            writer = pq.ParquetWriter(fh, schema.with_metadata(pending[-1].schema.metadata))
+            for t in pending:
+                writer.write_table(t.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_tables_zip(dfs, target, fmt: str = "parquet", chunk_rows: int = CHUNK_ROWS, progress=None):
+    """
+    Escribe cada hoja de `dfs` (dict de DataFrames o `Sheets`) como `<hoja>.parquet` o
+    `<hoja>.csv.gz` dentro de un zip en `target` (ruta o archivo binario abierto), de a
+    `chunk_rows` filas (las hojas perezosas no se materializan). Los archivos ya van
+    comprimidos, así que el zip solo los almacena.
+    """
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Formato de tablas no soportado: {fmt}")
+    if fmt == "parquet" and not HAS_PARQUET:
+        raise ValueError("El formato Parquet requiere pyarrow instalado")
+
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED) as zf:
+        for sheet in dfs:
+            with zf.open(f"{sheet}{TABLE_FORMATS[fmt]}", "w") as fh:
+                if fmt == "parquet":
+                    _write_sheet_parquet(dfs, sheet, fh, chunk_rows, progress)
+                else:
+                    with gzip.GzipFile(filename="", mode="wb", fileobj=fh, mtime=0) as gz, \
+                            io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+                        write_sheet_csv(dfs, sheet, text, chunk_rows, progress)